@@ -0,0 +1,276 @@
+import argparse
+import contextlib
+import io
+import json
+import math
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from simulation import CONFIG, ItemId, Simulation, compile_config
+
+# -----------------------------------------------------------------------------
+# CONFIG SEARCH
+# -----------------------------------------------------------------------------
+#
+# Tunes CONFIG parameters for weighted objectives with successive halving:
+# many sampled configurations run for a few simulated days, the best 1/eta
+# of them run again eta times longer, and so on up to the full horizon.
+# --hyperband repeats that over brackets trading breadth for starting
+# budget. Runs are spread over local cores, and every configuration sees
+# the same seeds, so comparisons are not swamped by seed noise. A longer
+# rung replays the shorter run from its seed (same trajectory) and then
+# continues it. The first rung defaults to four seasons, so every config
+# lives through a winter; configs tied at a cut are all promoted.
+#
+#     python config_search.py --param WINTER_WOOD_CONSUMPTION=1:3:int --param NO_WOOD_PENALTY=0.25:2 \
+#         --param MIN_WOOD_RESERVE_WINTER=4,8,12 --objective survival=1 --objective market_stability=0.5
+
+# Every metric is oriented so that larger is better.
+METRICS = ("survival", "market_stability", "mean_health", "mean_happiness", "mean_hunger", "mean_coins",
+           "no_stockouts")
+
+
+def parse_param(spec):
+    """
+    NAME=LOW:HIGH samples a float, NAME=LOW:HIGH:int an integer and
+    NAME=A,B,C one of the listed JSON values.
+    """
+    name, _, values = spec.partition("=")
+    if name not in CONFIG:
+        raise SystemExit(f"Unknown CONFIG key {name!r}")
+    if ":" in values:
+        parts = values.split(":")
+        low, high = float(parts[0]), float(parts[1])
+        if len(parts) > 2 and parts[2] == "int":
+            return name, ("int", int(low), int(high))
+        return name, ("float", low, high)
+    return name, ("choice", [json.loads(v) for v in values.split(",")])
+
+
+def sample_config(space, rng):
+    overrides = {}
+    for name, (kind, *args) in space.items():
+        if kind == "int":
+            overrides[name] = rng.randint(args[0], args[1])
+        elif kind == "float":
+            overrides[name] = round(rng.uniform(args[0], args[1]), 4)
+        else:
+            overrides[name] = rng.choice(args[0])
+    return overrides
+
+
+def evaluate(task):
+    # Runs one configuration for one seed and returns its metrics.
+    overrides, base, seed, days = task
+    config = dict(CONFIG)
+    config.update(base)
+    config.update(overrides)
+    config["TOTAL_DAYS_TO_RUN"] = days
+    config["STATS_MODE"] = "aggregate"
+    # Each run writes its outputs to its own directory, so parallel runs never share a file.
+    workdir = tempfile.mkdtemp(prefix="config_search_")
+    for key in ("LOG_FILENAME", "CHART_FILENAME", "JOURNAL_FILENAME", "MEMORY_PROFILE_FILENAME"):
+        config[key] = os.path.join(workdir, os.path.basename(config[key]))
+    config["STATS_STORE_DIR"] = os.path.join(workdir, "stats")
+    stock_series = []
+    stockout_ticks = 0
+    try:
+        sim = Simulation(config, seed=seed)
+        for record in sim.ticks():
+            stock_series.append(record.stock)
+            stockout_ticks += sum(1 for qty in record.stock if qty <= 0)
+        with contextlib.redirect_stdout(io.StringIO()):
+            sim.finish(charts=False)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    alive = sim.world.villagers
+    population = len(sim.villagers)
+
+    def mean(values):
+        values = list(values)
+        return sum(values) / len(values) if values else 0.0
+
+    # Market stability: one over one plus the mean coefficient of variation of item stock.
+    variations = []
+    for item in ItemId:
+        series = [stock[item] for stock in stock_series]
+        average = mean(series)
+        if average > 0:
+            variance = mean((qty - average) ** 2 for qty in series)
+            variations.append(math.sqrt(variance) / average)
+    ticks = max(1, len(stock_series))
+    return {
+        "survival": len(alive) / population if population else 0.0,
+        "market_stability": 1 / (1 + mean(variations)),
+        "mean_health": mean(v.status.health for v in alive),
+        "mean_happiness": mean(v.status.happiness for v in alive),
+        "mean_hunger": mean(v.status.hunger for v in alive),
+        "mean_coins": mean(v.coins for v in alive),
+        "no_stockouts": 1 - stockout_ticks / (ticks * len(ItemId)),
+        "abort_reason": sim.abort_reason,
+        "market": sim.world.market.ledger.summary(),
+    }
+
+
+def score(metrics, objective):
+    if callable(objective):
+        return objective(metrics)
+    return sum(weight * metrics[name] for name, weight in objective.items())
+
+
+class Trial:
+    def __init__(self, trial_id, overrides):
+        self.id = trial_id
+        self.overrides = overrides
+        self.days = 0
+        self.metrics = None
+        self.market = None
+        self.score = None
+
+
+class ConfigSearch:
+    def __init__(self, space, objective, base=None, seeds=(1,), eta=3, min_days=None, max_days=None,
+                 processes=None, rng_seed=0):
+        self.space = space
+        self.objective = objective
+        self.base = dict(base or {})
+        compile_config({**CONFIG, **self.base})
+        self.seeds = tuple(seeds)
+        self.eta = eta
+        self.max_days = max_days or self.base.get("TOTAL_DAYS_TO_RUN", CONFIG["TOTAL_DAYS_TO_RUN"])
+        # Shorter runs end before the first winter, where most configs score the same.
+        self.min_days = min_days or min(4 * self.base.get("DAYS_PER_SEASON", CONFIG["DAYS_PER_SEASON"]),
+                                        self.max_days)
+        self.processes = processes or os.cpu_count() or 1
+        self.rng = random.Random(rng_seed)
+        self.trials = []
+        self.simulated_days = 0
+
+    def _new_trials(self, count):
+        trials = [Trial(len(self.trials) + i, sample_config(self.space, self.rng)) for i in range(count)]
+        self.trials.extend(trials)
+        return trials
+
+    def _run(self, pool, trials, days):
+        tasks = [(t.overrides, self.base, seed, days) for t in trials for seed in self.seeds]
+        results = pool.map(evaluate, tasks)
+        self.simulated_days += days * len(tasks)
+        per_seed = len(self.seeds)
+        for i, trial in enumerate(trials):
+            runs = results[i * per_seed:(i + 1) * per_seed]
+            trial.metrics = {name: sum(r[name] for r in runs) / per_seed for name in METRICS}
+            trial.metrics["aborted"] = sum(1 for r in runs if r["abort_reason"])
+            # The ledger summary per item, averaged over seeds like the metrics.
+            trial.market = {item: {name: sum(r["market"][item][name] for r in runs) / per_seed
+                                   for name in runs[0]["market"][item]}
+                            for item in runs[0]["market"]}
+            trial.days = days
+            trial.score = score(trial.metrics, self.objective)
+
+    def successive_halving(self, pool, trials, min_days):
+        # Returns the survivor of the last rung.
+        days = min_days
+        while True:
+            days = min(days, self.max_days)
+            self._run(pool, trials, days)
+            trials.sort(key=lambda t: t.score, reverse=True)
+            print(f"  {len(trials):>4} configs x {days:>3} days: best {trials[0].score:.4f} {trials[0].overrides}")
+            keep = len(trials) // self.eta
+            if days >= self.max_days or keep < 1:
+                return trials[0]
+            # Sample order must not decide between equal scores.
+            cut = trials[keep - 1].score
+            tied = sum(1 for t in trials if math.isclose(t.score, cut, rel_tol=1e-9))
+            if keep < len(trials) and math.isclose(trials[keep].score, cut, rel_tol=1e-9):
+                keep = sum(1 for t in trials if t.score > cut or math.isclose(t.score, cut, rel_tol=1e-9))
+                print(f"       {tied} configs tied at {cut:.4f}; promoting {keep} of {len(trials)}")
+            trials = trials[:keep]
+            days *= self.eta
+
+    def run(self, num_configs=27, hyperband=False):
+        started = time.perf_counter()
+        with multiprocessing.Pool(self.processes) as pool:
+            if not hyperband:
+                print(f"Successive halving over {num_configs} configs, eta {self.eta}")
+                finalists = [self.successive_halving(pool, self._new_trials(num_configs), self.min_days)]
+            else:
+                # Bracket s starts eta**s times as many configs at 1/eta**s of the full horizon.
+                s_max = int(math.log(self.max_days / self.min_days, self.eta) + 1e-9)
+                finalists = []
+                for s in range(s_max, -1, -1):
+                    count = int(math.ceil((s_max + 1) / (s + 1) * self.eta ** s))
+                    min_days = max(1, int(round(self.max_days / self.eta ** s)))
+                    print(f"Bracket s={s}: {count} configs from {min_days} days")
+                    finalists.append(self.successive_halving(pool, self._new_trials(count), min_days))
+        full = [t for t in finalists if t.days >= self.max_days]
+        best = max(full or finalists, key=lambda t: t.score)
+        ties = [t for t in self.trials if t is not best and t.days == best.days
+                and math.isclose(t.score, best.score, rel_tol=1e-9)]
+        grid_days = len(self.trials) * len(self.seeds) * self.max_days
+        return {
+            "best": {"overrides": best.overrides, "score": best.score, "metrics": best.metrics,
+                     "market": best.market, "days": best.days},
+            "tied_with_best": [t.overrides for t in ties],
+            "configs_tried": len(self.trials),
+            "simulated_days": self.simulated_days,
+            "full_horizon_days": grid_days,
+            "fraction_of_full": self.simulated_days / grid_days if grid_days else 0.0,
+            "seconds": time.perf_counter() - started,
+        }
+
+
+def _parse_override(spec):
+    key, _, value = spec.partition("=")
+    try:
+        return key, json.loads(value)
+    except json.JSONDecodeError:
+        return key, value
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search CONFIG parameters with successive halving / Hyperband.")
+    parser.add_argument("--param", action="append", required=True, metavar="NAME=RANGE",
+                        help="NAME=LOW:HIGH, NAME=LOW:HIGH:int or NAME=A,B,C")
+    parser.add_argument("--objective", action="append", default=[], metavar="METRIC=WEIGHT",
+                        help=f"weighted metric to maximise, one of {', '.join(METRICS)}; default survival=1")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE", help="fixed config override")
+    parser.add_argument("--configs", type=int, default=27, help="configs sampled for plain successive halving")
+    parser.add_argument("--hyperband", action="store_true")
+    parser.add_argument("--eta", type=int, default=3)
+    parser.add_argument("--min-days", type=int, help="first rung; default four seasons")
+    parser.add_argument("--max-days", type=int)
+    parser.add_argument("--seeds", type=int, default=2, help="seeds per config, shared by all configs")
+    parser.add_argument("--processes", type=int)
+    parser.add_argument("--rng-seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the result to this file")
+    args = parser.parse_args()
+
+    space = dict(parse_param(spec) for spec in args.param)
+    objective = {}
+    for spec in args.objective or ["survival=1"]:
+        name, _, weight = spec.partition("=")
+        if name not in METRICS:
+            raise SystemExit(f"Unknown metric {name!r}; known metrics: {', '.join(METRICS)}")
+        objective[name] = float(weight or 1)
+    search = ConfigSearch(space, objective, dict(_parse_override(s) for s in args.set),
+                          seeds=range(1, args.seeds + 1), eta=args.eta, min_days=args.min_days,
+                          max_days=args.max_days, processes=args.processes, rng_seed=args.rng_seed)
+    result = search.run(args.configs, args.hyperband)
+    best = result["best"]
+    print(f"Best score {best['score']:.4f} after {best['days']} days: {best['overrides']}")
+    print("  " + ", ".join(f"{name}={best['metrics'][name]:.3f}" for name in METRICS))
+    for item, ledger in best["market"].items():
+        print(f"  {item}: volume {ledger['volume']:.1f}, vwap {ledger['vwap']:.2f}, "
+              f"stockouts {ledger['stockouts']:.1f}, overflow {ledger['overflow']:.1f}")
+    for overrides in result["tied_with_best"]:
+        print(f"  tied: {overrides}")
+    print(f"{result['configs_tried']} configs, {result['simulated_days']} simulated days "
+          f"({result['fraction_of_full']:.0%} of running them all for {search.max_days} days), "
+          f"{result['seconds']:.1f}s")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
@@ -0,0 +1,442 @@
+import sys
+import time
+import numpy as np
+from simulation import CONFIG, compile_config, Role, Terrain, ItemId, Season
+
+# -----------------------------------------------------------------------------
+# LOCKSTEP ENSEMBLE ENGINE
+# -----------------------------------------------------------------------------
+#
+# Advances N independent copies of the same configured world together. Every
+# per-villager quantity is an array with a leading world dimension, so each
+# Python-level step (one villager, one rule) updates all replicates at once.
+# Villagers still act in spawn order within a part of the day, like the
+# reference Simulation, so market and tile contention keep the same shape.
+#
+# Only outcome-relevant mechanics are modelled: marriages and log text are
+# skipped, and each world draws from its own numpy random stream, so results
+# match the reference engine in distribution rather than run-for-run.
+
+FOOD = int(ItemId.food)
+COOKED = int(ItemId.cooked_food)
+WOOD = int(ItemId.wood)
+HERB = int(ItemId.herb)
+RESOURCE_ITEMS = (FOOD, COOKED, WOOD, HERB)
+
+
+class EnsembleResult:
+    def __init__(self, config, alive, coins, health, elapsed):
+        self.config = config
+        # alive[w, d] counts villagers alive at the end of day d (d=0 is the start).
+        self.alive = alive
+        self.final_coins = coins
+        self.final_health = health
+        self.elapsed = elapsed
+
+    @property
+    def num_worlds(self):
+        return self.alive.shape[0]
+
+    def survival_curve(self, percentiles=(10, 50, 90)):
+        # Fraction of the starting population alive per day, per percentile.
+        fraction = self.alive / max(1, self.alive[0, 0])
+        return {p: np.percentile(fraction, p, axis=0) for p in percentiles}
+
+    def extinction_rate(self):
+        return float(np.mean(self.alive[:, -1] == 0))
+
+    def coin_percentiles(self, percentiles=(10, 50, 90)):
+        # Coins held by survivors at the end of the run, pooled over worlds.
+        held = self.final_coins[self.final_health > 0]
+        if held.size == 0:
+            return {p: 0.0 for p in percentiles}
+        return {p: float(np.percentile(held, p)) for p in percentiles}
+
+    def summary(self):
+        curve = self.survival_curve()
+        days = self.alive.shape[1] - 1
+        lines = [f"Ensemble of {self.num_worlds} worlds, {days} days, {self.elapsed:.2f}s"]
+        lines.append(f"Extinct worlds: {self.extinction_rate():.1%}")
+        for p, values in curve.items():
+            lines.append(f"Survival p{p}: final {values[-1]:.1%}")
+        coins = self.coin_percentiles()
+        lines.append("Survivor coins: " + ", ".join(f"p{p}={v:.1f}" for p, v in coins.items()))
+        return "\n".join(lines)
+
+
+class EnsembleSimulation:
+    def __init__(self, config, num_worlds, seed=None):
+        cfg = compile_config(config)
+        for role in Role:
+            if len(cfg.ROLE_TOOL_IDS[role]) > 1:
+                raise ValueError(f"Ensemble mode supports one tool per role, {role} has several")
+        self.config = cfg
+        self.num_worlds = num_worlds
+        self.rng = np.random.default_rng(seed)
+
+        roles = (
+            [Role.Farmer] * cfg.NUM_FARMERS + [Role.Hunter] * cfg.NUM_HUNTERS +
+            [Role.Logger] * cfg.NUM_LOGGERS + [Role.Blacksmith] * cfg.NUM_BLACKSMITHS
+        )
+        self.roles = roles
+        self.role_tool = [cfg.ROLE_TOOL_IDS[r][0] if cfg.ROLE_TOOL_IDS[r] else None for r in roles]
+        self.role_action = [cfg.ROLE_ACTION_NAMES[r] for r in roles]
+        shape = (num_worlds, len(roles))
+
+        self.hunger = np.full(shape, float(cfg.INITIAL_HUNGER))
+        self.rest = np.full(shape, float(cfg.INITIAL_REST))
+        self.health = np.full(shape, float(cfg.INITIAL_HEALTH))
+        self.happiness = np.full(shape, float(cfg.INITIAL_HAPPINESS))
+        self.coins = np.full(shape, float(cfg.INITIAL_VILLAGER_COINS))
+        self.skill = np.ones(shape)
+        self.low_hunger_streak = np.zeros(shape, dtype=np.int64)
+        self.low_rest_streak = np.zeros(shape, dtype=np.int64)
+        self.alive = np.ones(shape, dtype=bool)
+        # Durability of the one role tool each villager may hold (0 = none).
+        self.tool_durability = np.zeros(shape, dtype=np.int64)
+        self.inventory = np.zeros(shape + (len(ItemId),), dtype=np.int64)
+        self.inventory[:, :, FOOD] = cfg.INITIAL_VILLAGER_FOOD
+        self.inventory[:, :, WOOD] = cfg.INITIAL_VILLAGER_WOOD
+
+        self.stock = np.zeros((num_worlds, len(ItemId)))
+        for item, qty in cfg.STARTING_STOCK.items():
+            self.stock[:, item] = qty
+        self.max_stock = np.array(cfg.ITEM_MAX_STOCK, dtype=float)
+        self.price = np.array(cfg.ITEM_PRICE, dtype=float)
+        self.overflow = np.zeros((num_worlds, len(ItemId)))
+
+        self.terrain, self.tiles = self._generate_tiles()
+        self.terrain_masks = {int(t): self.terrain == int(t) for t in Terrain}
+        self.tick = 0
+        self.worlds = np.arange(num_worlds)
+
+    def _generate_tiles(self):
+        cfg = self.config
+        weights = cfg.TERRAIN_WEIGHTS
+        picks = self.rng.integers(0, len(weights), size=(self.num_worlds, cfg.GRID_WIDTH * cfg.GRID_HEIGHT))
+        terrain = np.array([int(t) for t, _ in weights], dtype=np.int8)[picks]
+        tiles = np.array([r for _, r in weights], dtype=float)[picks]
+        return terrain, tiles
+
+    # -------------------------------------------------------------------------
+    # Market helpers (vectorised over worlds for one villager)
+    # -------------------------------------------------------------------------
+
+    def _price(self, item):
+        return np.where(self.stock[:, item] >= self.max_stock[item],
+                        self.price[item] * self.config.MARKET_PRICE_DECAY, self.price[item])
+
+    def _add_stock(self, item, qty):
+        total = self.stock[:, item] + qty
+        self.overflow[:, item] += np.maximum(total - self.max_stock[item], 0)
+        self.stock[:, item] = np.minimum(total, self.max_stock[item])
+
+    def _buy(self, v, item, qty, mask):
+        available = self.stock[:, item]
+        if item == WOOD:
+            actual = np.minimum(qty, available)
+            ok = mask & (available > 0)
+        else:
+            actual = np.broadcast_to(qty, available.shape)
+            ok = mask & (available > 0) & (available >= qty)
+        cost = self._price(item) * actual
+        ok &= cost <= self.coins[:, v]
+        self.coins[:, v] -= np.where(ok, cost, 0)
+        self.stock[:, item] -= np.where(ok, actual, 0)
+        if self.config.ITEM_IS_TOOL[item]:
+            self.tool_durability[ok, v] = self.config.ITEM_DURABILITY[item]
+        else:
+            self.inventory[:, v, item] += np.where(ok, actual, 0).astype(np.int64)
+        return ok
+
+    def _sell_surplus(self, v, mask):
+        safety = self.config.ITEM_SAFETY_STOCK
+        for item in RESOURCE_ITEMS:
+            surplus = self.inventory[:, v, item] - safety[item]
+            ok = mask & (surplus > 0)
+            qty = np.where(ok, surplus, 0)
+            self.inventory[:, v, item] -= qty
+            self.coins[:, v] += self._price(item) * qty
+            self._add_stock(item, qty)
+
+    # -------------------------------------------------------------------------
+    # Villager rules
+    # -------------------------------------------------------------------------
+
+    def _adjust_health(self, v, delta, mask):
+        new = np.minimum(np.maximum(self.health[:, v] + delta, 0), self.config.MAX_HEALTH)
+        self.health[:, v] = np.where(mask, new, self.health[:, v])
+
+    def _eat_if_needed(self, v, mask):
+        inv = self.inventory
+        while True:
+            need = mask & (self.hunger[:, v] < 7)
+            cooked = need & (inv[:, v, COOKED] > 0)
+            raw = need & ~cooked & (inv[:, v, FOOD] > 0)
+            if not (cooked.any() or raw.any()):
+                return
+            inv[cooked, v, COOKED] -= 1
+            self.hunger[cooked, v] += 3
+            self._adjust_health(v, 2, cooked)
+            inv[raw, v, FOOD] -= 1
+            self.hunger[raw, v] += 2
+
+    def _cook(self, v, mask):
+        rate = self.config.COOKING_CONVERSION_RATE
+        ok = mask & (self.inventory[:, v, FOOD] >= rate)
+        self.inventory[ok, v, FOOD] -= rate
+        self.inventory[ok, v, COOKED] += 1
+
+    def _use_herb(self, v, mask):
+        ok = mask & (self.inventory[:, v, HERB] > 0)
+        self.inventory[ok, v, HERB] -= 1
+        self._adjust_health(v, self.config.HERB_HEALTH_BOOST, ok)
+
+    def _emergency_recover(self, v, mask):
+        cfg = self.config
+        low = mask & (self.health[:, v] < cfg.EMERGENCY_HEALTH_THRESHOLD)
+        has_food = low & (self.inventory[:, v, FOOD] >= cfg.COOKING_CONVERSION_RATE)
+        self._cook(v, has_food)
+        eat = has_food & (self.inventory[:, v, COOKED] > 0)
+        self.inventory[eat, v, COOKED] -= 1
+        self.hunger[eat, v] += cfg.EMERGENCY_COOKED_FOOD_HUNGER_BOOST
+        self._adjust_health(v, cfg.EMERGENCY_COOKED_FOOD_HEALTH_BOOST, eat)
+        bought = self._buy(v, HERB, 1, low & ~has_food)
+        self._use_herb(v, bought)
+
+    def _gain_skill(self, v, mask):
+        cfg = self.config
+        max_skill = cfg.MAX_SKILL_MULTIPLIER if self.roles[v] != Role.Blacksmith else 1.5
+        self.skill[mask, v] = np.minimum(max_skill, self.skill[mask, v] + cfg.SKILL_GAIN_PER_ACTION)
+
+    def _yield_with_tool(self, v, base_yield, fallback_yield, max_multiplier, mask):
+        cfg = self.config
+        has_tool = mask & (self.tool_durability[:, v] > 0)
+        self.tool_durability[has_tool, v] -= 1
+        skill = self.skill[:, v]
+        multiplier = np.minimum(1 + np.minimum(skill, cfg.MAX_SKILL_BONUS) + cfg.TOOL_YIELD_BASE, max_multiplier)
+        with_tool = np.floor(base_yield * multiplier)
+        without = np.floor(fallback_yield * skill)
+        return np.where(has_tool, with_tool, without)
+
+    def _first_tile(self, terrain):
+        # Reference villagers work the first matching tile in row-major order.
+        productive = self.terrain_masks[terrain] & (self.tiles > 0)
+        index = productive.argmax(axis=1)
+        found = productive[self.worlds, index]
+        return index, found
+
+    def _forage(self, v, mask):
+        self.inventory[mask, v, FOOD] += self.config.FORAGE_FOOD_GAIN
+
+    def _farm(self, v, mask):
+        cfg = self.config
+        index, found = self._first_tile(int(Terrain.field))
+        level = self.tiles[self.worlds, index]
+        at_max = found & (level >= cfg.MAX_FIELD_RESOURCE)
+        work = mask & found & ~at_max
+        self._forage(v, mask & ~work)
+        if not work.any():
+            return
+        self._gain_skill(v, work)
+        season = cfg.calendar(self.tick)[2]
+        if season == Season.Autumn:
+            amount = np.minimum(level, cfg.MAX_FIELD_RESOURCE)
+            amount = self._yield_with_tool(v, amount, np.maximum(1, amount // 2), 3.0, work)
+            amount = np.floor(amount * self.skill[:, v])
+            self.inventory[work, v, FOOD] += amount[work].astype(np.int64)
+            self.tiles[self.worlds[work], index[work]] = 0
+        elif season == Season.Winter:
+            self.tiles[self.worlds[work], index[work]] = np.floor(level[work] * cfg.WINTER_FIELD_LOSS)
+            self._forage(v, work)
+        else:
+            amount = self._yield_with_tool(v, cfg.BASE_FARM_YIELD, cfg.FALLBACK_FARM_YIELD, 3.0, work)
+            self.tiles[self.worlds[work], index[work]] = np.minimum(level + amount, cfg.MAX_FIELD_RESOURCE)[work]
+
+    def _hunt(self, v, mask):
+        index, found = self._first_tile(int(Terrain.forest))
+        work = mask & found
+        level = self.tiles[self.worlds, index]
+        harvest = np.minimum(self.config.HUNT_MAX_HARVEST, level)
+        self.tiles[self.worlds[work], index[work]] -= harvest[work]
+        self.inventory[work, v, FOOD] += harvest[work].astype(np.int64)
+        self._forage(v, mask & ~found)
+
+    def _log_wood(self, v, mask):
+        cfg = self.config
+        self._gain_skill(v, mask)
+        index, found = self._first_tile(int(Terrain.forest))
+        work = mask & found
+        self._forage(v, mask & ~found)
+        amount = self._yield_with_tool(v, cfg.BASE_LOG_YIELD, cfg.FALLBACK_LOG_YIELD,
+                                       cfg.MAX_LOG_WOOD_YIELD_MULTIPLIER, work)
+        self.inventory[work, v, WOOD] += amount[work].astype(np.int64)
+        level = self.tiles[self.worlds, index]
+        self.tiles[self.worlds[work], index[work]] = np.maximum(level - cfg.LOGWOOD_RESOURCE_DECREASE, 0)[work]
+
+    def _craft(self, v, mask):
+        # Count missing role tools across the village; the most needed one is sold.
+        needs = {}
+        for u, tool in enumerate(self.role_tool):
+            if tool is not None:
+                missing = self.alive[:, u] & (self.tool_durability[:, u] == 0)
+                needs[tool] = needs.get(tool, 0) + missing
+        if not needs:
+            return
+        tools = list(needs)
+        counts = np.stack([np.broadcast_to(needs[t], (self.num_worlds,)) for t in tools], axis=1)
+        chosen = np.array(tools)[counts.argmax(axis=1)]
+        ok = mask & (counts.max(axis=1) > 0) & (self.stock[:, WOOD] >= 1)
+        self.coins[:, v] += np.where(ok, self._price_of(chosen), 0)
+        self.stock[ok, WOOD] -= 1
+
+    def _price_of(self, items):
+        decayed = self.stock[self.worlds, items] >= self.max_stock[items]
+        return np.where(decayed, self.price[items] * self.config.MARKET_PRICE_DECAY, self.price[items])
+
+    def _role_action(self, v, mask):
+        no_food = mask & (self.inventory[:, v, FOOD] == 0)
+        self._buy(v, FOOD, 1, no_food)
+        action = self.role_action[v]
+        if action == "farm":
+            self._farm(v, mask)
+        elif action == "hunt":
+            self._hunt(v, mask)
+        elif action == "log_wood":
+            self._log_wood(v, mask)
+        elif action == "craft":
+            self._craft(v, mask)
+        else:
+            self._forage(v, mask)
+
+    def _morning(self, v, mask, winter):
+        cfg = self.config
+        self._emergency_recover(v, mask)
+        self._eat_if_needed(v, mask)
+        self._sell_surplus(v, mask)
+        self._buy(v, COOKED, 1, mask & (self.inventory[:, v, COOKED] < 3))
+        required = cfg.MIN_WOOD_RESERVE_WINTER if winter else 3
+        needed = required - self.inventory[:, v, WOOD]
+        self._buy(v, WOOD, np.maximum(needed, 0), mask & (needed > 0))
+        tool = self.role_tool[v]
+        if tool is not None:
+            want = mask & (self.tool_durability[:, v] == 0)
+            if winter:
+                want &= self.inventory[:, v, WOOD] >= cfg.MIN_WOOD_RESERVE_WINTER
+            self._buy(v, tool, 1, want)
+        self._role_action(v, mask)
+        self._cook(v, mask & (self.inventory[:, v, FOOD] > cfg.RAW_FOOD_SAFETY))
+        self._use_herb(v, mask & (self.health[:, v] < cfg.USE_HERB_HEALTH_THRESHOLD))
+
+    def _night(self, v, mask, winter):
+        cfg = self.config
+        if winter:
+            warm = mask & (self.inventory[:, v, WOOD] >= cfg.WINTER_WOOD_CONSUMPTION)
+            self.inventory[warm, v, WOOD] -= cfg.WINTER_WOOD_CONSUMPTION
+            cold = mask & ~warm
+            self.health[cold, v] = np.maximum(0, self.health[cold, v] - cfg.NO_WOOD_PENALTY)
+            self.happiness[cold, v] = np.maximum(0, self.happiness[cold, v] - cfg.NO_WOOD_PENALTY)
+        self._adjust_health(v, cfg.NIGHT_HEALTH_RECOVERY, mask)
+        rest = self.rest[mask, v] + cfg.REST_RECOVERY_PER_NIGHT
+        self.hunger[mask, v] = np.maximum(0, self.hunger[mask, v] - cfg.HUNGER_DECREMENT_PER_PART)
+        self.rest[mask, v] = np.minimum(np.maximum(0, rest - cfg.REST_DECREMENT_PER_PART), cfg.MAX_REST)
+        low_hunger = self.hunger[:, v] < cfg.HUNGER_LOW_PENALTY_THRESHOLD
+        low_rest = self.rest[:, v] < cfg.REST_LOW_PENALTY_THRESHOLD
+        self.low_hunger_streak[:, v] = np.where(mask, np.where(low_hunger, self.low_hunger_streak[:, v] + 1, 0),
+                                                self.low_hunger_streak[:, v])
+        self.low_rest_streak[:, v] = np.where(mask, np.where(low_rest, self.low_rest_streak[:, v] + 1, 0),
+                                              self.low_rest_streak[:, v])
+        for streak in (self.low_hunger_streak, self.low_rest_streak):
+            hurt = mask & (streak[:, v] > cfg.LOW_NEEDS_STREAK_THRESHOLD)
+            self.health[hurt, v] = np.maximum(0, self.health[hurt, v] - cfg.HEALTH_PENALTY_FOR_LOW_NEEDS)
+            self.happiness[hurt, v] = np.maximum(0, self.happiness[hurt, v] - cfg.HAPPINESS_PENALTY_FOR_LOW_NEEDS)
+
+    # -------------------------------------------------------------------------
+    # World events
+    # -------------------------------------------------------------------------
+
+    def _random_alive_villager(self, mask):
+        # Uniform pick among living villagers per world; -1 where none are alive.
+        weights = self.rng.random(self.alive.shape) * self.alive
+        victim = weights.argmax(axis=1)
+        return np.where(mask & self.alive.any(axis=1), victim, -1)
+
+    def _morning_events(self):
+        cfg = self.config
+        n = self.num_worlds
+        storm = self.rng.random(n) < cfg.STORM_PROBABILITY
+        disease = self.rng.random(n) < cfg.DISEASE_PROBABILITY
+        monster = self.rng.random(n) < cfg.MONSTER_SPAWN_PROB
+
+        if storm.any():
+            num_tiles = (cfg.GRID_WIDTH * cfg.GRID_HEIGHT) // cfg.STORM_AFFECTED_TILE_DIVISOR
+            worlds = np.flatnonzero(storm)
+            hits = np.zeros((len(worlds), self.tiles.shape[1]))
+            picks = self.rng.integers(0, self.tiles.shape[1], size=(len(worlds), num_tiles))
+            np.add.at(hits, (np.repeat(np.arange(len(worlds)), num_tiles), picks.ravel()), 1)
+            self.tiles[worlds] = np.maximum(0, self.tiles[worlds] - hits * cfg.STORM_RESOURCE_REDUCTION)
+
+        victim = self._random_alive_villager(disease)
+        hit = victim >= 0
+        self.health[hit, victim[hit]] = np.maximum(0, self.health[hit, victim[hit]] - cfg.DISEASE_HEALTH_LOSS)
+
+        victim = self._random_alive_villager(monster)
+        hit = np.flatnonzero(victim >= 0)
+        if hit.size:
+            low, high = cfg.MONSTER_HEALTH_RANGE
+            monster_health = self.rng.integers(low, high + 1, size=hit.size)
+            low, high = cfg.MONSTER_DAMAGE_RANGE
+            damage = self.rng.integers(low, high + 1, size=hit.size)
+            target = victim[hit]
+            fighting = self.health[hit, target] > 0
+            for _ in range(3):
+                monster_health -= np.where(fighting, self.rng.integers(1, 4, size=hit.size), 0)
+                dealt = self.rng.integers(1, damage + 1)
+                self.health[hit, target] = np.where(
+                    fighting, np.maximum(0, self.health[hit, target] - dealt), self.health[hit, target])
+                fighting &= (monster_health > 0) & (self.health[hit, target] > 0)
+
+    def _regrow(self):
+        forest = self.terrain_masks[int(Terrain.forest)]
+        np.copyto(self.tiles, np.minimum(self.tiles + 1, self.config.MAX_FOREST_RESOURCE), where=forest)
+
+    # -------------------------------------------------------------------------
+    # Main loop
+    # -------------------------------------------------------------------------
+
+    def run(self):
+        cfg = self.config
+        days = cfg.TOTAL_DAYS_TO_RUN
+        alive_per_day = np.zeros((self.num_worlds, days + 1), dtype=np.int64)
+        alive_per_day[:, 0] = self.alive.sum(axis=1)
+        start = time.perf_counter()
+        for day in range(1, days + 1):
+            winter = cfg.calendar(self.tick)[2] == Season.Winter
+            for part_index in range(cfg.NUM_PARTS):
+                for v in range(len(self.roles)):
+                    mask = self.alive[:, v] & (self.health[:, v] > 0)
+                    if not mask.any():
+                        continue
+                    if part_index == 0:
+                        self._morning(v, mask, winter)
+                    elif part_index == 1:
+                        self._role_action(v, mask)
+                        self._sell_surplus(v, mask)
+                    else:
+                        self._night(v, mask, winter)
+                if part_index == 0:
+                    self._morning_events()
+                elif part_index == cfg.NUM_PARTS - 1:
+                    self._regrow()
+                self.alive &= self.health > 0
+                self.tick += 1
+            alive_per_day[:, day] = self.alive.sum(axis=1)
+        elapsed = time.perf_counter() - start
+        return EnsembleResult(cfg, alive_per_day, self.coins.copy(), np.where(self.alive, self.health, 0), elapsed)
+
+
+if __name__ == "__main__":
+    num_worlds = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    result = EnsembleSimulation(CONFIG, num_worlds, seed).run()
+    print(result.summary())
@@ -0,0 +1,175 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from simulation import CONFIG, ItemId, Simulation
+
+# -----------------------------------------------------------------------------
+# GOLDEN-OUTPUT EQUIVALENCE HARNESS
+# -----------------------------------------------------------------------------
+#
+# Runs the reference configuration and an engine mode from the same seed and
+# compares, record by record, the tick records, the formatted log, the stats
+# timeseries and the final market stock. The first divergent tick and field
+# is reported together with the speedup of the mode over the reference.
+#
+#     python equivalence.py                     # every known engine mode
+#     python equivalence.py role-dispatch --days 30
+#     python equivalence.py DISPATCH_MODE=role ASYNC_EXPORT=true
+#     python equivalence.py role-dispatch --set NUM_FARMERS=300   # applied to both runs
+
+ENGINE_MODES = {
+    "role-dispatch": {"DISPATCH_MODE": "role"},
+    "async-export": {"ASYNC_EXPORT": True},
+    "async-coalesce": {"ASYNC_EXPORT": True, "EXPORT_BACKPRESSURE": "coalesce", "EXPORT_QUEUE_DAYS": 1},
+    "world-template": {"WORLD_TEMPLATE_DIR": "templates"},
+}
+
+
+class RunCapture:
+    def __init__(self, ticks, log_lines, timeseries, stock, elapsed):
+        self.ticks = ticks
+        self.log_lines = log_lines
+        self.timeseries = timeseries
+        self.stock = stock
+        self.elapsed = elapsed
+
+
+def run_capture(overrides, seed, days, workdir, base=None):
+    config = dict(CONFIG)
+    config.update(base or {})
+    config.update(overrides)
+    config["TOTAL_DAYS_TO_RUN"] = days
+    for key in ("LOG_FILENAME", "JOURNAL_FILENAME", "CHART_FILENAME"):
+        config[key] = os.path.join(workdir, os.path.basename(config[key]))
+    config["STATS_STORE_DIR"] = os.path.join(workdir, "stats")
+    if config["WORLD_TEMPLATE_DIR"]:
+        config["WORLD_TEMPLATE_DIR"] = os.path.join(workdir, config["WORLD_TEMPLATE_DIR"])
+
+    # Timed through the log export, so modes that overlap I/O get credit for it.
+    started = time.perf_counter()
+    sim = Simulation(config, seed=seed)
+    ticks = list(sim.ticks())
+    sim.finish(charts=False)
+    elapsed = time.perf_counter() - started
+
+    with open(config["LOG_FILENAME"], "r", encoding="utf-8") as f:
+        log_lines = f.readlines()
+    stock = {item.name: sim.world.market.get_stock(item) for item in ItemId}
+    return RunCapture(ticks, log_lines, sim.stats_collector.timeseries, stock, elapsed)
+
+
+def first_divergence(reference, candidate):
+    # Returns a description of the first difference, or None if the runs match.
+    for ref, alt in zip(reference.ticks, candidate.ticks):
+        for field in ref._fields:
+            if getattr(ref, field) != getattr(alt, field):
+                return (f"tick {ref.tick} (day {ref.day} {ref.part.name}), tick record field {field!r}: "
+                        f"{getattr(ref, field)!r} != {getattr(alt, field)!r}")
+    if len(reference.ticks) != len(candidate.ticks):
+        return f"tick count {len(reference.ticks)} != {len(candidate.ticks)}"
+
+    for i, (ref, alt) in enumerate(zip(reference.timeseries, candidate.timeseries)):
+        for field, value in ref.items():
+            if alt.get(field) != value:
+                return (f"day {ref['day']} {ref['part']}, stats row {i} (villager {ref['villager_id']}) "
+                        f"field {field!r}: {value!r} != {alt.get(field)!r}")
+    if len(reference.timeseries) != len(candidate.timeseries):
+        return f"stats row count {len(reference.timeseries)} != {len(candidate.timeseries)}"
+
+    for i, (ref, alt) in enumerate(zip(reference.log_lines, candidate.log_lines)):
+        if ref != alt:
+            return f"log line {i + 1}:\n    - {ref.rstrip()}\n    + {alt.rstrip()}"
+    if len(reference.log_lines) != len(candidate.log_lines):
+        return f"log line count {len(reference.log_lines)} != {len(candidate.log_lines)}"
+
+    for item, qty in reference.stock.items():
+        if candidate.stock[item] != qty:
+            return f"final market stock of {item}: {qty} != {candidate.stock[item]}"
+    return None
+
+
+def compare(name, overrides, seed, days, repeats=1, base=None):
+    workdir = tempfile.mkdtemp(prefix="equivalence_")
+    try:
+        # Template caches are filled by an untimed one-day run, so the timed
+        # runs measure the warm path even with --repeats 1.
+        for run_overrides in ({}, overrides):
+            if {**CONFIG, **(base or {}), **run_overrides}["WORLD_TEMPLATE_DIR"]:
+                run_capture(run_overrides, seed, 1, workdir, base)
+        reference = min((run_capture({}, seed, days, workdir, base) for _ in range(repeats)),
+                        key=lambda r: r.elapsed)
+        candidate = min((run_capture(overrides, seed, days, workdir, base) for _ in range(repeats)),
+                        key=lambda r: r.elapsed)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    divergence = first_divergence(reference, candidate)
+    return {
+        "mode": name,
+        "overrides": overrides,
+        "seed": seed,
+        "days": days,
+        "equivalent": divergence is None,
+        "divergence": divergence,
+        "reference_seconds": reference.elapsed,
+        "mode_seconds": candidate.elapsed,
+        "speedup": reference.elapsed / candidate.elapsed if candidate.elapsed else float("inf"),
+    }
+
+
+def _parse_override(spec):
+    key, _, value = spec.partition("=")
+    try:
+        return key, json.loads(value)
+    except json.JSONDecodeError:
+        return key, value
+
+
+def _parse_modes(specs):
+    if not specs:
+        return dict(ENGINE_MODES)
+    modes = {}
+    overrides = {}
+    for spec in specs:
+        if "=" in spec:
+            key, value = _parse_override(spec)
+            overrides[key] = value
+        elif spec in ENGINE_MODES:
+            modes[spec] = ENGINE_MODES[spec]
+        else:
+            raise SystemExit(f"Unknown mode {spec!r}; known modes: {', '.join(ENGINE_MODES)}")
+    if overrides:
+        modes[" ".join(f"{k}={v}" for k, v in overrides.items())] = overrides
+    return modes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check engine modes against the reference run.")
+    parser.add_argument("modes", nargs="*", help="named modes or KEY=VALUE config overrides")
+    parser.add_argument("--seed", type=int, action="append", help="repeatable; default 1")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                        help="config override applied to the reference and the mode")
+    parser.add_argument("--days", type=int, default=CONFIG["TOTAL_DAYS_TO_RUN"])
+    parser.add_argument("--repeats", type=int, default=1, help="best-of-N timing")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    base = dict(_parse_override(spec) for spec in args.set)
+    results = []
+    for name, overrides in _parse_modes(args.modes).items():
+        for seed in args.seed or [1]:
+            result = compare(name, overrides, seed, args.days, args.repeats, base)
+            results.append(result)
+            status = "OK  " if result["equivalent"] else "DIFF"
+            print(f"{status} {name:<16} seed {seed:<4} ref {result['reference_seconds']:.3f}s  "
+                  f"mode {result['mode_seconds']:.3f}s  speedup x{result['speedup']:.2f}")
+            if result["divergence"]:
+                print(f"     first divergence: {result['divergence']}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    sys.exit(0 if all(r["equivalent"] for r in results) else 1)
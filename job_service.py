@@ -0,0 +1,383 @@
+import argparse
+import collections
+import json
+import multiprocessing
+import multiprocessing.connection
+import os
+import queue
+import socket
+import socketserver
+import sys
+import threading
+import time
+import uuid
+
+from result_cache import summarize
+from simulation import CONFIG, PartOfDay, Simulation, compile_config
+
+# -----------------------------------------------------------------------------
+# LOCAL JOB SERVICE
+# -----------------------------------------------------------------------------
+#
+# A daemon that keeps a pool of worker processes with simulation (and so
+# pandas and plotly) already imported, and runs Simulation jobs sent to it
+# as config overrides plus a seed. Workers share a world template cache, so
+# repeated seeds skip world generation as well. Requests and replies are
+# one JSON object per line over localhost TCP or a Unix socket; a run
+# streams "queued", "started", "progress" and finally "done" (summary
+# metrics and artifact paths) or "error"/"rejected". A worker that dies
+# mid-job fails that job and is replaced.
+#
+#     python job_service.py serve --workers 4
+#     python job_service.py run --seed 3 --set NUM_FARMERS=30 --set TOTAL_DAYS_TO_RUN=40
+#     python job_service.py status
+
+DEFAULT_PORT = 8765
+DEFAULT_ARTIFACTS = "job_artifacts"
+
+
+def _run_job(job, events, artifact_root):
+    job_id = job["job"]
+    job_dir = os.path.join(artifact_root, f"job_{job_id}")
+    os.makedirs(job_dir, exist_ok=True)
+    config = dict(CONFIG)
+    config.update(job["overrides"])
+    for key in ("LOG_FILENAME", "CHART_FILENAME", "JOURNAL_FILENAME", "MEMORY_PROFILE_FILENAME"):
+        config[key] = os.path.join(job_dir, os.path.basename(config[key]))
+    config["STATS_STORE_DIR"] = os.path.join(job_dir, "stats")
+    if "WORLD_TEMPLATE_DIR" not in job["overrides"]:
+        config["WORLD_TEMPLATE_DIR"] = os.path.join(artifact_root, "templates")
+
+    every = job.get("progress_every", 1)
+    started = time.perf_counter()
+    sim = Simulation(config, seed=job["seed"])
+    event_count = 0
+    for record in sim.ticks():
+        event_count += len(record.events)
+        if record.part == PartOfDay.Night and record.day % every == 0:
+            events.put((job_id, {"event": "progress", "day": record.day, "alive": record.alive}))
+    sim.finish(charts=job.get("charts", False))
+    summary = summarize(sim, event_count, time.perf_counter() - started)
+
+    artifacts = {"log": config["LOG_FILENAME"]}
+    if job.get("charts"):
+        artifacts["charts"] = config["CHART_FILENAME"]
+    if config["STATS_STORE_ENABLED"]:
+        artifacts["stats_store"] = config["STATS_STORE_DIR"]
+    if config["JOURNAL_ENABLED"]:
+        artifacts["journal"] = config["JOURNAL_FILENAME"]
+    if config["MEMORY_PROFILE_ENABLED"]:
+        artifacts["memory_profile"] = config["MEMORY_PROFILE_FILENAME"]
+    return summary, artifacts
+
+
+def _worker(tasks, events, artifact_root):
+    # Runs the jobs handed to this worker until it receives None. Output from
+    # the engine's prints goes to the daemon's console.
+    while True:
+        job = tasks.get()
+        if job is None:
+            return
+        events.put((job["job"], {"event": "started", "worker": os.getpid()}))
+        try:
+            summary, artifacts = _run_job(job, events, artifact_root)
+        except Exception as exc:
+            events.put((job["job"], {"event": "error", "message": f"{type(exc).__name__}: {exc}"}))
+        else:
+            events.put((job["job"], {"event": "done", "summary": summary, "artifacts": artifacts}))
+
+
+class JobService:
+    """
+    Hands queued jobs to idle workers one at a time, so the service always
+    knows which job each worker holds. A watcher thread waits on the worker
+    sentinels; when a worker exits, its job (if any) fails with an "error"
+    event and a new worker takes the slot. Workers are started from a fork
+    server that has the engine imported, so replacements are warm too and
+    are never forked from the threaded daemon.
+    """
+    def __init__(self, workers, max_queued, artifact_root):
+        self.max_queued = max_queued
+        self.artifact_root = os.path.abspath(artifact_root)
+        os.makedirs(self.artifact_root, exist_ok=True)
+        methods = multiprocessing.get_all_start_methods()
+        self.context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        if "forkserver" in methods:
+            self.context.set_forkserver_preload(["simulation", "result_cache"])
+        self.events = self.context.Queue()
+        self.lock = threading.Lock()
+        self.pending = collections.deque()
+        self.slots = [None] * workers  # (process, task queue) per slot
+        self.assigned = {}  # slot -> job id of the job the worker holds
+        self.active = {}  # job id -> slot, for jobs handed to a worker
+        self.started = set()
+        self.listeners = {}
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.restarts = 0
+        self.closing = False
+        self.started_at = time.time()
+        for slot in range(workers):
+            self._start_worker(slot)
+        self.router = threading.Thread(target=self._route_events, name="job-events", daemon=True)
+        self.router.start()
+        self.watcher = threading.Thread(target=self._watch_workers, name="job-workers", daemon=True)
+        self.watcher.start()
+
+    def _start_worker(self, slot):
+        tasks = self.context.Queue()
+        process = self.context.Process(target=_worker, args=(tasks, self.events, self.artifact_root), daemon=True)
+        process.start()
+        self.slots[slot] = (process, tasks)
+
+    def _dispatch(self):
+        # Called with the lock held: gives pending jobs to idle workers.
+        for slot, (process, tasks) in enumerate(self.slots):
+            if not self.pending:
+                return
+            if slot not in self.assigned and process.is_alive():
+                job = self.pending.popleft()
+                self.assigned[slot] = job["job"]
+                self.active[job["job"]] = slot
+                tasks.put(job)
+
+    def _finish(self, job_id, kind):
+        # Called with the lock held; returns the job's listener.
+        slot = self.active.pop(job_id)
+        del self.assigned[slot]
+        self.started.discard(job_id)
+        if kind == "done":
+            self.completed += 1
+        else:
+            self.failed += 1
+        return self.listeners.pop(job_id, None)
+
+    def _route_events(self):
+        while True:
+            item = self.events.get()
+            if item is None:
+                return
+            job_id, event = item
+            event["job"] = job_id
+            with self.lock:
+                # Jobs already failed because their worker died are ignored.
+                if job_id not in self.active:
+                    continue
+                kind = event["event"]
+                listener = self.listeners.get(job_id)
+                if kind == "started":
+                    self.started.add(job_id)
+                    self.queued -= 1
+                    self.running += 1
+                elif kind in ("done", "error"):
+                    self.running -= 1
+                    listener = self._finish(job_id, kind)
+                    self._dispatch()
+            if listener is not None:
+                listener.put(event)
+
+    def _watch_workers(self):
+        while True:
+            with self.lock:
+                if self.closing:
+                    return
+                sentinels = {process.sentinel: slot for slot, (process, _) in enumerate(self.slots)}
+            ready = multiprocessing.connection.wait(list(sentinels), timeout=1.0)
+            for sentinel in ready:
+                slot = sentinels[sentinel]
+                with self.lock:
+                    if self.closing:
+                        return
+                    process = self.slots[slot][0]
+                    process.join()
+                    job_id = self.assigned.get(slot)
+                    listener = None
+                    if job_id is not None:
+                        # The job may not have reported "started" yet.
+                        if job_id in self.started:
+                            self.running -= 1
+                        else:
+                            self.queued -= 1
+                        listener = self._finish(job_id, "error")
+                    self.restarts += 1
+                    self._start_worker(slot)
+                    self._dispatch()
+                if listener is not None:
+                    listener.put({"event": "error", "job": job_id,
+                                  "message": f"Worker {process.pid} exited with code {process.exitcode}"})
+
+    def submit(self, request):
+        # Yields the job's events, ending with "done", "error" or "rejected".
+        overrides = request.get("overrides", {})
+        seed = request.get("seed", 1)
+        try:
+            config = dict(CONFIG)
+            config.update(overrides)
+            compile_config(config)
+        except (ValueError, TypeError, KeyError) as exc:
+            yield {"event": "error", "message": f"Invalid config: {exc}"}
+            return
+        listener = queue.Queue()
+        with self.lock:
+            if self.queued >= self.max_queued:
+                yield {"event": "rejected", "reason": f"queue full ({self.queued} jobs waiting)"}
+                return
+            # Unique across daemon restarts, since it names the job's artifact directory.
+            job_id = uuid.uuid4().hex[:12]
+            self.queued += 1
+            position = self.queued
+            self.listeners[job_id] = listener
+            self.pending.append({"job": job_id, "overrides": overrides, "seed": seed,
+                                 "charts": bool(request.get("charts")),
+                                 "progress_every": max(1, int(request.get("progress_every", 1)))})
+            self._dispatch()
+        yield {"event": "queued", "job": job_id, "position": position}
+        while True:
+            event = listener.get()
+            yield event
+            if event["event"] in ("done", "error"):
+                return
+
+    def status(self):
+        with self.lock:
+            return {
+                "event": "status",
+                "workers": sum(process.is_alive() for process, _ in self.slots),
+                "queued": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+                "failed": self.failed,
+                "worker_restarts": self.restarts,
+                "max_queued": self.max_queued,
+                "artifacts": self.artifact_root,
+                "uptime_seconds": round(time.time() - self.started_at, 1),
+            }
+
+    def close(self):
+        with self.lock:
+            self.closing = True
+        self.watcher.join()
+        for _, tasks in self.slots:
+            tasks.put(None)
+        for process, _ in self.slots:
+            process.join(timeout=5)
+        self.events.put(None)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def _send(self, message):
+        self.wfile.write((json.dumps(message) + "\n").encode())
+        self.wfile.flush()
+
+    def handle(self):
+        service = self.server.service
+        try:
+            for line in self.rfile:
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                except json.JSONDecodeError as exc:
+                    self._send({"event": "error", "message": f"Bad request: {exc}"})
+                    continue
+                op = request.get("op")
+                if op == "status":
+                    self._send(service.status())
+                elif op == "run":
+                    for event in service.submit(request):
+                        self._send(event)
+                else:
+                    self._send({"event": "error", "message": f"Unknown op {op!r}; use 'run' or 'status'"})
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away; its job still finishes and is counted.
+            pass
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(workers, max_queued, artifact_root, port=DEFAULT_PORT, socket_path=None):
+    service = JobService(workers, max_queued, artifact_root)
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = _UnixServer(socket_path, _Handler)
+        where = socket_path
+    else:
+        server = _TCPServer(("127.0.0.1", port), _Handler)
+        where = f"127.0.0.1:{port}"
+    server.service = service
+    print(f"Job service on {where} with {workers} workers, up to {max_queued} queued jobs")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+def request(message, port=DEFAULT_PORT, socket_path=None):
+    # Sends one request to a running service and yields its replies.
+    if socket_path:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(socket_path)
+    else:
+        sock = socket.create_connection(("127.0.0.1", port))
+    with sock, sock.makefile("rwb") as stream:
+        stream.write((json.dumps(message) + "\n").encode())
+        stream.flush()
+        for line in stream:
+            reply = json.loads(line)
+            yield reply
+            if reply["event"] in ("done", "error", "rejected", "status"):
+                return
+
+
+def _parse_override(spec):
+    key, _, value = spec.partition("=")
+    try:
+        return key, json.loads(value)
+    except json.JSONDecodeError:
+        return key, value
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run simulation jobs on a pool of warm worker processes.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--socket", help="Unix socket path instead of localhost TCP")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve")
+    serve_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    serve_parser.add_argument("--max-queued", type=int, default=64)
+    serve_parser.add_argument("--artifacts", default=DEFAULT_ARTIFACTS)
+    run_parser = commands.add_parser("run")
+    run_parser.add_argument("--seed", type=int, default=1)
+    run_parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE", help="config override")
+    run_parser.add_argument("--charts", action="store_true")
+    run_parser.add_argument("--progress-every", type=int, default=10, help="days between progress events")
+    commands.add_parser("status")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(args.workers, args.max_queued, args.artifacts, args.port, args.socket)
+        sys.exit()
+    if args.command == "status":
+        message = {"op": "status"}
+    else:
+        message = {"op": "run", "seed": args.seed, "overrides": dict(_parse_override(s) for s in args.set),
+                   "charts": args.charts, "progress_every": args.progress_every}
+    last = None
+    for last in request(message, args.port, args.socket):
+        print(json.dumps(last))
+    sys.exit(0 if last and last["event"] in ("done", "status") else 1)
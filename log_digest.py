@@ -0,0 +1,194 @@
+import heapq
+import math
+import re
+import sys
+from collections import defaultdict
+
+# -----------------------------------------------------------------------------
+# STREAMING LOG DIGEST
+# -----------------------------------------------------------------------------
+#
+# Summarises simulation_log.txt in a single pass without holding the log in
+# memory. Everything kept here is bounded by the number of distinct message
+# templates, roles and villagers, not by how many days were simulated, so the
+# rendered digest stays the same size however long the run was.
+
+LINE_PATTERN = re.compile(r"^Day (\d+) (?:- Villager (\d+) \(([^)]*)\)|\[SYSTEM\]): (.*)$")
+NUMBER_PATTERN = re.compile(r"-?\d+(?:\.\d+)?")
+OVERFLOW_PATTERN = re.compile(r"max capacity for (\w+), overflow of (-?\d+(?:\.\d+)?) discarded")
+PART_PREFIX = re.compile(r"^(\w+): ")
+
+MAX_TEMPLATES = 500
+TOP_EXTREMES = 3
+OUTLIER_Z = 4.0
+
+
+class _RunningStats:
+    # Welford mean/variance plus the few most extreme samples seen.
+    __slots__ = ("count", "mean", "m2", "high", "low")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.high = []
+        self.low = []
+
+    def add(self, value, where):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        entry = (value, where)
+        if len(self.high) < TOP_EXTREMES:
+            heapq.heappush(self.high, entry)
+            heapq.heappush(self.low, (-value, where))
+        else:
+            heapq.heappushpop(self.high, entry)
+            heapq.heappushpop(self.low, (-value, where))
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def outliers(self):
+        if self.std == 0:
+            return []
+        found = [(v, w) for v, w in self.high] + [(-v, w) for v, w in self.low]
+        return [(abs(v - self.mean) / self.std, v, w) for v, w in set(found)
+                if abs(v - self.mean) / self.std >= OUTLIER_Z]
+
+
+class LogDigest:
+    def __init__(self):
+        self.lines = 0
+        self.messages = 0
+        self.max_day = 0
+        # template -> [count, first (day, villager), last (day, villager)]
+        self.templates = {}
+        self.other_messages = 0
+        self.value_stats = defaultdict(_RunningStats)
+        self.deaths_by_role = defaultdict(int)
+        self.deaths_by_day = defaultdict(int)
+        self.first_death_day = None
+        self.last_death_day = None
+        self.overflow = defaultdict(float)
+        self.overflow_events = 0
+        self.cold_last_day = {}
+        self.cold_streak = {}
+        self.cold_nights = 0
+        self.longest_cold = {}  # villager -> (length, role, end_day)
+
+    def feed(self, line):
+        match = LINE_PATTERN.match(line.rstrip("\n"))
+        if not match:
+            return
+        self.lines += 1
+        day = int(match.group(1))
+        villager = int(match.group(2)) if match.group(2) else 0
+        role = match.group(3) or "SYSTEM"
+        self.max_day = max(self.max_day, day)
+        for message in match.group(4).split("; "):
+            self._feed_message(day, villager, role, PART_PREFIX.sub("", message, count=1))
+
+    def _feed_message(self, day, villager, role, message):
+        self.messages += 1
+        template = NUMBER_PATTERN.sub("#", message)
+        where = (day, villager)
+        entry = self.templates.get(template)
+        if entry is None:
+            if len(self.templates) >= MAX_TEMPLATES:
+                self.other_messages += 1
+                return
+            entry = self.templates[template] = [0, where, where]
+        entry[0] += 1
+        entry[2] = where
+
+        numbers = NUMBER_PATTERN.findall(message)
+        if template.startswith("End of day summary"):
+            for name, value in zip(("hunger", "rest", "health", "happiness", "coins"), numbers):
+                self.value_stats[f"end-of-day {name}"].add(float(value), where)
+        elif numbers:
+            self.value_stats[template].add(float(numbers[0]), where)
+
+        if message.startswith("Perished"):
+            self.deaths_by_role[role] += 1
+            self.deaths_by_day[day] += 1
+            if self.first_death_day is None:
+                self.first_death_day = day
+            self.last_death_day = day
+        elif message.startswith("No wood => suffered cold"):
+            self._feed_cold(day, villager, role)
+        else:
+            overflow = OVERFLOW_PATTERN.search(message)
+            if overflow:
+                self.overflow[overflow.group(1)] += float(overflow.group(2))
+                self.overflow_events += 1
+
+    def _feed_cold(self, day, villager, role):
+        self.cold_nights += 1
+        streak = self.cold_streak.get(villager, 0)
+        streak = streak + 1 if self.cold_last_day.get(villager) == day - 1 else 1
+        self.cold_streak[villager] = streak
+        self.cold_last_day[villager] = day
+        if streak >= self.longest_cold.get(villager, (0,))[0]:
+            self.longest_cold[villager] = (streak, role, day)
+
+    def render(self, max_templates=40):
+        out = [f"Log digest: {self.lines} lines, {self.messages} messages, days 1-{self.max_day}."]
+
+        total_deaths = sum(self.deaths_by_role.values())
+        out.append("")
+        out.append(f"Deaths: {total_deaths}" + (
+            f" (first day {self.first_death_day}, last day {self.last_death_day})" if total_deaths else ""))
+        for role, count in sorted(self.deaths_by_role.items(), key=lambda x: -x[1]):
+            out.append(f"  {role}: {count}")
+        if self.deaths_by_day:
+            worst = sorted(self.deaths_by_day.items(), key=lambda x: (-x[1], x[0]))[:10]
+            out.append("  Deadliest days: " + ", ".join(f"day {d} ({c})" for d, c in sorted(worst)))
+
+        out.append("")
+        # Overflow lines are only written with LOG_MARKET_OVERFLOW on; the market
+        # ledger records every overflow either way.
+        out.append(f"Market overflow: {self.overflow_events} logged events"
+                   + ("" if self.overflow_events else " (logged only with LOG_MARKET_OVERFLOW; see the market ledger)"))
+        for item, qty in sorted(self.overflow.items(), key=lambda x: -x[1]):
+            out.append(f"  {item}: {qty:g} discarded")
+
+        out.append("")
+        out.append(f"Cold penalties: {self.cold_nights} villager-nights without wood")
+        longest = sorted(((v[0], k, v[1], v[2]) for k, v in self.longest_cold.items()), reverse=True)[:5]
+        for length, villager, role, end_day in longest:
+            out.append(f"  Villager {villager} ({role}): {length} nights in a row, ending day {end_day}")
+
+        outliers = []
+        for name, stats in self.value_stats.items():
+            for z, value, (day, villager) in stats.outliers():
+                outliers.append((z, name, value, day, villager, stats.mean))
+        out.append("")
+        out.append(f"Outliers (|z| >= {OUTLIER_Z:g}): {len(outliers)}")
+        for z, name, value, day, villager, mean in sorted(outliers, reverse=True)[:10]:
+            who = f"villager {villager}" if villager else "system"
+            out.append(f"  {name!r}: {value:g} on day {day} ({who}), mean {mean:.2f}, z={z:.1f}")
+
+        templates = sorted(self.templates.items(), key=lambda x: -x[1][0])
+        out.append("")
+        out.append(f"Message templates: {len(self.templates)} distinct"
+                   + (f", {self.other_messages} messages past the template cap" if self.other_messages else ""))
+        for template, (count, first, last) in templates[:max_templates]:
+            out.append(f"  {count:>7} x {template}  [first day {first[0]} V{first[1]}, last day {last[0]} V{last[1]}]")
+        if len(templates) > max_templates:
+            out.append(f"  ... {len(templates) - max_templates} rarer templates omitted")
+        return "\n".join(out)
+
+
+def digest_log(filename):
+    digest = LogDigest()
+    with open(filename, "r", encoding="utf-8") as f:
+        for line in f:
+            digest.feed(line)
+    return digest
+
+
+if __name__ == "__main__":
+    print(digest_log(sys.argv[1] if len(sys.argv) > 1 else "simulation_log.txt").render())
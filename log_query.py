@@ -0,0 +1,214 @@
+import argparse
+import mmap
+import os
+import pickle
+import sys
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+from log_digest import LINE_PATTERN, NUMBER_PATTERN, PART_PREFIX
+
+# -----------------------------------------------------------------------------
+# INDEXED LOG QUERIES
+# -----------------------------------------------------------------------------
+#
+# The first query against a log builds a sidecar index (<log>.idx) holding the
+# byte offset, day, villager and role of every line plus posting lists per
+# villager, role and message template. Later queries bisect the day range,
+# intersect the smallest posting list with the other filters and slice the
+# matching lines straight out of an mmap of the log.
+
+INDEX_VERSION = 1
+
+
+class LogIndex:
+    def __init__(self, log_filename):
+        self.log_filename = log_filename
+        self.index_filename = log_filename + ".idx"
+        self._file = None
+        self._mmap = None
+        if not self._load():
+            self.build()
+
+    # -------------------------------------------------------------------------
+    # Index construction
+    # -------------------------------------------------------------------------
+
+    def _signature(self):
+        stat = os.stat(self.log_filename)
+        return INDEX_VERSION, stat.st_size, stat.st_mtime_ns
+
+    def _load(self):
+        try:
+            with open(self.index_filename, "rb") as f:
+                data = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return False
+        if data.get("signature") != self._signature():
+            return False
+        self.__dict__.update(data["index"])
+        return True
+
+    def build(self):
+        offsets = array("Q")
+        days = array("I")
+        villagers = array("I")
+        role_ids = array("H")
+        roles = {}
+        by_villager = {}
+        by_role = {}
+        by_template = {}
+        with open(self.log_filename, "rb") as f:
+            offset = 0
+            for line_no, raw in enumerate(f):
+                offsets.append(offset)
+                offset += len(raw)
+                match = LINE_PATTERN.match(raw.decode("utf-8").rstrip("\n"))
+                if not match:
+                    days.append(0)
+                    villagers.append(0)
+                    role_ids.append(roles.setdefault("", len(roles)))
+                    continue
+                day = int(match.group(1))
+                villager = int(match.group(2)) if match.group(2) else 0
+                role = match.group(3) or "SYSTEM"
+                role_id = roles.setdefault(role, len(roles))
+                days.append(day)
+                villagers.append(villager)
+                role_ids.append(role_id)
+                by_villager.setdefault(villager, array("I")).append(line_no)
+                by_role.setdefault(role_id, array("I")).append(line_no)
+                seen = set()
+                for message in match.group(4).split("; "):
+                    template = NUMBER_PATTERN.sub("#", PART_PREFIX.sub("", message, count=1))
+                    if template not in seen:
+                        seen.add(template)
+                        by_template.setdefault(template, array("I")).append(line_no)
+            offsets.append(offset)
+
+        # Lines are written in day order; keep day lookups valid if one is not.
+        self.sorted_by_day = all(days[i] <= days[i + 1] for i in range(len(days) - 1))
+        self.offsets = offsets
+        self.days = days
+        self.villagers = villagers
+        self.role_ids = role_ids
+        self.roles = roles
+        self.by_villager = by_villager
+        self.by_role = by_role
+        self.by_template = by_template
+        index = {k: getattr(self, k) for k in ("sorted_by_day", "offsets", "days", "villagers", "role_ids",
+                                              "roles", "by_villager", "by_role", "by_template")}
+        with open(self.index_filename, "wb") as f:
+            pickle.dump({"signature": self._signature(), "index": index}, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    # -------------------------------------------------------------------------
+    # Queries
+    # -------------------------------------------------------------------------
+
+    def _open(self):
+        if self._mmap is None:
+            self._file = open(self.log_filename, "rb")
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._file.close()
+            self._mmap = self._file = None
+
+    def line(self, line_no):
+        data = self._open()[self.offsets[line_no]:self.offsets[line_no + 1]]
+        return data.decode("utf-8").rstrip("\n")
+
+    def templates(self, pattern):
+        return [t for t in self.by_template if pattern in t]
+
+    def query_lines(self, day_from=None, day_to=None, villager=None, role=None, template=None):
+        # Returns the sorted line numbers matching every given filter.
+        total = len(self.days)
+        lo, hi = 0, total
+        if self.sorted_by_day:
+            if day_from is not None:
+                lo = bisect_left(self.days, day_from)
+            if day_to is not None:
+                hi = bisect_right(self.days, day_to)
+
+        candidates = []
+        if villager is not None:
+            candidates.append(self.by_villager.get(villager, array("I")))
+        role_id = None
+        if role is not None:
+            role_id = self.roles.get(role, -1)
+            candidates.append(self.by_role.get(role_id, array("I")))
+        template_lines = None
+        if template is not None:
+            names = self.templates(template)
+            if len(names) == 1:
+                template_lines = self.by_template[names[0]]
+            else:
+                template_lines = sorted({n for name in names for n in self.by_template[name]})
+            candidates.append(template_lines)
+
+        postings = None
+        if candidates:
+            postings = min(candidates, key=len)
+            lines = postings[bisect_left(postings, lo):bisect_left(postings, hi)]
+        else:
+            lines = range(lo, hi)
+        # Villager and role are checked per line; template membership by bisection.
+        if template_lines is postings:
+            template_lines = None
+
+        matches = []
+        for n in lines:
+            day = self.days[n]
+            if day_from is not None and day < day_from or day_to is not None and day > day_to:
+                continue
+            if villager is not None and self.villagers[n] != villager:
+                continue
+            if role_id is not None and self.role_ids[n] != role_id:
+                continue
+            if template_lines is not None:
+                i = bisect_left(template_lines, n)
+                if i == len(template_lines) or template_lines[i] != n:
+                    continue
+            matches.append(n)
+        return matches
+
+    def query(self, day_from=None, day_to=None, villager=None, role=None, template=None):
+        """
+        Yields matching log lines. With a template filter only the matching
+        messages of each line are returned, prefixed by the line's header.
+        """
+        for n in self.query_lines(day_from, day_to, villager, role, template):
+            text = self.line(n)
+            if template is None:
+                yield text
+                continue
+            header, _, body = text.partition(": ")
+            hits = [m for m in body.split("; ") if template in NUMBER_PATTERN.sub("#", m)]
+            yield f"{header}: {'; '.join(hits)}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query simulation_log.txt through a sidecar index.")
+    parser.add_argument("--log", default="simulation_log.txt")
+    parser.add_argument("--day-from", type=int)
+    parser.add_argument("--day-to", type=int)
+    parser.add_argument("--villager", type=int)
+    parser.add_argument("--role")
+    parser.add_argument("--template", help="substring of a message template, e.g. 'Perished'")
+    parser.add_argument("--count", action="store_true", help="print only the number of matching lines")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    index = LogIndex(args.log)
+    indexed = time.perf_counter()
+    if args.count:
+        print(len(index.query_lines(args.day_from, args.day_to, args.villager, args.role, args.template)))
+    else:
+        for text in index.query(args.day_from, args.day_to, args.villager, args.role, args.template):
+            print(text)
+    print(f"(index {indexed - started:.3f}s, query {time.perf_counter() - indexed:.3f}s)", file=sys.stderr)
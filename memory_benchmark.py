@@ -0,0 +1,77 @@
+import gc
+import sys
+import tracemalloc
+
+from simulation import (CONFIG, Item, ItemId, Monster, Role, SimulationLog, Terrain, Tile, Villager,
+                        World, compile_config)
+
+# -----------------------------------------------------------------------------
+# PER-ENTITY MEMORY BENCHMARK
+# -----------------------------------------------------------------------------
+#
+# Measures with tracemalloc how many bytes one Tile, Item, Monster and
+# Villager (including its status and inventory) costs, next to an otherwise
+# identical class that keeps a per-instance __dict__. Exits non-zero when a
+# slotted entity grows past its budget, so the footprint cannot creep back.
+
+BUDGET_BYTES = {
+    "Tile": 64,
+    "Item": 96,
+    "Monster": 96,
+    "Villager": 1200,
+}
+
+
+def _unslotted(cls):
+    # Same class body without __slots__, i.e. what the entity used to cost.
+    namespace = {k: v for k, v in vars(cls).items()
+                 if k not in cls.__slots__ and k not in ("__slots__", "__dict__", "__weakref__")}
+    return type(cls.__name__, cls.__bases__, namespace)
+
+
+def bytes_per_object(factory, count):
+    objects = [None] * count
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for i in range(count):
+        objects[i] = factory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    total = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del objects
+    return total / count
+
+
+def run_benchmark(count):
+    world = World(compile_config(CONFIG), SimulationLog())
+    factories = {
+        "Tile": lambda cls: (lambda: cls(Terrain.forest, 7)),
+        "Item": lambda cls: (lambda: cls(ItemId.axe, 1, 10)),
+        "Monster": lambda cls: (lambda: cls("Wolf", 30, 5, 3, 4)),
+        "Villager": lambda cls: (lambda: cls(1, Role.Farmer, world)),
+    }
+    classes = {"Tile": Tile, "Item": Item, "Monster": Monster, "Villager": Villager}
+    results = {}
+    for name, cls in classes.items():
+        n = count if name != "Villager" else max(1, count // 100)
+        slotted = bytes_per_object(factories[name](cls), n)
+        with_dict = bytes_per_object(factories[name](_unslotted(cls)), n)
+        results[name] = (slotted, with_dict)
+    return results
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    over_budget = []
+    print(f"{'entity':<10}{'slotted':>12}{'__dict__':>12}{'saved':>9}{'budget':>9}")
+    results = run_benchmark(count)
+    for name, (slotted, with_dict) in results.items():
+        saved = 1 - slotted / with_dict if with_dict else 0.0
+        print(f"{name:<10}{slotted:>11.1f}B{with_dict:>11.1f}B{saved:>8.0%}{BUDGET_BYTES[name]:>8}B")
+        if slotted > BUDGET_BYTES[name]:
+            over_budget.append(name)
+    print(f"A 4096x4096 map needs about {results['Tile'][0] * 4096 * 4096 / 2**30:.2f} GiB of Tile objects.")
+    if over_budget:
+        print(f"Over budget: {', '.join(over_budget)}")
+        sys.exit(1)
@@ -1,4 +1,5 @@
 import pyperclip
+from log_digest import digest_log
 
 def generate_prompt():
     try:
@@ -6,21 +7,20 @@ def generate_prompt():
         with open('simulation.py', 'r', encoding='utf-8') as file:
             code = file.read()
         
-        # Read simulation logs
-        with open('simulation_log.txt', 'r', encoding='utf-8') as file:
-            logs = file.read()
+        # Summarise simulation logs in one streaming pass
+        digest = digest_log('simulation_log.txt').render()
         
         
         # Construct the prompt
         prompt = f"""You are a professional software developer. Below is the code for a middle-aged village simulation. 
-        Please analyze the code and logs to see if you find anything that don't make sense( like some number seems too large or too many people die) . 
+        Please analyze the code and the log digest to see if you find anything that don't make sense( like some number seems too large or too many people die) . 
         Carefully validate each identified issue, and if it is valid, modify the code accordingly while ensuring that the improvements remain practical and do not introduce unnecessary complexity.
 
 Code:
 {code}
 
-logs:
-{logs}
+Log digest:
+{digest}
 
 """
         
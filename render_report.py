@@ -0,0 +1,25 @@
+import sys
+import time
+
+from simulation import CONFIG, StatsCollector, StatsStore
+
+# -----------------------------------------------------------------------------
+# REPORT RE-RENDER
+# -----------------------------------------------------------------------------
+#
+# Rebuilds the chart page from a stats store written with
+# STATS_STORE_ENABLED, without running the simulation again. Season markers,
+# role counts and the embedded log come from the run's config saved in the
+# store; rows 1-3 show role means, reduced chunk by chunk:
+#
+#     python render_report.py [store_dir] [chart_filename]
+
+if __name__ == "__main__":
+    store_dir = sys.argv[1] if len(sys.argv) > 1 else CONFIG["STATS_STORE_DIR"]
+    chart_filename = sys.argv[2] if len(sys.argv) > 2 else CONFIG["CHART_FILENAME"]
+    started = time.perf_counter()
+    collector = StatsCollector.from_store(store_dir)
+    config = StatsStore.open(store_dir).run_config()
+    loaded = time.perf_counter()
+    collector.generate_charts(chart_filename, config)
+    print(f"Loaded {store_dir} in {loaded - started:.2f}s, rendered in {time.perf_counter() - loaded:.2f}s")
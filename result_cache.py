@@ -0,0 +1,228 @@
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import simulation
+from simulation import CONFIG, ItemId, Role, Simulation, StatsCollector, compile_config
+
+# -----------------------------------------------------------------------------
+# RESULT CACHE
+# -----------------------------------------------------------------------------
+#
+# Runs a configuration once per (effective config, seed, engine code) and
+# keeps its summary metrics, and optionally its stats store, on disk. Asking
+# again for the same run returns the stored summary without simulating.
+# Output paths and other settings that cannot change the outcome are left
+# out of the key, and so is the chart code, so reworking the reports does
+# not throw the cache away. Entries are evicted least recently used first
+# once the cache grows past its size budget.
+#
+#     python result_cache.py --seed 7 --set NUM_FARMERS=30
+#     python result_cache.py --seed 7 --stats-store   # then render_report.py on the printed path
+
+CACHE_VERSION = 2
+DEFAULT_DIR = "result_cache"
+DEFAULT_MAX_BYTES = 512 * 2**20
+
+# Settings that only decide where and how outputs are written.
+OUTPUT_KEYS = (
+    "LOG_FILENAME", "CHART_FILENAME", "CHART_HEIGHT", "LOG_MARKET_OVERFLOW", "MARKET_HISTORY_LENGTH",
+    "JOURNAL_ENABLED", "JOURNAL_FILENAME", "JOURNAL_KEYFRAME_INTERVAL",
+    "ASYNC_EXPORT", "EXPORT_QUEUE_DAYS", "EXPORT_BACKPRESSURE",
+    "STATS_STORE_ENABLED", "STATS_STORE_DIR", "STATS_STORE_CHUNK_ROWS", "WORLD_TEMPLATE_DIR",
+    "MEMORY_PROFILE_ENABLED", "MEMORY_PROFILE_EVERY_DAYS", "MEMORY_PROFILE_FILENAME",
+)
+# Settings that only shape the stats rows. They are left out of the key too;
+# an entry's stats store is only reused when they match.
+STATS_KEYS = ("STATS_MODE", "STATS_EVERY_N_TICKS", "STATS_SAMPLE_PER_ROLE", "STATS_SAMPLE_SEED")
+REPORTING_CODE = (StatsCollector.generate_charts,)
+
+_code_version = None
+
+
+def code_version():
+    # Hash of the engine source, minus the reporting code.
+    global _code_version
+    if _code_version is None:
+        source = inspect.getsource(simulation)
+        for fn in REPORTING_CODE:
+            source = source.replace(inspect.getsource(fn), "")
+        _code_version = hashlib.sha256(source.encode()).hexdigest()
+    return _code_version
+
+
+def summarize(sim, events, elapsed):
+    world = sim.world
+    alive = world.villagers
+
+    def mean(values):
+        values = list(values)
+        return sum(values) / len(values) if values else 0.0
+
+    return {
+        "days": world.day_count - 1 if world.part == simulation.PartOfDay.Morning else world.day_count,
+        "abort_reason": sim.abort_reason,
+        "alerts": [[a.code, a.day, a.message] for a in sim.monitor.alerts] if sim.monitor else [],
+        "population": len(sim.villagers),
+        "alive": len(alive),
+        "alive_by_role": {role.name: sum(1 for v in alive if v.role == role) for role in Role},
+        "mean_coins": mean(v.coins for v in alive),
+        "mean_health": mean(v.status.health for v in alive),
+        "mean_hunger": mean(v.status.hunger for v in alive),
+        "mean_happiness": mean(v.status.happiness for v in alive),
+        "married": sum(1 for v in alive if v.relationship_status == "married"),
+        "market_stock": {item.name: world.market.get_stock(item) for item in ItemId},
+        "market": world.market.ledger.summary(),
+        "events": events,
+        "elapsed_seconds": elapsed,
+    }
+
+
+class ResultCache:
+    def __init__(self, directory=DEFAULT_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, config, seed):
+        if seed is None:
+            raise ValueError("Runs without a seed are not reproducible and cannot be cached")
+        plain = compile_config(config).to_dict()
+        effective = {k: v for k, v in plain.items() if k not in OUTPUT_KEYS and k not in STATS_KEYS}
+        blob = json.dumps([CACHE_VERSION, code_version(), seed, effective], sort_keys=True, default=str)
+        return hashlib.sha256(blob.encode()).hexdigest()[:32]
+
+    def entry_path(self, key):
+        return os.path.join(self.directory, key)
+
+    def stats_store_path(self, key):
+        return os.path.join(self.entry_path(key), "stats")
+
+    @staticmethod
+    def stats_settings(config):
+        plain = compile_config(config).to_dict()
+        return {name: plain[name] for name in STATS_KEYS}
+
+    def get(self, config, seed, with_stats_store=False):
+        # Returns the cached summary, or None on a miss.
+        key = self.key(config, seed)
+        summary_path = os.path.join(self.entry_path(key), "summary.json")
+        try:
+            with open(summary_path, "r", encoding="utf-8") as f:
+                summary = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if with_stats_store:
+            try:
+                with open(os.path.join(self.entry_path(key), "stats_settings.json"), "r", encoding="utf-8") as f:
+                    if json.load(f) != self.stats_settings(config):
+                        return None
+            except (OSError, ValueError):
+                return None
+        os.utime(summary_path)  # the entry's last-used time, for eviction
+        return summary
+
+    def run(self, config, seed, with_stats_store=False):
+        # Returns (summary, hit), simulating and storing the run on a miss.
+        summary = self.get(config, seed, with_stats_store)
+        if summary is not None:
+            return summary, True
+        key = self.key(config, seed)
+        staging = tempfile.mkdtemp(prefix=f"{key}.", dir=self.directory)
+        try:
+            run_config = dict(compile_config(config).to_dict())
+            for name in ("LOG_FILENAME", "CHART_FILENAME", "MEMORY_PROFILE_FILENAME"):
+                run_config[name] = os.path.join(staging, os.path.basename(run_config[name]))
+            run_config["JOURNAL_ENABLED"] = False
+            run_config["STATS_STORE_ENABLED"] = with_stats_store
+            run_config["STATS_STORE_DIR"] = os.path.join(staging, "stats")
+
+            started = time.perf_counter()
+            sim = Simulation(run_config, seed=seed)
+            events = sum(len(record.events) for record in sim.ticks())
+            sim.finish(charts=False)
+            summary = summarize(sim, events, time.perf_counter() - started)
+
+            for name in ("LOG_FILENAME", "MEMORY_PROFILE_FILENAME"):
+                if os.path.exists(run_config[name]):
+                    os.remove(run_config[name])
+            if with_stats_store:
+                with open(os.path.join(staging, "stats_settings.json"), "w", encoding="utf-8") as f:
+                    json.dump(self.stats_settings(config), f)
+            with open(os.path.join(staging, "summary.json"), "w", encoding="utf-8") as f:
+                json.dump(summary, f, indent=2)
+            entry = self.entry_path(key)
+            shutil.rmtree(entry, ignore_errors=True)
+            os.replace(staging, entry)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        self.evict(keep=key)
+        return summary, False
+
+    def entries(self):
+        # (last used, size in bytes, key) for every complete entry.
+        found = []
+        for key in os.listdir(self.directory):
+            summary_path = os.path.join(self.entry_path(key), "summary.json")
+            if not os.path.isfile(summary_path):
+                continue
+            size = 0
+            for root, _, files in os.walk(self.entry_path(key)):
+                size += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+            found.append((os.path.getmtime(summary_path), size, key))
+        return found
+
+    def evict(self, keep=None):
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(self.entry_path(key), ignore_errors=True)
+            total -= size
+        return total
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.makedirs(self.directory, exist_ok=True)
+
+
+def _parse_override(spec):
+    key, _, value = spec.partition("=")
+    try:
+        return key, json.loads(value)
+    except json.JSONDecodeError:
+        return key, value
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a configuration through the on-disk result cache.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE", help="config override")
+    parser.add_argument("--stats-store", action="store_true", help="also keep the run's stats store")
+    parser.add_argument("--dir", default=DEFAULT_DIR)
+    parser.add_argument("--max-mb", type=float, default=DEFAULT_MAX_BYTES / 2**20)
+    parser.add_argument("--clear", action="store_true", help="empty the cache and exit")
+    args = parser.parse_args()
+
+    cache = ResultCache(args.dir, int(args.max_mb * 2**20))
+    if args.clear:
+        cache.clear()
+        print(f"Cleared {args.dir}")
+        sys.exit()
+    config = dict(CONFIG)
+    config.update(_parse_override(spec) for spec in args.set)
+    started = time.perf_counter()
+    summary, hit = cache.run(config, args.seed, args.stats_store)
+    print(json.dumps(summary, indent=2))
+    print(f"{'hit' if hit else 'miss'} in {time.perf_counter() - started:.3f}s, key {cache.key(config, args.seed)}"
+          + (f", stats store {cache.stats_store_path(cache.key(config, args.seed))}" if args.stats_store else ""),
+          file=sys.stderr)
@@ -1,10 +1,32 @@
+import ast
+import csv
+import gc
+import hashlib
+import inspect
+import json
+import mmap
+import math
+import os
+import queue
 import random
+import re
+import shutil
 import sys
+import threading
+import time
+import tracemalloc
+import zlib
+from enum import IntEnum
+from functools import partial
+from types import MappingProxyType
 import plotly.graph_objs as go
 import plotly.offline as pyo
+import numpy as np
 import pandas as pd
-from collections import defaultdict
+from collections import OrderedDict, defaultdict, deque, namedtuple
 import webbrowser
+from array import array
+from bisect import bisect_right
 from plotly.subplots import make_subplots
 
 # -----------------------------------------------------------------------------
@@ -21,6 +43,7 @@ CONFIG = {
     "SEASONS": ["Spring", "Summer", "Autumn", "Winter"],
     "PARTS_OF_DAY": ["Morning", "Afternoon", "Night"],
     "TOTAL_DAYS_TO_RUN": 96,
+    "WORLD_TEMPLATE_DIR": None,  # Directory caching generated grids per (seed, map config); None disables
 
     # -----------------------------------------------------
     # Terrain and Field Management
@@ -30,8 +53,16 @@ CONFIG = {
         "field": {"chance": 0.5, "base_resource": 1},
         "water": {"chance": 0.2, "base_resource": 0}
     },
+    "TERRAIN_MODE": "grid",  # "grid" builds every tile up front, "chunked" generates noise terrain on demand
+    "TERRAIN_CHUNK_SIZE": 32,
+    "TERRAIN_MAX_RESIDENT_CHUNKS": 64,  # Least recently used chunks beyond this are compressed
+    "TERRAIN_SEED": None,  # None draws one from the simulation's random stream
+    "TERRAIN_NOISE_SCALE": 24,  # Tiles per noise lattice cell; larger gives bigger forests and fields
+    "TERRAIN_NOISE_OCTAVES": 3,
     "MAX_FIELD_RESOURCE": 30,
     "WINTER_FIELD_LOSS": 0.5,
+    "TRAVEL_COST_PER_TILE": 0.0,  # Yield lost per tile walked from the village; 0 keeps first-tile gathering
+    "MIN_TRAVEL_YIELD_FACTOR": 0.2,
 
     # -----------------------------------------------------
     # Item and Tool Definitions
@@ -100,6 +131,9 @@ CONFIG = {
         "herb": 99999
     },
     "MARKET_PRICE_DECAY": 0.95,
+    "MARKET_HISTORY_LENGTH": 256,  # Ticks of price/stock history kept per item
+    "LOG_MARKET_OVERFLOW": False,  # Overflow is always recorded in the ledger
+    "MARKET_MODE": "sequential",  # "sequential" trades immediately, "batch" clears once per part of day
 
     # -----------------------------------------------------
     # Inventory Management (Surplus)
@@ -114,6 +148,7 @@ CONFIG = {
     "NUM_HUNTERS": 4,
     "NUM_LOGGERS": 3,
     "NUM_BLACKSMITHS": 3,
+    "DISPATCH_MODE": "villager",  # "villager" dispatches one by one, "role" runs each role group in one pass
 
     # -----------------------------------------------------
     # Role Tools and Action Mapping
@@ -139,6 +174,12 @@ CONFIG = {
     "STORM_RESOURCE_REDUCTION": 2,
     "DISEASE_PROBABILITY": 0.05,
     "DISEASE_HEALTH_LOSS": 2,
+    "CONTAGION_ENABLED": False,  # Disease strikes seed an epidemic that spreads along contacts
+    "CONTAGION_HOUSEHOLD_RATE": 0.03,  # Infection hazard per infected neighbouring home, per part of day
+    "CONTAGION_PARTNER_RATE": 0.15,
+    "CONTAGION_WORK_RATE": 0.05,  # Per infected villager working the same tile
+    "CONTAGION_RECOVERY_PROB": 0.1,  # Per part of day; recovered villagers are immune
+    "CONTAGION_HEALTH_LOSS": 2,  # Per morning while infected
 
     # -----------------------------------------------------
     # Monsters, Combat, and Cooking
@@ -148,6 +189,10 @@ CONFIG = {
     "MONSTER_HEALTH_RANGE": [5, 10],
     "MONSTER_DAMAGE_RANGE": [1, 3],
     "COMBAT_MAX_ROUNDS": 3,
+    "MONSTER_AGENTS": False,  # Persistent monsters that roam the grid and hunt the nearest villager
+    "MONSTER_SPEED": 2,  # Tiles moved per morning (Chebyshev steps)
+    "MONSTER_ATTACK_RANGE": 1,
+    "SPATIAL_HASH_CELL_SIZE": 8,
     "COOKING_CONVERSION_RATE": 1,
     "COOKING_PROBABILITY": 0.9,
 
@@ -216,9 +261,253 @@ CONFIG = {
     # -----------------------------------------------------
     "LOG_FILENAME": "simulation_log.txt",
     "CHART_FILENAME": "simulation_charts.html",
-    "CHART_HEIGHT": 1600
+    "CHART_HEIGHT": 1600,
+    "STATS_MODE": "full",  # "full", "every_n" (every STATS_EVERY_N_TICKS), "sampled" or "aggregate" (per-role only)
+    "STATS_EVERY_N_TICKS": 3,
+    "STATS_SAMPLE_PER_ROLE": 5,
+    "STATS_SAMPLE_SEED": 0,
+    "JOURNAL_ENABLED": False,
+    "JOURNAL_FILENAME": "simulation_journal.jsonl",
+    "JOURNAL_KEYFRAME_INTERVAL": 30,
+    "ASYNC_EXPORT": False,  # Write finished days from a background thread and drop them from memory
+    "EXPORT_QUEUE_DAYS": 8,
+    "EXPORT_BACKPRESSURE": "block",  # "block" waits for the writer, "coalesce" keeps simulating and batches days
+    "STATS_STORE_ENABLED": False,  # Stream stats to a chunked columnar store that render_report.py can chart
+    "STATS_STORE_DIR": "simulation_stats",
+    "STATS_STORE_CHUNK_ROWS": 65536,
+    "MEMORY_PROFILE_ENABLED": False,  # tracemalloc snapshots at day boundaries, bytes per subsystem (slows the run)
+    "MEMORY_PROFILE_EVERY_DAYS": 1,
+    "MEMORY_PROFILE_FILENAME": "simulation_memory.csv",
+    # Reason code -> threshold, checked every part of day, e.g. {"population_collapse": 0.25}:
+    #   population_collapse: share of the starting villagers still alive falls below the threshold
+    #   wood_stockout: the market has had no wood for this many days in a row
+    #   starvation: average hunger of the living falls below the threshold
+    "MONITOR_RULES": {},
+    "MONITOR_ABORT_ON": ()  # Reason codes that end the run early instead of only being flagged
 }
 
+# -----------------------------------------------------------------------------
+# COMPILED CONFIGURATION
+# -----------------------------------------------------------------------------
+
+class _ConfigEnum(IntEnum):
+    # Members are named after their CONFIG keys and print as those names, so
+    # log lines and chart labels read exactly as they did with plain strings.
+    def __str__(self):
+        return self.name
+
+    def __format__(self, format_spec):
+        return format(self.name, format_spec)
+
+class Role(_ConfigEnum):
+    Farmer = 0
+    Hunter = 1
+    Logger = 2
+    Blacksmith = 3
+
+class Terrain(_ConfigEnum):
+    forest = 0
+    field = 1
+    water = 2
+
+class ItemId(_ConfigEnum):
+    food = 0
+    cooked_food = 1
+    wood = 2
+    axe = 3
+    bow = 4
+    hoe = 5
+    herb = 6
+
+class PartOfDay(_ConfigEnum):
+    Morning = 0
+    Afternoon = 1
+    Night = 2
+
+class Season(_ConfigEnum):
+    Spring = 0
+    Summer = 1
+    Autumn = 2
+    Winter = 3
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+def _thaw(value):
+    if isinstance(value, MappingProxyType):
+        return {k: _thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(v) for v in value]
+    return value
+
+class CompiledConfig:
+    """
+    Immutable, attribute-based view of a CONFIG dict.
+    Every CONFIG key is available under the same name; the derived tables
+    below are indexed by the integer enums so hot paths avoid string lookups.
+    """
+    __slots__ = tuple(CONFIG) + (
+        "NUM_PARTS",
+        "CALENDAR",
+        "HUNGER_DECREMENT_PER_PART",
+        "REST_DECREMENT_PER_PART",
+        "MAX_SKILL_BONUS",
+        "ITEM_PRICE",
+        "ITEM_DURABILITY",
+        "ITEM_SPOILAGE",
+        "ITEM_IS_TOOL",
+        "ITEM_MAX_STOCK",
+        "ITEM_SAFETY_STOCK",
+        "STARTING_STOCK",
+        "TERRAIN_WEIGHTS",
+        "ROLE_TOOL_IDS",
+        "ROLE_ACTION_NAMES",
+    )
+
+    def __init__(self, config):
+        _validate_config(config)
+        init = lambda name, value: object.__setattr__(self, name, value)
+        for key in CONFIG:
+            init(key, _freeze(config[key]))
+
+        parts = len(config["PARTS_OF_DAY"])
+        init("NUM_PARTS", parts)
+        init("HUNGER_DECREMENT_PER_PART", config["HUNGER_DECREMENT_PER_DAY"] / parts)
+        init("REST_DECREMENT_PER_PART", config["REST_DECREMENT_PER_DAY"] / parts)
+        init("MAX_SKILL_BONUS", config["MAX_SKILL_MULTIPLIER"] - 1)
+
+        items = config["ITEMS"]
+        init("ITEM_PRICE", tuple(items[i.name]["price"] for i in ItemId))
+        init("ITEM_DURABILITY", tuple(items[i.name]["durability"] for i in ItemId))
+        init("ITEM_SPOILAGE", tuple(items[i.name]["spoilage"] for i in ItemId))
+        init("ITEM_IS_TOOL", tuple(items[i.name]["durability"] > 0 for i in ItemId))
+        init("ITEM_MAX_STOCK", tuple(config["MARKET_MAX_STOCK"].get(i.name, 999999) for i in ItemId))
+        init("ITEM_SAFETY_STOCK", tuple(config["SAFETY_STOCK"].get(i.name, 0) for i in ItemId))
+        init("STARTING_STOCK", MappingProxyType(
+            {ItemId[name]: qty for name, qty in config["INITIAL_MARKET_STOCK"].items()}))
+
+        init("TERRAIN_WEIGHTS", tuple(
+            (Terrain[t_type], info["base_resource"])
+            for t_type, info in config["TERRAIN_DISTRIBUTION"].items()
+            for _ in range(int(info["chance"] * 100))
+        ))
+
+        actions = config["ROLE_ACTIONS"]
+        init("ROLE_TOOL_IDS", tuple(
+            tuple(ItemId[t] for t in config["ROLE_TOOLS"].get(r.name, [])) for r in Role))
+        init("ROLE_ACTION_NAMES", tuple(actions.get(r.name, actions["default"]) for r in Role))
+
+        # One extra day covers the tick the loop advances into after the last day.
+        init("CALENDAR", tuple(
+            self._calendar_entry(tick)
+            for tick in range((config["TOTAL_DAYS_TO_RUN"] + 1) * parts)
+        ))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CompiledConfig is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("CompiledConfig is immutable")
+
+    def _calendar_entry(self, tick):
+        day_index, part_index = divmod(tick, self.NUM_PARTS)
+        season_index = (day_index // self.DAYS_PER_SEASON) % len(Season)
+        return day_index + 1, PartOfDay(part_index), Season(season_index)
+
+    def calendar(self, tick):
+        # Returns (day, part, season) for a tick, falling back past the table.
+        if tick < len(self.CALENDAR):
+            return self.CALENDAR[tick]
+        return self._calendar_entry(tick)
+
+    def to_dict(self):
+        return {key: _thaw(getattr(self, key)) for key in CONFIG}
+
+def _validate_config(config):
+    missing = [key for key in CONFIG if key not in config]
+    if missing:
+        raise ValueError(f"Config is missing keys: {', '.join(missing)}")
+    unknown = [key for key in config if key not in CONFIG]
+    if unknown:
+        raise ValueError(f"Config has unknown keys: {', '.join(unknown)}")
+    for key, enum_cls in (("PARTS_OF_DAY", PartOfDay), ("SEASONS", Season)):
+        if list(config[key]) != [m.name for m in enum_cls]:
+            raise ValueError(f"{key} must be {[m.name for m in enum_cls]}")
+    for key, enum_cls in (("TERRAIN_DISTRIBUTION", Terrain), ("ITEMS", ItemId),
+                          ("INITIAL_MARKET_STOCK", ItemId), ("MARKET_MAX_STOCK", ItemId),
+                          ("SAFETY_STOCK", ItemId), ("ROLE_TOOLS", Role)):
+        bad = [name for name in config[key] if name not in enum_cls.__members__]
+        if bad:
+            raise ValueError(f"{key} has unknown entries: {', '.join(bad)}")
+    if set(config["ITEMS"]) != set(ItemId.__members__):
+        raise ValueError(f"ITEMS must define exactly {list(ItemId.__members__)}")
+    for name, tools in config["ROLE_TOOLS"].items():
+        for tool in tools:
+            if tool not in ItemId.__members__ or config["ITEMS"][tool]["durability"] <= 0:
+                raise ValueError(f"ROLE_TOOLS[{name!r}] lists {tool!r}, which is not a tool")
+    if "default" not in config["ROLE_ACTIONS"]:
+        raise ValueError("ROLE_ACTIONS needs a 'default' entry")
+    if config["TERRAIN_MODE"] not in ("grid", "chunked"):
+        raise ValueError("TERRAIN_MODE must be 'grid' or 'chunked'")
+    if min(config["TERRAIN_CHUNK_SIZE"], config["TERRAIN_MAX_RESIDENT_CHUNKS"],
+           config["TERRAIN_NOISE_SCALE"], config["TERRAIN_NOISE_OCTAVES"]) <= 0:
+        raise ValueError("TERRAIN_CHUNK_SIZE, TERRAIN_MAX_RESIDENT_CHUNKS and the noise settings must be positive")
+    if config["TERRAIN_MODE"] == "chunked" and (config["TRAVEL_COST_PER_TILE"] > 0 or config["JOURNAL_ENABLED"]):
+        raise ValueError("Chunked terrain does not support travel costs or the state journal, "
+                         "which both need the whole grid")
+    if config["GRID_WIDTH"] <= 0 or config["GRID_HEIGHT"] <= 0:
+        raise ValueError("GRID_WIDTH and GRID_HEIGHT must be positive")
+    if config["JOURNAL_KEYFRAME_INTERVAL"] <= 0:
+        raise ValueError("JOURNAL_KEYFRAME_INTERVAL must be positive")
+    if config["STATS_STORE_CHUNK_ROWS"] <= 0:
+        raise ValueError("STATS_STORE_CHUNK_ROWS must be positive")
+    if config["MEMORY_PROFILE_EVERY_DAYS"] <= 0:
+        raise ValueError("MEMORY_PROFILE_EVERY_DAYS must be positive")
+    if config["EXPORT_QUEUE_DAYS"] <= 0:
+        raise ValueError("EXPORT_QUEUE_DAYS must be positive")
+    if config["EXPORT_BACKPRESSURE"] not in ("block", "coalesce"):
+        raise ValueError("EXPORT_BACKPRESSURE must be 'block' or 'coalesce'")
+    if config["STATS_MODE"] not in ("full", "every_n", "sampled", "aggregate"):
+        raise ValueError("STATS_MODE must be 'full', 'every_n', 'sampled' or 'aggregate'")
+    if config["STATS_EVERY_N_TICKS"] <= 0 or config["STATS_SAMPLE_PER_ROLE"] <= 0:
+        raise ValueError("STATS_EVERY_N_TICKS and STATS_SAMPLE_PER_ROLE must be positive")
+    if config["DISPATCH_MODE"] not in ("villager", "role"):
+        raise ValueError("DISPATCH_MODE must be 'villager' or 'role'")
+    if config["MARKET_MODE"] not in ("sequential", "batch"):
+        raise ValueError("MARKET_MODE must be 'sequential' or 'batch'")
+    if config["TRAVEL_COST_PER_TILE"] < 0 or not 0 <= config["MIN_TRAVEL_YIELD_FACTOR"] <= 1:
+        raise ValueError("TRAVEL_COST_PER_TILE must be >= 0 and MIN_TRAVEL_YIELD_FACTOR in [0, 1]")
+    if config["SPATIAL_HASH_CELL_SIZE"] <= 0:
+        raise ValueError("SPATIAL_HASH_CELL_SIZE must be positive")
+    if config["MARKET_HISTORY_LENGTH"] <= 0:
+        raise ValueError("MARKET_HISTORY_LENGTH must be positive")
+    if config["DAYS_PER_SEASON"] <= 0:
+        raise ValueError("DAYS_PER_SEASON must be positive")
+    if not any(int(info["chance"] * 100) for info in config["TERRAIN_DISTRIBUTION"].values()):
+        raise ValueError("TERRAIN_DISTRIBUTION chances must sum above zero")
+    unknown_rules = [code for code in config["MONITOR_RULES"] if code not in RunMonitor.RULES]
+    if unknown_rules:
+        raise ValueError(f"Unknown MONITOR_RULES: {', '.join(unknown_rules)}; "
+                         f"known rules: {', '.join(RunMonitor.RULES)}")
+    if any(code not in config["MONITOR_RULES"] for code in config["MONITOR_ABORT_ON"]):
+        raise ValueError("MONITOR_ABORT_ON may only name rules configured in MONITOR_RULES")
+    if any(threshold < 0 for threshold in config["MONITOR_RULES"].values()):
+        raise ValueError("MONITOR_RULES thresholds must be non-negative")
+    for key in ("STORM_PROBABILITY", "DISEASE_PROBABILITY", "MONSTER_SPAWN_PROB",
+                "COOKING_PROBABILITY", "MARRIAGE_PROBABILITY", "CONTAGION_RECOVERY_PROB"):
+        if not 0 <= config[key] <= 1:
+            raise ValueError(f"{key} must be between 0 and 1")
+
+def compile_config(config):
+    # Compiling is idempotent so every component can accept either form.
+    if isinstance(config, CompiledConfig):
+        return config
+    return CompiledConfig(config)
+
 # -----------------------------------------------------------------------------
 # LOGGING & STATISTICS
 # -----------------------------------------------------------------------------
@@ -230,40 +519,387 @@ class SimulationLog:
     def log_action(self, day, part, villager_id, role, message):
         self.entries.append((day, part, villager_id, role, message))
 
-    def export_log(self, filename=CONFIG["LOG_FILENAME"]):
+    def log_actions(self, entries):
+        # Appends (day, part, villager_id, role, message) tuples in one call.
+        self.entries.extend(entries)
+
+    def take_entries(self, up_to_day=None):
+        # Hands over (and forgets) the entries of every day up to up_to_day.
+        if up_to_day is None:
+            taken, self.entries = self.entries, []
+        else:
+            taken = [e for e in self.entries if e[0] <= up_to_day]
+            self.entries = [e for e in self.entries if e[0] > up_to_day]
+        return taken
+
+    @staticmethod
+    def format_lines(entries):
         daily_logs = defaultdict(list)
-        for day, part, villager_id, role, message in self.entries:
-            daily_logs[(day, villager_id, role)].append(f"{part}: {message}")
+        # Enum members format through a Python-level __format__, so each is formatted once.
+        prefixes = {}
+        for day, part, villager_id, role, message in entries:
+            prefix = prefixes.get(part)
+            if prefix is None:
+                prefix = prefixes[part] = f"{part}: "
+            daily_logs[(day, villager_id, role)].append(prefix + message)
+        role_names = {}
+        for key in sorted(daily_logs, key=lambda x: (x[0], x[1])):
+            day, villager_id, role = key
+            messages_str = "; ".join(daily_logs[key])
+            if villager_id == 0:
+                yield f"Day {day} [SYSTEM]: {messages_str}\n"
+            else:
+                name = role_names.get(role)
+                if name is None:
+                    name = role_names[role] = f"{role}"
+                yield f"Day {day} - Villager {villager_id} ({name}): {messages_str}\n"
+
+    def export_log(self, filename=CONFIG["LOG_FILENAME"]):
         with open(filename, "w", encoding="utf-8") as f:
-            for key in sorted(daily_logs, key=lambda x: (x[0], x[1])):
-                day, villager_id, role = key
-                messages_str = "; ".join(daily_logs[key])
-                if villager_id == 0:
-                    f.write(f"Day {day} [SYSTEM]: {messages_str}\n")
-                else:
-                    f.write(f"Day {day} - Villager {villager_id} ({role}): {messages_str}\n")
+            f.writelines(self.format_lines(self.entries))
         print(f"Log written to {filename}")
 
+class StateJournal:
+    """
+    Append-only JSONL journal of world state, one record per tick.
+    Every keyframe_interval ticks a full snapshot is written; the ticks in
+    between only store the villager fields, tiles and market stock that changed.
+    Records live in the file only: memory holds the byte offset of each
+    keyframe and the tick of each (day, part).
+    """
+    VILLAGER_FIELDS = ("role", "hunger", "rest", "health", "happiness", "coins",
+                       "skill_level") + tuple(i.name for i in ItemId)
+    RECORD_HEADER = re.compile(rb'^\{"tick":(\d+),"day":(\d+),"part":"(\w+)","key":(true|false)')
+
+    def __init__(self, keyframe_interval=CONFIG["JOURNAL_KEYFRAME_INTERVAL"], filename=None):
+        self.keyframe_interval = keyframe_interval
+        self.filename = filename
+        self.keyframe_ticks = []
+        self.keyframe_offsets = []
+        self.ticks = {}  # (day, part name) -> tick
+        self.first_tick = None
+        self.last_tick = None
+        self._last = None
+        self._offset = 0
+        self._file = open(filename, "wb") if filename else None
+
+    def _index(self, tick, day, part, key, offset):
+        if key:
+            self.keyframe_ticks.append(tick)
+            self.keyframe_offsets.append(offset)
+        self.ticks[(day, part)] = tick
+        if self.first_tick is None:
+            self.first_tick = tick
+        self.last_tick = tick
+
+    @staticmethod
+    def _snapshot(world):
+        villagers = {}
+        for v in world.villagers:
+            status = v.status
+            villagers[v.id] = [v.role.name, status.hunger, status.rest, status.health,
+                               status.happiness, v.coins, v.skill_level] + \
+                              [v.get_item_count(item) for item in ItemId]
+        tiles = [tile.resource_level for row in world.grid for tile in row]
+        stock = [world.market.get_stock(item) for item in ItemId]
+        return villagers, tiles, stock
+
+    def record(self, world):
+        tick = world.tick
+        villagers, tiles, stock = self._snapshot(world)
+        if self._last is None or tick % self.keyframe_interval == 0:
+            record = {"tick": tick, "day": world.day_count, "part": world.part.name, "key": True,
+                      "villagers": [[vid, values] for vid, values in villagers.items()],
+                      "tiles": tiles, "stock": stock}
+        else:
+            last_villagers, last_tiles, last_stock = self._last
+            changed = []
+            for vid, values in villagers.items():
+                previous = last_villagers.get(vid)
+                if previous is None:
+                    changed.append([vid, list(enumerate(values))])
+                    continue
+                diff = [[i, value] for i, (value, old) in enumerate(zip(values, previous)) if value != old]
+                if diff:
+                    changed.append([vid, diff])
+            record = {"tick": tick, "day": world.day_count, "part": world.part.name, "key": False,
+                      "villagers": changed,
+                      "removed": [vid for vid in last_villagers if vid not in villagers],
+                      # Tile changes are flattened as [index, level, index, level, ...].
+                      "tiles": [x for i, (value, old) in enumerate(zip(tiles, last_tiles)) if value != old
+                                for x in (i, value)],
+                      "stock": [[i, value] for i, (value, old) in enumerate(zip(stock, last_stock)) if value != old]}
+        self._last = (villagers, tiles, stock)
+        if self._file:
+            line = json.dumps(record, separators=(",", ":")).encode() + b"\n"
+            self._file.write(line)
+            self._index(tick, record["day"], record["part"], record["key"], self._offset)
+            self._offset += len(line)
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    @classmethod
+    def load(cls, filename):
+        # Indexes an existing journal file in one pass without keeping its records.
+        journal = cls()
+        journal.filename = filename
+        offset = 0
+        with open(filename, "rb") as f:
+            for line in f:
+                header = cls.RECORD_HEADER.match(line)
+                if header:
+                    journal._index(int(header.group(1)), int(header.group(2)), header.group(3).decode(),
+                                   header.group(4) == b"true", offset)
+                offset += len(line)
+        if len(journal.keyframe_ticks) > 1:
+            journal.keyframe_interval = journal.keyframe_ticks[1] - journal.keyframe_ticks[0]
+        return journal
+
+    def _records_from(self, offset):
+        if self._file:
+            self._file.flush()
+        with open(self.filename, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def _apply(self, state, record):
+        villagers, tiles, stock = state
+        if record["key"]:
+            return ({vid: list(values) for vid, values in record["villagers"]},
+                    list(record["tiles"]), list(record["stock"]))
+        for vid in record["removed"]:
+            villagers.pop(vid, None)
+        for vid, diff in record["villagers"]:
+            values = villagers.setdefault(vid, [None] * len(self.VILLAGER_FIELDS))
+            for i, value in diff:
+                values[i] = value
+        flat = record["tiles"]
+        for i, value in zip(flat[::2], flat[1::2]):
+            tiles[i] = value
+        for i, value in record["stock"]:
+            stock[i] = value
+        return state
+
+    def state_at(self, tick):
+        """
+        Rebuilds the world state at the end of the given tick, replaying at most
+        one keyframe interval of deltas.
+        """
+        if self.first_tick is None or not self.first_tick <= tick <= self.last_tick:
+            raise IndexError(f"Tick {tick} is not in the journal")
+        keyframe = bisect_right(self.keyframe_ticks, tick) - 1
+        state = ({}, [], [])
+        for record in self._records_from(self.keyframe_offsets[keyframe]):
+            state = self._apply(state, record)
+            if record["tick"] == tick:
+                break
+        villagers, tiles, stock = state
+        return {
+            "tick": tick,
+            "day": record["day"],
+            "part": record["part"],
+            "villagers": {vid: dict(zip(self.VILLAGER_FIELDS, values)) for vid, values in villagers.items()},
+            "tiles": tiles,
+            "stock": {item.name: qty for item, qty in zip(ItemId, stock)},
+        }
+
+    def villager_at(self, villager_id, day, part="Night"):
+        tick = self.ticks.get((day, part))
+        if tick is None:
+            raise IndexError(f"Day {day} {part} is not in the journal")
+        return self.state_at(tick)["villagers"].get(villager_id)
+
+    def iter_states(self):
+        # Replays the whole journal once, yielding (record, villagers) per tick.
+        state = ({}, [], [])
+        if self.first_tick is None:
+            return
+        for record in self._records_from(0):
+            state = self._apply(state, record)
+            yield record, state[0]
+
+class RoleAggregate:
+    # Running count, mean, variance (Welford), min and max of each stats field.
+    __slots__ = ("count", "mean", "m2", "low", "high")
+
+    def __init__(self, width):
+        self.count = 0
+        self.mean = [0.0] * width
+        self.m2 = [0.0] * width
+        self.low = [math.inf] * width
+        self.high = [-math.inf] * width
+
+    def add(self, values):
+        self.count += 1
+        n = self.count
+        mean, m2, low, high = self.mean, self.m2, self.low, self.high
+        for i, value in enumerate(values):
+            delta = value - mean[i]
+            mean[i] += delta / n
+            m2[i] += delta * (value - mean[i])
+            if value < low[i]:
+                low[i] = value
+            if value > high[i]:
+                high[i] = value
+
+    def std(self, i):
+        return math.sqrt(self.m2[i] / (self.count - 1)) if self.count > 1 else 0.0
+
 class StatsCollector:
-    def __init__(self):
+    """
+    Collects villager metrics at the end of every part of day. The mode
+    trades detail for memory: "full" keeps a row per villager per tick,
+    "every_n" only every n-th tick, "sampled" only a fixed per-role sample of
+    villagers, and "aggregate" no rows at all, just running per-role
+    aggregates per tick.
+    """
+    FIELDS = ("hunger", "rest", "health", "happiness", "coins", "food", "wood", "cooked_food")
+    # Config keys generate_charts reads; a stats store keeps them for re-rendering.
+    CHART_KEYS = ("DAYS_PER_SEASON", "SEASONS", "CHART_HEIGHT", "LOG_FILENAME",
+                  "NUM_FARMERS", "NUM_HUNTERS", "NUM_LOGGERS", "NUM_BLACKSMITHS")
+
+    def __init__(self, mode=CONFIG["STATS_MODE"], every_n=CONFIG["STATS_EVERY_N_TICKS"],
+                 sample_per_role=CONFIG["STATS_SAMPLE_PER_ROLE"], sample_seed=CONFIG["STATS_SAMPLE_SEED"]):
+        self.mode = mode
+        self.every_n = every_n
+        self.sample_per_role = sample_per_role
+        self.sample_seed = sample_seed
+        self.sample_ids = None
         self.timeseries = []
+        self.aggregates = {}  # (day, part, role) -> RoleAggregate
+        self._exported = 0
+        self._villager_frame = None
+        self._aggregate_frame = None
+
+    def choose_sample(self, villagers):
+        # Uses its own RNG so sampling leaves the simulation's stream untouched.
+        rng = random.Random(self.sample_seed)
+        by_role = defaultdict(list)
+        for v in villagers:
+            by_role[v.role].append(v.id)
+        self.sample_ids = set()
+        for ids in by_role.values():
+            self.sample_ids.update(rng.sample(ids, min(self.sample_per_role, len(ids))))
+
+    def take_new_rows(self):
+        # Rows recorded since the last call, for incremental export.
+        rows = self.timeseries[self._exported:]
+        self._exported = len(self.timeseries)
+        return rows
+
+    @classmethod
+    def from_journal(cls, journal):
+        # Rebuilds end-of-part rows from a StateJournal so charts need no rerun.
+        collector = cls()
+        fields = StateJournal.VILLAGER_FIELDS
+        for record, villagers in journal.iter_states():
+            for vid, values in villagers.items():
+                row = dict(zip(fields, values))
+                collector.timeseries.append({
+                    "day": record["day"],
+                    "part": record["part"],
+                    "villager_id": vid,
+                    "role": row["role"],
+                    "hunger": row["hunger"],
+                    "rest": row["rest"],
+                    "health": row["health"],
+                    "happiness": row["happiness"],
+                    "coins": row["coins"],
+                    "food": row["food"],
+                    "wood": row["wood"],
+                    "cooked_food": row["cooked_food"]
+                })
+        return collector
 
     def record_villager_stats(self, villager):
+        mode = self.mode
+        if mode == "aggregate":
+            self._aggregate(villager)
+            return
+        if mode == "every_n" and villager.world.tick % self.every_n:
+            return
+        if mode == "sampled" and villager.id not in self.sample_ids:
+            return
+        resources = villager.inventory["resources"]
         self.timeseries.append({
             "day": villager.world.day_count,
-            "part": villager.world.world_part_of_day(),
+            "part": villager.world.part.name,
             "villager_id": villager.id,
-            "role": villager.role,
+            "role": villager.role.name,
             "hunger": villager.status.hunger,
             "rest": villager.status.rest,
             "health": villager.status.health,
             "happiness": villager.status.happiness,
             "coins": villager.coins,
-            "food": villager.get_item_count("food"),
-            "wood": villager.get_item_count("wood"),
-            "cooked_food": villager.get_item_count("cooked_food")
+            "food": resources.get(ItemId.food, 0),
+            "wood": resources.get(ItemId.wood, 0),
+            "cooked_food": resources.get(ItemId.cooked_food, 0)
         })
 
+    def _aggregate(self, villager):
+        world = villager.world
+        key = (world.day_count, world.part.name, villager.role.name)
+        aggregate = self.aggregates.get(key)
+        if aggregate is None:
+            aggregate = self.aggregates[key] = RoleAggregate(len(self.FIELDS))
+        status = villager.status
+        resources = villager.inventory["resources"]
+        aggregate.add((status.hunger, status.rest, status.health, status.happiness, villager.coins,
+                       resources.get(ItemId.food, 0), resources.get(ItemId.wood, 0),
+                       resources.get(ItemId.cooked_food, 0)))
+
+    def aggregate_rows(self):
+        rows = []
+        for (day, part, role), aggregate in self.aggregates.items():
+            row = {"day": day, "part": part, "role": role, "count": aggregate.count}
+            for i, field in enumerate(self.FIELDS):
+                row[f"{field}_mean"] = aggregate.mean[i]
+                row[f"{field}_std"] = aggregate.std(i)
+                row[f"{field}_min"] = aggregate.low[i]
+                row[f"{field}_max"] = aggregate.high[i]
+            rows.append(row)
+        return rows
+
+    @staticmethod
+    def _with_sim_time(df):
+        part_order = {p: i for i, p in enumerate(CONFIG["PARTS_OF_DAY"])}
+        df["sim_time"] = (df["day"] - 1) * len(CONFIG["PARTS_OF_DAY"]) + df["part"].map(part_order).astype(int)
+        return df
+
+    @classmethod
+    def from_store(cls, directory):
+        # Charts straight from a StatsStore. Only role means are loaded; a full
+        # store is reduced chunk by chunk, so the rows never sit in memory at once.
+        store = StatsStore.open(directory)
+        collector = cls(store.meta["mode"])
+        collector._aggregate_frame = store.aggregate_frame()
+        if collector._aggregate_frame is None:
+            collector._aggregate_frame = store.role_means(("hunger", "health", "happiness", "coins"))
+        return collector
+
+    def villager_frame(self):
+        if self._villager_frame is not None:
+            df = self._villager_frame
+        else:
+            df = pd.DataFrame(self.timeseries)
+        return self._with_sim_time(df) if not df.empty else df
+
+    def role_frame(self, villager_df=None):
+        # Per-role means per tick, from the rows or from the running aggregates.
+        if self.aggregates or self._aggregate_frame is not None:
+            df = self._aggregate_frame if self._aggregate_frame is not None else pd.DataFrame(self.aggregate_rows())
+            df = df.rename(columns={f"{field}_mean": field for field in self.FIELDS})
+            return self._with_sim_time(df)
+        if villager_df is None:
+            villager_df = self.villager_frame()
+        fields = [f for f in self.FIELDS if f in villager_df.columns]
+        return villager_df.groupby(["role", "sim_time"], as_index=False, observed=True)[fields].mean()
+
     def _build_html_template(self, html_div, full_log, num_farmers, num_hunters, num_loggers, num_blacksmiths):
         return f"""
         <html>
@@ -381,10 +1017,11 @@ class StatsCollector:
         </html>
         """
 
-    def generate_charts(self, filename=CONFIG["CHART_FILENAME"]):
-        df = pd.DataFrame(self.timeseries)
-        part_order = {p: i for i, p in enumerate(CONFIG["PARTS_OF_DAY"])}
-        df["sim_time"] = (df["day"] - 1) * len(CONFIG["PARTS_OF_DAY"]) + df["part"].map(part_order)
+    def generate_charts(self, filename=CONFIG["CHART_FILENAME"], config=CONFIG):
+        # config is the run's own, for the season markers, log and role counts.
+        cfg = compile_config(config)
+        df = self.villager_frame()
+        role_means = self.role_frame(df)
 
         fig = make_subplots(
             rows=6, cols=1, shared_xaxes=True,
@@ -399,29 +1036,34 @@ class StatsCollector:
             vertical_spacing=0.05
         )
 
-        season_change_interval = CONFIG["DAYS_PER_SEASON"]
-        max_sim_time = int(df["sim_time"].max())
-        seasons = CONFIG["SEASONS"]
-        for i in range(0, max_sim_time + 1, season_change_interval * len(CONFIG["PARTS_OF_DAY"])):
+        season_change_interval = cfg.DAYS_PER_SEASON
+        max_sim_time = int(role_means["sim_time"].max())
+        seasons = cfg.SEASONS
+        for i in range(0, max_sim_time + 1, season_change_interval * cfg.NUM_PARTS):
             for row in range(1, 7):
                 fig.add_vline(
                     x=i,
                     line_dash="dot",
                     line_color="gray",
-                    annotation_text=seasons[(i // (season_change_interval * len(CONFIG["PARTS_OF_DAY"]))) % len(seasons)],
+                    annotation_text=seasons[(i // (season_change_interval * cfg.NUM_PARTS)) % len(seasons)],
                     annotation_position="top left",
-                    row=row, col=1
+                    row=row, col=1,
+                    exclude_empty_subplots=False  # drawn before the traces exist
                 )
 
-        for vid in df["villager_id"].unique():
-            subdf = df[df["villager_id"] == vid].sort_values("sim_time")
+        # Without per-villager rows (aggregate mode, or a report rebuilt from a
+        # stats store) rows 1-3 show role means instead.
+        individual = df if not df.empty else role_means.rename(columns={"role": "villager_id"})
+        for vid in individual["villager_id"].unique():
+            subdf = individual[individual["villager_id"] == vid].sort_values("sim_time")
+            label = f"V{vid}" if individual is df else f"{vid} mean"
             fig.add_trace(
                 go.Scatter(
                     x=subdf["sim_time"],
                     y=subdf["hunger"],
                     mode="lines",
-                    name=f"V{vid}",
-                    legendgroup=f"V{vid}"
+                    name=label,
+                    legendgroup=label
                 ),
                 row=1, col=1
             )
@@ -430,9 +1072,9 @@ class StatsCollector:
                     x=subdf["sim_time"],
                     y=subdf["health"],
                     mode="lines",
-                    name=f"V{vid}",
+                    name=label,
                     showlegend=False,
-                    legendgroup=f"V{vid}"
+                    legendgroup=label
                 ),
                 row=2, col=1
             )
@@ -441,14 +1083,14 @@ class StatsCollector:
                     x=subdf["sim_time"],
                     y=subdf["happiness"],
                     mode="lines",
-                    name=f"V{vid}",
+                    name=label,
                     showlegend=False,
-                    legendgroup=f"V{vid}"
+                    legendgroup=label
                 ),
                 row=3, col=1
             )
 
-        avg_coins = df.groupby(["role", "sim_time"], as_index=False)["coins"].mean()
+        avg_coins = role_means[["role", "sim_time", "coins"]]
         for role in avg_coins["role"].unique():
             role_df = avg_coins[avg_coins["role"] == role].sort_values("sim_time")
             fig.add_trace(
@@ -461,7 +1103,7 @@ class StatsCollector:
                 row=4, col=1
             )
 
-        avg_health = df.groupby(["role", "sim_time"], as_index=False)["health"].mean()
+        avg_health = role_means[["role", "sim_time", "health"]]
         for role in avg_health["role"].unique():
             role_df = avg_health[avg_health["role"] == role].sort_values("sim_time")
             fig.add_trace(
@@ -474,7 +1116,7 @@ class StatsCollector:
                 row=5, col=1
             )
 
-        avg_happiness = df.groupby(["role", "sim_time"], as_index=False)["happiness"].mean()
+        avg_happiness = role_means[["role", "sim_time", "happiness"]]
         for role in avg_happiness["role"].unique():
             role_df = avg_happiness[avg_happiness["role"] == role].sort_values("sim_time")
             fig.add_trace(
@@ -487,21 +1129,21 @@ class StatsCollector:
                 row=6, col=1
             )
 
-        fig.update_layout(height=CONFIG["CHART_HEIGHT"], title_text="Villager Metrics Over Time with Seasonal Markers", hovermode="x unified")
+        fig.update_layout(height=cfg.CHART_HEIGHT, title_text="Villager Metrics Over Time with Seasonal Markers", hovermode="x unified")
         fig.update_xaxes(title_text="Simulation Time (Day Part)", row=6, col=1)
 
         html_div = pyo.plot(fig, include_plotlyjs=False, output_type='div')
 
         try:
-            with open(CONFIG["LOG_FILENAME"], "r", encoding="utf-8") as log_file:
+            with open(cfg.LOG_FILENAME, "r", encoding="utf-8") as log_file:
                 full_log = log_file.read()
         except Exception as e:
             full_log = "Simulation log not found."
 
-        num_farmers = CONFIG.get("NUM_FARMERS", 0)
-        num_hunters = CONFIG.get("NUM_HUNTERS", 0)
-        num_loggers = CONFIG.get("NUM_LOGGERS", 0)
-        num_blacksmiths = CONFIG.get("NUM_BLACKSMITHS", 0)
+        num_farmers = cfg.NUM_FARMERS
+        num_hunters = cfg.NUM_HUNTERS
+        num_loggers = cfg.NUM_LOGGERS
+        num_blacksmiths = cfg.NUM_BLACKSMITHS
 
         html_template = self._build_html_template(html_div, full_log, num_farmers, num_hunters, num_loggers, num_blacksmiths)
 
@@ -509,17 +1151,225 @@ class StatsCollector:
             f.write(html_template)
         print(f"Charts and log monitor generated: {filename}")
 
+# -----------------------------------------------------------------------------
+# STATS STORE
+# -----------------------------------------------------------------------------
+
+class StatsStore:
+    """
+    Chunked columnar store for StatsCollector rows. Each chunk is a directory
+    of one .npy file per column; meta.json lists the chunks and the code
+    tables for the role and part columns. Reading memory-maps only the
+    requested columns, so charts can be rebuilt without the simulation.
+    """
+    COLUMNS = (("day", "u4"), ("part", "u1"), ("villager_id", "u4"), ("role", "u1"),
+               ("hunger", "f8"), ("rest", "f8"), ("health", "f8"), ("happiness", "f8"),
+               ("coins", "f8"), ("food", "f8"), ("wood", "f8"), ("cooked_food", "f8"))
+    CODED = {"part": tuple(p.name for p in PartOfDay), "role": tuple(r.name for r in Role)}
+
+    def __init__(self, directory, chunk_rows=CONFIG["STATS_STORE_CHUNK_ROWS"], mode="full", meta=None,
+                 chart_config=None):
+        self.directory = directory
+        self.chunk_rows = chunk_rows
+        self.meta = meta or {"mode": mode, "columns": dict(self.COLUMNS), "codes": self.CODED,
+                             "chunks": [], "aggregates": None, "config": chart_config or {}}
+        self._codes = {name: {v: i for i, v in enumerate(values)} for name, values in self.CODED.items()}
+        self._buffer = {name: [] for name, _ in self.COLUMNS}
+        self._buffered = 0
+
+    @classmethod
+    def create(cls, directory, chunk_rows=CONFIG["STATS_STORE_CHUNK_ROWS"], mode="full", config=None):
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name.startswith("chunk_"):
+                shutil.rmtree(path)
+            elif name in ("meta.json", "aggregates.csv"):
+                os.remove(path)
+        chart_config = None
+        if config is not None:
+            config = compile_config(config).to_dict()
+            chart_config = {key: config[key] for key in StatsCollector.CHART_KEYS}
+        store = cls(directory, chunk_rows, mode, chart_config=chart_config)
+        store._write_meta()
+        return store
+
+    @classmethod
+    def open(cls, directory):
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+            return cls(directory, meta=json.load(f))
+
+    def append(self, rows):
+        buffer = self._buffer
+        codes = self._codes
+        for row in rows:
+            for name, _ in self.COLUMNS:
+                value = row[name]
+                buffer[name].append(codes[name][value] if name in codes else value)
+            self._buffered += 1
+            if self._buffered >= self.chunk_rows:
+                self._flush()
+
+    def _flush(self):
+        if not self._buffered:
+            return
+        index = len(self.meta["chunks"])
+        name = f"chunk_{index:05d}"
+        os.makedirs(os.path.join(self.directory, name), exist_ok=True)
+        for column, dtype in self.COLUMNS:
+            np.save(os.path.join(self.directory, name, column + ".npy"), np.asarray(self._buffer[column], dtype=dtype))
+            self._buffer[column] = []
+        self.meta["chunks"].append({"name": name, "rows": self._buffered})
+        self._buffered = 0
+        self._write_meta()
+
+    def _write_meta(self):
+        # Rewritten after every chunk, so a store from an interrupted run stays readable.
+        path = os.path.join(self.directory, "meta.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.meta, f)
+        os.replace(path + ".tmp", path)
+
+    def write_aggregates(self, rows):
+        if rows:
+            pd.DataFrame(rows).to_csv(os.path.join(self.directory, "aggregates.csv"), index=False)
+            self.meta["aggregates"] = "aggregates.csv"
+
+    def close(self):
+        self._flush()
+        self._write_meta()
+
+    @property
+    def num_rows(self):
+        return sum(chunk["rows"] for chunk in self.meta["chunks"])
+
+    def column(self, name):
+        # One memory-mapped array per chunk, so a column is never loaded whole.
+        for chunk in self.meta["chunks"]:
+            yield np.load(os.path.join(self.directory, chunk["name"], name + ".npy"), mmap_mode="r")
+
+    def _frame(self, columns, arrays):
+        data = {}
+        for name, values in zip(columns, arrays):
+            if name in self.meta["codes"]:
+                values = pd.Categorical.from_codes(values, self.meta["codes"][name])
+            data[name] = values
+        return pd.DataFrame(data)
+
+    def chunk_frames(self, columns=None):
+        columns = columns or [name for name, _ in self.COLUMNS]
+        for arrays in zip(*(self.column(name) for name in columns)):
+            yield self._frame(columns, arrays)
+
+    def role_means(self, fields):
+        # Per (day, part, role) means, reduced chunk by chunk and named like
+        # the aggregate columns, so full-mode charts need no whole-run frame.
+        keys = ["day", "part", "role"]
+        partials = []
+        for df in self.chunk_frames(keys + list(fields)):
+            grouped = df.groupby(keys, observed=True)
+            partials.append(grouped[list(fields)].sum().join(grouped.size().rename("count")))
+        if not partials:
+            return None
+        totals = pd.concat(partials).groupby(level=keys, observed=True).sum()
+        means = totals[list(fields)].div(totals["count"], axis=0)
+        return means.rename(columns={field: f"{field}_mean" for field in fields}).reset_index()
+
+    def run_config(self):
+        # CONFIG with the charted keys of the run that wrote the store.
+        config = dict(CONFIG)
+        config.update(self.meta.get("config", {}))
+        return config
+
+    def aggregate_frame(self):
+        if not self.meta["aggregates"]:
+            return None
+        return pd.read_csv(os.path.join(self.directory, self.meta["aggregates"]))
+
+# -----------------------------------------------------------------------------
+# ASYNC EXPORT
+# -----------------------------------------------------------------------------
+
+class AsyncExporter:
+    """
+    Appends finished days of the log from a background thread. Lines are
+    formatted and encoded on the simulating thread (formatting is Python
+    work and would only contend for the GIL), so the writer only does the
+    file I/O. The queue holds at most queue_days batches; when it is full,
+    "block" makes the simulation wait for the writer and "coalesce" keeps
+    simulating and hands the held days over together once there is room.
+    Entries are dropped from memory as their day is handed over. With a
+    stats store, each day's stats rows travel in the same batch and are
+    appended by the writer, which owns the store until close().
+    """
+    def __init__(self, log_filename, queue_days=CONFIG["EXPORT_QUEUE_DAYS"],
+                 backpressure=CONFIG["EXPORT_BACKPRESSURE"], stats_store=None):
+        self.log_filename = log_filename
+        self.stats_store = stats_store
+        self.backpressure = backpressure
+        self.queue = queue.Queue(maxsize=queue_days)
+        self.held = []
+        self.error = None
+        self.blocked_puts = 0
+        self._log_file = open(log_filename, "wb")
+        self.thread = threading.Thread(target=self._run, name="simulation-export", daemon=True)
+        self.thread.start()
+
+    def submit(self, log_entries, stats_rows=()):
+        if self.error:
+            raise RuntimeError("Export thread failed") from self.error
+        self.held.append(("".join(SimulationLog.format_lines(log_entries)).encode(), stats_rows))
+        if self.backpressure == "coalesce":
+            try:
+                self.queue.put_nowait(self.held)
+            except queue.Full:
+                return
+        else:
+            if self.queue.full():
+                self.blocked_puts += 1
+            self.queue.put(self.held)
+        self.held = []
+
+    def _run(self):
+        while True:
+            batches = self.queue.get()
+            if batches is None:
+                break
+            if self.error:
+                continue
+            try:
+                for data, stats_rows in batches:
+                    self._log_file.write(data)
+                    if stats_rows:
+                        self.stats_store.append(stats_rows)
+            except Exception as exc:
+                self.error = exc
+
+    def close(self):
+        # Flushes everything still held or queued and waits for the writer.
+        if self.held:
+            self.queue.put(self.held)
+            self.held = []
+        self.queue.put(None)
+        self.thread.join()
+        self._log_file.close()
+        if self.error:
+            raise RuntimeError("Export thread failed") from self.error
+        print(f"Log written to {self.log_filename}")
+
 # -----------------------------------------------------------------------------
 # ITEM CLASS
 # -----------------------------------------------------------------------------
 
 class Item:
-    def __init__(self, name, quantity, durability=None):
+    __slots__ = ("name", "quantity", "durability", "max_durability", "spoilage_rate")
+
+    def __init__(self, name, quantity, durability=None, spoilage_rate=0):
         self.name = name
         self.quantity = quantity
         self.durability = durability
-        item_config = CONFIG["ITEMS"].get(name, {})
-        self.spoilage_rate = item_config.get("spoilage", 0)
+        self.max_durability = durability
+        self.spoilage_rate = spoilage_rate
 
     def is_tool(self):
         return self.durability is not None and self.durability > 0
@@ -538,18 +1388,52 @@ class Item:
         return f"<Item {self.name}, qty={self.quantity}, dur={self.durability}, spoilage={self.spoilage_rate}>"
 
     def is_repairable(self):
-        return self.is_tool() and self.durability < CONFIG["ITEMS"][self.name]["durability"]
+        return self.is_tool() and self.durability < self.max_durability
 
 # -----------------------------------------------------------------------------
 # MONSTER CLASS
 # -----------------------------------------------------------------------------
 
 class Monster:
-    def __init__(self, name, health, damage):
+    __slots__ = ("name", "health", "damage", "alive", "x", "y")
+
+    def __init__(self, name, health, damage, x=0, y=0):
         self.name = name
         self.health = health
         self.damage = damage
         self.alive = True
+        self.x = x
+        self.y = y
+
+    def step_towards(self, x, y, speed):
+        self.x += max(-speed, min(speed, x - self.x))
+        self.y += max(-speed, min(speed, y - self.y))
+
+    @staticmethod
+    def resolve_combats(engagements, max_rounds):
+        """
+        Fights every (monster, villager) engagement of a morning together,
+        one round at a time, dropping fights as either side falls.
+        """
+        fights = [[m, v, 0] for m, v in engagements if m.alive and v.status.health > 0]
+        active = fights
+        for _ in range(max_rounds):
+            still_fighting = []
+            for fight in active:
+                monster, villager = fight[0], fight[1]
+                villager_damage = random.randint(1, 3)
+                monster_damage = random.randint(1, monster.damage)
+                monster.health -= villager_damage
+                fight[2] += min(monster_damage, villager.status.health)
+                villager.status.health = max(0, villager.status.health - monster_damage)
+                if monster.health > 0 and villager.status.health > 0:
+                    still_fighting.append(fight)
+            active = still_fighting
+            if not active:
+                break
+        for monster, villager, total_damage in fights:
+            monster.alive = monster.health > 0
+            villager.log(f"Combat with {monster.name}! Total lost HP: {total_damage}. Monster {'fled' if monster.alive else 'died'}.")
 
     def attack_villager(self, villager):
         if not self.alive or villager.status.health <= 0:
@@ -572,21 +1456,173 @@ class Monster:
     def is_dead(self):
         return self.health <= 0
 
+# -----------------------------------------------------------------------------
+# SPATIAL HASH
+# -----------------------------------------------------------------------------
+
+class SpatialHash:
+    """
+    Uniform grid of buckets for nearest-neighbour lookups. Distances are
+    Chebyshev (king moves), matching how monsters step across the grid.
+    """
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.cells = defaultdict(list)
+        self.min_cell = None
+        self.max_cell = None
+
+    def insert(self, obj, x, y):
+        cell = (x // self.cell_size, y // self.cell_size)
+        self.cells[cell].append((x, y, obj))
+        if self.min_cell is None:
+            self.min_cell = self.max_cell = cell
+        else:
+            self.min_cell = (min(self.min_cell[0], cell[0]), min(self.min_cell[1], cell[1]))
+            self.max_cell = (max(self.max_cell[0], cell[0]), max(self.max_cell[1], cell[1]))
+
+    def nearest(self, x, y, key=id):
+        # Searches rings of cells outward until no closer candidate can exist.
+        if self.min_cell is None:
+            return None, None
+        cs = self.cell_size
+        cx, cy = x // cs, y // cs
+        max_ring = max(abs(cx - self.min_cell[0]), abs(cx - self.max_cell[0]),
+                       abs(cy - self.min_cell[1]), abs(cy - self.max_cell[1]))
+        best = None
+        best_rank = None
+        for ring in range(max_ring + 1):
+            for i in range(cx - ring, cx + ring + 1):
+                for j in range(cy - ring, cy + ring + 1):
+                    if ring and cx - ring < i < cx + ring and cy - ring < j < cy + ring:
+                        continue
+                    for ox, oy, obj in self.cells.get((i, j), ()):
+                        rank = (max(abs(ox - x), abs(oy - y)), key(obj))
+                        if best_rank is None or rank < best_rank:
+                            best, best_rank = obj, rank
+            if best is not None and best_rank[0] <= ring * cs:
+                break
+        return best, best_rank[0] if best is not None else None
+
+# -----------------------------------------------------------------------------
+# DISTANCE FIELDS
+# -----------------------------------------------------------------------------
+
+class DistanceFields:
+    """
+    Cached multi-source BFS distance from the village center and homes over
+    the world grid (4-neighbour moves, water is impassable). Productive tiles
+    are bucketed by that distance so the nearest one is found without
+    scanning the grid.
+    """
+    UNREACHABLE = -1
+
+    def __init__(self, world, sources):
+        self.world = world
+        self.width = world.width
+        self.height = world.height
+        self.tiles = [tile for row in world.grid for tile in row]
+        self.tile_index = {id(tile): i for i, tile in enumerate(self.tiles)}
+        starts = sorted({y * self.width + x for x, y in sources})
+        self.home_distance = self._multi_source(starts)
+        self._rebuild_productive()
+
+    def _passable(self, i):
+        return self.tiles[i].terrain_type != Terrain.water
+
+    def _neighbours(self, i):
+        x, y = i % self.width, i // self.width
+        if x > 0:
+            yield i - 1
+        if x < self.width - 1:
+            yield i + 1
+        if y > 0:
+            yield i - self.width
+        if y < self.height - 1:
+            yield i + self.width
+
+    def _bfs(self, field, frontier):
+        # Relaxes field outward from frontier; only ever lowers distances.
+        queue = deque(frontier)
+        while queue:
+            i = queue.popleft()
+            d = field[i] + 1
+            for j in self._neighbours(i):
+                if self._passable(j) and (field[j] == self.UNREACHABLE or field[j] > d):
+                    field[j] = d
+                    queue.append(j)
+
+    def _multi_source(self, starts):
+        field = [self.UNREACHABLE] * len(self.tiles)
+        for i in starts:
+            field[i] = 0
+        self._bfs(field, starts)
+        return field
+
+    def _rebuild_productive(self):
+        self.buckets = {terrain: defaultdict(list) for terrain in Terrain}
+        self.productive_count = {terrain: defaultdict(int) for terrain in Terrain}
+        self.productive = [False] * len(self.tiles)
+        self.cursor = {terrain: 0 for terrain in Terrain}
+        for i, tile in enumerate(self.tiles):
+            d = self.home_distance[i]
+            if d != self.UNREACHABLE:
+                self.buckets[tile.terrain_type][d].append(i)
+                if tile.resource_level > 0:
+                    self.productive[i] = True
+                    self.productive_count[tile.terrain_type][d] += 1
+        self.last_bucket = {terrain: max(buckets) if buckets else -1 for terrain, buckets in self.buckets.items()}
+
+    def update_tile(self, tile):
+        # Call after a tile's resource level may have crossed zero.
+        i = self.tile_index[id(tile)]
+        now = tile.resource_level > 0
+        if now == self.productive[i]:
+            return
+        d = self.home_distance[i]
+        if d == self.UNREACHABLE:
+            return
+        self.productive[i] = now
+        terrain = tile.terrain_type
+        if now:
+            self.productive_count[terrain][d] += 1
+            if d < self.cursor[terrain]:
+                self.cursor[terrain] = d
+        else:
+            self.productive_count[terrain][d] -= 1
+
+    def nearest_productive(self, terrain):
+        # Returns (tile, village distance) of the closest productive tile, or (None, None).
+        counts = self.productive_count[terrain]
+        buckets = self.buckets[terrain]
+        d = self.cursor[terrain]
+        last = self.last_bucket[terrain]
+        while d <= last and counts.get(d, 0) <= 0:
+            d += 1
+        self.cursor[terrain] = d
+        if d > last:
+            return None, None
+        for i in buckets[d]:
+            if self.productive[i]:
+                return self.tiles[i], d
+        return None, None
+
 # -----------------------------------------------------------------------------
 # ACTIONS CLASS
 # -----------------------------------------------------------------------------
 
 class Action:
     @staticmethod
-    def farm(villager):
-        tile = villager.find_field_tile()
+    def farm(villager, season=None, tool_terms=None):
+        tile, travel = villager.find_work_tile(Terrain.field)
         if not tile:
             Action.forage(villager)
             return
-        max_field = villager.world.config["MAX_FIELD_RESOURCE"]
+        world = villager.world
+        cfg = world.config
+        max_field = cfg.MAX_FIELD_RESOURCE
         if tile.resource_level >= max_field:
-            villager.world.log.log_action(
-                villager.world.day_count, villager.world.world_part_of_day(),
+            world.log.log_action(
+                world.day_count, world.part,
                 villager.id, villager.role,
                 "Field at max resource, foraging instead."
             )
@@ -594,31 +1630,39 @@ class Action:
             return
 
         villager.gain_skill()
-        season = villager.world.get_current_season()
-        if season == "Autumn":
+        if season is None:
+            season = world.season
+        if season == Season.Autumn:
             amount = min(tile.resource_level, max_field)
-            amount = Action.get_yield_with_tool(villager, "hoe", amount, max(1, amount // 2))
+            amount = Action.get_yield_with_tool(villager, ItemId.hoe, amount, max(1, amount // 2),
+                                                tool_terms=tool_terms)
             amount = int(amount * villager.skill_level)
-            villager.add_item("food", amount)
+            if travel < 1:
+                amount = int(amount * travel)
+            villager.add_item(ItemId.food, amount)
             tile.resource_level = 0
-            villager.world.log.log_action(
-                villager.world.day_count, villager.world.world_part_of_day(),
+            world.touch_tile(tile)
+            world.log.log_action(
+                world.day_count, world.part,
                 villager.id, villager.role,
                 f"Harvested {amount} food (tile resource now=0)."
             )
-        elif season in ["Spring", "Summer"]:
-            cfg = villager.world.config
-            amount = Action.get_yield_with_tool(villager, "hoe", cfg["BASE_FARM_YIELD"], cfg["FALLBACK_FARM_YIELD"])
+        elif season == Season.Spring or season == Season.Summer:
+            amount = Action.get_yield_with_tool(villager, ItemId.hoe, cfg.BASE_FARM_YIELD, cfg.FALLBACK_FARM_YIELD,
+                                                tool_terms=tool_terms)
+            if travel < 1:
+                amount = int(amount * travel)
             tile.resource_level = min(tile.resource_level + amount, max_field)
-            villager.world.log.log_action(
-                villager.world.day_count, villager.world.world_part_of_day(),
+            world.log.log_action(
+                world.day_count, world.part,
                 villager.id, villager.role,
                 f"Prepared fields (+{amount}), resource now {tile.resource_level}."
             )
         else:  # Winter
-            tile.resource_level = int(tile.resource_level * villager.world.config["WINTER_FIELD_LOSS"])
-            villager.world.log.log_action(
-                villager.world.day_count, villager.world.world_part_of_day(),
+            tile.resource_level = int(tile.resource_level * cfg.WINTER_FIELD_LOSS)
+            world.touch_tile(tile)
+            world.log.log_action(
+                world.day_count, world.part,
                 villager.id, villager.role,
                 f"Winter field loss: resources now {tile.resource_level}."
             )
@@ -626,96 +1670,127 @@ class Action:
 
     @staticmethod
     def hunt(villager):
-        tile = villager.find_tile_with_resources("forest")
+        tile, travel = villager.find_work_tile(Terrain.forest)
         if tile and tile.resource_level > 0:
-            harvest = min(CONFIG["HUNT_MAX_HARVEST"], tile.resource_level)
+            harvest = min(villager.world.config.HUNT_MAX_HARVEST, tile.resource_level)
             tile.resource_level -= harvest
-            villager.add_item("food", harvest)
+            villager.world.touch_tile(tile)
+            if travel < 1:
+                harvest = int(harvest * travel)
+            villager.add_item(ItemId.food, harvest)
             villager.log(f"Hunting => +{harvest} food (tile resource now={tile.resource_level}).")
         else:
             Action.forage(villager)
 
     @staticmethod
-    def log_wood(villager):
+    def log_wood(villager, yields=None, tool_terms=None):
         villager.gain_skill()
-        tile = villager.find_tile_with_resources("forest")
+        tile, travel = villager.find_work_tile(Terrain.forest)
         if tile is None:
             Action.forage(villager)
             return
         cfg = villager.world.config
-        max_multiplier = cfg.get("MAX_LOG_WOOD_YIELD_MULTIPLIER", 3.0)
+        if yields is None:
+            yields = Action.log_yields(cfg)
+        base_yield, fallback_yield, max_multiplier = yields
         amount = Action.get_yield_with_tool(
-            villager, "axe",
-            cfg["BASE_LOG_YIELD"],
-            cfg["FALLBACK_LOG_YIELD"],
-            max_multiplier
+            villager, ItemId.axe, base_yield, fallback_yield, max_multiplier, tool_terms
         )
-        villager.add_item("wood", amount)
-        tile.resource_level = max(tile.resource_level - CONFIG["LOGWOOD_RESOURCE_DECREASE"], 0)
+        if travel < 1:
+            amount = int(amount * travel)
+        villager.add_item(ItemId.wood, amount)
+        tile.resource_level = max(tile.resource_level - cfg.LOGWOOD_RESOURCE_DECREASE, 0)
+        villager.world.touch_tile(tile)
         villager.log(f"Logging => +{amount} wood (tile resource now={tile.resource_level}).")
 
     @staticmethod
-    def craft(villager):
+    def log_yields(config):
+        return config.BASE_LOG_YIELD, config.FALLBACK_LOG_YIELD, config.MAX_LOG_WOOD_YIELD_MULTIPLIER
+
+    @staticmethod
+    def tool_terms(config):
+        # (skill bonus cap, base tool bonus) used by get_yield_with_tool.
+        return config.MAX_SKILL_BONUS, config.TOOL_YIELD_BASE
+
+    @staticmethod
+    def tool_needs(world):
+        tool_needs = defaultdict(int)
+        role_tools = world.config.ROLE_TOOL_IDS
+        for v in world.villagers:
+            for tool in role_tools[v.role]:
+                if v.get_item_count(tool) < 1:
+                    tool_needs[tool] += 1
+        return tool_needs
+
+    @staticmethod
+    def craft(villager, tool_needs=None):
         cfg = villager.world.config
+        market = villager.world.market
         # Attempt to repair existing tools.
         for tool_list in villager.inventory["tools"].values():
             for item in tool_list:
                 if item.is_tool() and item.is_repairable():
-                    wood_needed = (cfg["ITEMS"][item.name]["durability"] - item.durability) * cfg["TOOL_REPAIR_WOOD"]
-                    if villager.world.market.get_stock("wood") >= wood_needed:
-                        item.durability = cfg["ITEMS"][item.name]["durability"]
-                        villager.world.market.remove_stock("wood", wood_needed)
+                    wood_needed = (item.max_durability - item.durability) * cfg.TOOL_REPAIR_WOOD
+                    if market.get_stock(ItemId.wood) >= wood_needed:
+                        item.durability = item.max_durability
+                        market.remove_stock(ItemId.wood, wood_needed)
                         villager.log(f"Repaired {item.name} using {wood_needed} wood")
                         return
         # Craft a new tool if needed.
-        tool_needs = defaultdict(int)
-        for v in villager.world.villagers:
-            for tname in cfg["ROLE_TOOLS"].get(v.role, []):
-                if v.get_item_count(tname) < 1:
-                    tool_needs[tname] += 1
+        if tool_needs is None:
+            tool_needs = Action.tool_needs(villager.world)
         for tool, need in sorted(tool_needs.items(), key=lambda x: -x[1]):
-            if villager.world.market.get_stock("wood") >= 1:
-                success, revenue, actual_qty = villager.world.market.attempt_sell(tool, 1)
+            if market.get_stock(ItemId.wood) >= 1:
+                success, revenue, actual_qty = market.attempt_sell(tool, 1)
                 if success:
-                    villager.world.market.remove_stock("wood", 1)
+                    market.remove_stock(ItemId.wood, 1)
+                    market.ledger.record(TradeKind.CRAFT, tool, 1, revenue, villager.id)
                     villager.coins += revenue
                     villager.log(f"Crafted and sold 1 {tool} for {revenue} coins (consumed 1 wood)")
                     return
 
     @staticmethod
     def forage(villager):
-        villager.add_item("food", CONFIG["FORAGE_FOOD_GAIN"])
-        villager.log(f"Foraging => +{CONFIG['FORAGE_FOOD_GAIN']} food.")
+        gain = villager.world.config.FORAGE_FOOD_GAIN
+        villager.add_item(ItemId.food, gain)
+        villager.log(f"Foraging => +{gain} food.")
 
     @staticmethod
     def cook_food(villager):
-        rate = villager.world.config["COOKING_CONVERSION_RATE"]
-        if villager.get_item_count("food") < rate:
+        rate = villager.world.config.COOKING_CONVERSION_RATE
+        if villager.get_item_count(ItemId.food) < rate:
             villager.log(f"Need {rate} food to cook.")
             return
-        villager.remove_item("food", rate)
-        villager.add_item("cooked_food", 1)
+        villager.remove_item(ItemId.food, rate)
+        villager.add_item(ItemId.cooked_food, 1)
         villager.log(f"Cooked {rate} food => 1 cooked_food")
 
     @staticmethod
-    def get_yield_with_tool(villager, tool_name, base_yield, fallback_yield, max_multiplier=3.0):
+    def get_yield_with_tool(villager, tool_name, base_yield, fallback_yield, max_multiplier=3.0, tool_terms=None):
         if villager.get_item_count(tool_name) > 0:
             villager.degrade_item(tool_name)
-            skill_bonus = min(villager.skill_level, villager.world.config["MAX_SKILL_MULTIPLIER"] - 1)
-            effective_multiplier = min(1 + skill_bonus + villager.world.config["TOOL_YIELD_BASE"], max_multiplier)
+            if tool_terms is None:
+                tool_terms = Action.tool_terms(villager.world.config)
+            max_skill_bonus, tool_yield_base = tool_terms
+            skill_bonus = min(villager.skill_level, max_skill_bonus)
+            effective_multiplier = min(1 + skill_bonus + tool_yield_base, max_multiplier)
             return int(base_yield * effective_multiplier)
         else:
             return int(fallback_yield * villager.skill_level)
 
     @staticmethod
     def purchase_food_if_needed(villager):
-        if villager.get_item_count("food") == 0:
-            success, cost = villager.world.market.attempt_buy("food", 1)
+        if villager.get_item_count(ItemId.food) == 0:
+            market = villager.world.market
+            if market.batch_mode:
+                market.submit_buy(villager, ItemId.food, 1)
+                return
+            success, cost, _ = market.attempt_buy(ItemId.food, 1)
             if success and villager.coins >= cost:
                 villager.coins -= cost
-                villager.world.market.finalize_buy("food", 1)
-                villager.add_item("food", 1)
-                villager.world.market.log_purchase(villager, "food", 1)
+                market.finalize_buy(ItemId.food, 1)
+                villager.add_item(ItemId.food, 1)
+                market.log_purchase(villager, ItemId.food, 1, cost)
                 villager.log(f"Purchased 1 food from market (cost: {cost} coins) due to low food supply.")
             else:
                 villager.log("Unable to purchase food: insufficient funds or market shortage.")
@@ -726,38 +1801,222 @@ class Action:
 
 class RoleManager:
     @staticmethod
-    def do_role_action(villager):
+    def resolve_action(role, config):
+        return getattr(Action, config.ROLE_ACTION_NAMES[role], Action.forage)
+
+    @staticmethod
+    def do_role_action(villager, action_fn=None):
         Action.purchase_food_if_needed(villager)
-        cfg = villager.world.config
-        action_name = cfg["ROLE_ACTIONS"].get(villager.role, cfg["ROLE_ACTIONS"]["default"])
-        action_fn = getattr(Action, action_name, Action.forage)
+        if action_fn is None:
+            action_fn = RoleManager.resolve_action(villager.role, villager.world.config)
         action_fn(villager)
 
+    @staticmethod
+    def bind_shared(action_fn, role, world):
+        # Hoists values that stay fixed while one role group acts: the season,
+        # the tool yield terms and the logging multiplier. Tool needs only
+        # change when someone gains a tool, which a toolless role never does.
+        cfg = world.config
+        if action_fn is Action.farm:
+            return partial(Action.farm, season=world.season, tool_terms=Action.tool_terms(cfg))
+        if action_fn is Action.log_wood:
+            return partial(Action.log_wood, yields=Action.log_yields(cfg), tool_terms=Action.tool_terms(cfg))
+        if action_fn is Action.craft and not cfg.ROLE_TOOL_IDS[role]:
+            return partial(Action.craft, tool_needs=Action.tool_needs(world))
+        return action_fn
+
+    @staticmethod
+    def build_groups(villagers, config):
+        members = {}
+        for v in villagers:
+            members.setdefault(v.role, []).append(v)
+        return [RoleGroup(role, group, config) for role, group in members.items()]
+
+class RoleGroup:
+    """
+    Villagers sharing a role, with the role's action handler resolved once.
+    perform() runs a part of day for the whole group; the members keep their
+    relative order, so with the default spawn order (all farmers, then
+    hunters, ...) the run matches per-villager dispatch.
+    """
+    __slots__ = ("role", "members", "action_fn")
+
+    def __init__(self, role, members, config):
+        self.role = role
+        self.members = members
+        self.action_fn = RoleManager.resolve_action(role, config)
+
+    def perform(self, part_of_day, record):
+        if part_of_day == PartOfDay.Night:
+            for v in self.members:
+                if v.status.health > 0:
+                    v.handle_night()
+                    v.update_spoilage()
+                record(v)
+            return
+        morning = part_of_day == PartOfDay.Morning
+        handler = Villager.handle_morning if morning else Villager.handle_afternoon
+        if not self.members:
+            return
+        action_fn = RoleManager.bind_shared(self.action_fn, self.role, self.members[0].world)
+        for v in self.members:
+            if v.status.health > 0:
+                handler(v, action_fn)
+                v.update_spoilage()
+            elif morning:
+                v.log("Health is 0 => incapacitated, no actions.")
+            record(v)
+
 # -----------------------------------------------------------------------------
 # TILE & MARKET CLASSES
 # -----------------------------------------------------------------------------
 
 class Tile:
-    def __init__(self, terrain_type="field", resource_level=5):
+    # terrain_type holds a shared Terrain member, so a tile is two references.
+    __slots__ = ("terrain_type", "resource_level")
+
+    def __init__(self, terrain_type=Terrain.field, resource_level=5):
         self.terrain_type = terrain_type
         self.resource_level = resource_level
 
+class TradeKind(IntEnum):
+    BUY = 0
+    SELL = 1
+    CRAFT = 2
+    OVERFLOW = 3
+
+class MarketLedger:
+    """
+    Columnar record of every market transaction plus running per-item
+    aggregates, so economic metrics never need to be parsed back out of logs.
+    """
+    def __init__(self, history_length):
+        self.tick = 0
+        self.ticks = array("I")
+        self.kinds = array("b")
+        self.items = array("b")
+        self.villagers = array("i")
+        self.quantities = array("d")
+        self.values = array("d")
+
+        n = len(ItemId)
+        self.volume = [0.0] * n
+        self.turnover = [0.0] * n
+        self.stockouts = [0] * n
+        self.overflow = [0.0] * n
+
+        self.history_length = history_length
+        self.history_size = 0
+        self.history_ticks = array("I", [0] * history_length)
+        self.price_history = [array("d", [0.0] * history_length) for _ in ItemId]
+        self.stock_history = [array("d", [0.0] * history_length) for _ in ItemId]
+
+    def __len__(self):
+        return len(self.ticks)
+
+    def record(self, kind, item, qty, value=0.0, villager_id=0):
+        self.ticks.append(self.tick)
+        self.kinds.append(kind)
+        self.items.append(item)
+        self.villagers.append(villager_id)
+        self.quantities.append(qty)
+        self.values.append(value)
+        if kind == TradeKind.OVERFLOW:
+            self.overflow[item] += qty
+        elif kind != TradeKind.CRAFT:
+            self.volume[item] += qty
+            self.turnover[item] += value
+
+    def record_many(self, kind, item, villager_ids, quantities, values):
+        # Same as one record() per transaction, for a settled batch of one item.
+        count = len(quantities)
+        self.ticks.extend([self.tick] * count)
+        self.kinds.extend([kind] * count)
+        self.items.extend([item] * count)
+        self.villagers.extend(villager_ids)
+        self.quantities.extend(quantities)
+        self.values.extend(values)
+        if kind == TradeKind.OVERFLOW:
+            self.overflow[item] += sum(quantities)
+        elif kind != TradeKind.CRAFT:
+            volume, turnover = self.volume[item], self.turnover[item]
+            for qty, value in zip(quantities, values):
+                volume += qty
+                turnover += value
+            self.volume[item], self.turnover[item] = volume, turnover
+
+    def record_stockout(self, item):
+        self.stockouts[item] += 1
+
+    def close_tick(self, market):
+        # Samples price and stock into the ring buffer, then starts the next tick.
+        slot = self.history_size % self.history_length
+        self.history_ticks[slot] = self.tick
+        for item in ItemId:
+            self.price_history[item][slot] = market.get_price(item)
+            self.stock_history[item][slot] = market.stock.get(item, 0)
+        self.history_size += 1
+        self.tick += 1
+
+    def vwap(self, item):
+        return self.turnover[item] / self.volume[item] if self.volume[item] else 0.0
+
+    def history(self, item):
+        # Returns (tick, price, stock) samples for the retained window, oldest first.
+        count = min(self.history_size, self.history_length)
+        start = self.history_size - count
+        rows = []
+        for i in range(start, self.history_size):
+            slot = i % self.history_length
+            rows.append((self.history_ticks[slot], self.price_history[item][slot], self.stock_history[item][slot]))
+        return rows
+
+    def summary(self):
+        return {
+            item.name: {
+                "volume": self.volume[item],
+                "vwap": self.vwap(item),
+                "stockouts": self.stockouts[item],
+                "overflow": self.overflow[item],
+            }
+            for item in ItemId
+        }
+
+    def to_frame(self):
+        return pd.DataFrame({
+            "tick": self.ticks,
+            "kind": [TradeKind(k).name for k in self.kinds],
+            "item": [ItemId(i).name for i in self.items],
+            "villager_id": self.villagers,
+            "qty": self.quantities,
+            "value": self.values,
+        })
+
 class Market:
     def __init__(self, config, initial_stock, sim_log):
-        self.config = config
+        self.config = compile_config(config)
         self.log = sim_log
-        self.stock = dict(initial_stock)
+        self.stock = {ItemId[k] if isinstance(k, str) else k: v for k, v in initial_stock.items()}
+        self.ledger = MarketLedger(self.config.MARKET_HISTORY_LENGTH)
+        # Day and part of day for market log entries; the world keeps these current.
+        self.day, self.part = 0, PartOfDay.Morning
+        self.batch_mode = self.config.MARKET_MODE == "batch"
+        # Batch mode order book: item -> [(villager, qty), ...] for the current part of day.
+        self.buy_orders = defaultdict(list)
+        self.sell_orders = defaultdict(list)
 
     def _attempt_transaction(self, item_name, qty, is_buy=True):
         if is_buy:
-            available = self.get_stock(item_name)
+            available = self.stock.get(item_name, 0)
             if available == 0:
+                self.ledger.record_stockout(item_name)
                 return False, 0, 0
             # For wood, allow purchasing a partial amount if there isn't enough stock.
-            if item_name == "wood":
+            if item_name == ItemId.wood:
                 actual_qty = min(qty, available)
             else:
                 if available < qty:
+                    self.ledger.record_stockout(item_name)
                     return False, 0, 0
                 actual_qty = qty
             price = self.get_price(item_name)
@@ -779,42 +2038,138 @@ class Market:
         self.add_stock(item_name, qty)
 
     def get_price(self, item_name):
-        base_price = self.config["ITEMS"].get(item_name, {}).get("price", 1)
-        max_stock = self.config["MARKET_MAX_STOCK"].get(item_name, 999999)
-        if self.stock.get(item_name, 0) >= max_stock:
-            return base_price * self.config["MARKET_PRICE_DECAY"]
+        cfg = self.config
+        base_price = cfg.ITEM_PRICE[item_name]
+        if self.stock.get(item_name, 0) >= cfg.ITEM_MAX_STOCK[item_name]:
+            return base_price * cfg.MARKET_PRICE_DECAY
         return base_price
 
     def get_stock(self, item_name):
         return self.stock.get(item_name, 0)
 
     def add_stock(self, item_name, qty):
-        max_allowed = self.config["MARKET_MAX_STOCK"].get(item_name, 999999)
+        max_allowed = self.config.ITEM_MAX_STOCK[item_name]
         current = self.stock.get(item_name, 0)
         new_total = current + qty
         if new_total > max_allowed:
             self.stock[item_name] = max_allowed
             overflow = new_total - max_allowed
             if overflow > 0:
-                self.log.log_action(0, "SYSTEM", 0, "MARKET",
-                                    f"Market reached max capacity for {item_name}, overflow of {overflow} discarded.")
+                self.ledger.record(TradeKind.OVERFLOW, item_name, overflow)
+                if self.config.LOG_MARKET_OVERFLOW:
+                    self.log.log_action(self.day, self.part, 0, "MARKET",
+                                        f"Market reached max capacity for {item_name}, overflow of {overflow} discarded.")
         else:
             self.stock[item_name] = new_total
 
     def remove_stock(self, item_name, qty):
         self.stock[item_name] = max(0, self.stock.get(item_name, 0) - qty)
 
-    def log_purchase(self, villager, item_name, qty):
-        day = villager.world.day_count
-        part = villager.world.world_part_of_day()
+    def submit_buy(self, villager, item_name, qty):
+        if qty > 0:
+            self.buy_orders[item_name].append((villager, qty))
+
+    def submit_sell(self, villager, item_name, qty):
+        # The seller has already handed the goods over; coins follow at clearing.
+        if qty > 0:
+            self.sell_orders[item_name].append((villager, qty))
+
+    def clear_orders(self):
+        """
+        Clears the batch order book, one auction per item. Sells are settled
+        first at the pre-trade price, then buyers are filled from the resulting
+        stock, pro rata by affordable quantity when supply runs short.
+        """
+        items = sorted(set(self.buy_orders) | set(self.sell_orders))
+        for item in items:
+            sells = self.sell_orders.pop(item, ())
+            buys = self.buy_orders.pop(item, ())
+            if sells:
+                self._fill_sells(item, sells)
+            if buys:
+                self._fill_buys(item, buys)
+
+    def _fill_sells(self, item, sells):
+        # Settled in bulk: one ledger append and one log append per item. Each
+        # sale logs the stock after it, as a sequential sale would.
+        price = self.get_price(item)
+        world = sells[0][0].world
+        day, part = world.day_count, world.part
+        name = f"{item}"
+        cap = self.config.ITEM_MAX_STOCK[item]
+        stock = self.stock.get(item, 0)
+        ids, quantities, values, entries = [], [], [], []
+        total = 0
+        for villager, qty in sells:
+            revenue = price * qty
+            villager.coins += revenue
+            total += qty
+            stock = min(stock + qty, cap)
+            ids.append(villager.id)
+            quantities.append(qty)
+            values.append(revenue)
+            entries.append((day, part, villager.id, villager.role,
+                            f"Sold {qty} {name} for {revenue} coins. Market stock now={stock}."))
+        self.ledger.record_many(TradeKind.SELL, item, ids, quantities, values)
+        self.log.log_actions(entries)
+        self.add_stock(item, total)
+
+    def _fill_buys(self, item, buys):
+        price = self.get_price(item)
+        wanted = []
+        for villager, qty in buys:
+            affordable = int(villager.coins // price) if price > 0 else qty
+            wanted.append(min(qty, affordable))
+        demand = sum(wanted)
+        if demand == 0:
+            return
+        available = int(self.stock.get(item, 0))
+        if demand <= available:
+            fills = wanted
+        else:
+            self.ledger.record_stockout(item)
+            fills = [q * available // demand for q in wanted]
+            # Largest-remainder rounding hands out the units lost to flooring.
+            leftover = available - sum(fills)
+            order = sorted(range(len(wanted)), key=lambda i: -(wanted[i] * available % demand))
+            for i in order[:leftover]:
+                fills[i] += 1
+        # Settled in bulk like _fill_sells; each purchase logs the stock left after it.
+        world = buys[0][0].world
+        day, part = world.day_count, world.part
+        name = f"{item}"
+        is_tool = self.config.ITEM_IS_TOOL[item]
+        left = self.stock.get(item, 0)
+        ids, quantities, values, entries = [], [], [], []
+        for (villager, _), qty in zip(buys, fills):
+            if qty <= 0:
+                continue
+            cost = price * qty
+            villager.coins -= cost
+            if is_tool:
+                villager.add_item(item, qty)
+            else:
+                villager.inventory["resources"][item] += qty
+            left -= qty
+            ids.append(villager.id)
+            quantities.append(qty)
+            values.append(cost)
+            entries.append((day, part, villager.id, villager.role, f"Bought {qty} {name}. Market now has {left} left."))
+        self.stock[item] = left
+        self.ledger.record_many(TradeKind.BUY, item, ids, quantities, values)
+        self.log.log_actions(entries)
+
+    def log_purchase(self, villager, item_name, qty, cost=0):
+        self.ledger.record(TradeKind.BUY, item_name, qty, cost, villager.id)
+        world = villager.world
         left = self.stock.get(item_name, 0)
-        self.log.log_action(day, part, villager.id, villager.role,
+        self.log.log_action(world.day_count, world.part, villager.id, villager.role,
                              f"Bought {qty} {item_name}. Market now has {left} left.")
 
     def log_sale(self, villager, item_name, qty, revenue):
-        day = villager.world.day_count
-        part = villager.world.world_part_of_day()
-        self.log.log_action(day, part, villager.id, villager.role,
+        self.ledger.record(TradeKind.SELL, item_name, qty, revenue, villager.id)
+        world = villager.world
+        self.log.log_action(world.day_count, world.part, villager.id, villager.role,
                              f"Sold {qty} {item_name} for {revenue} coins. Market stock now={self.stock.get(item_name, 0)}.")
 
 # -----------------------------------------------------------------------------
@@ -823,126 +2178,590 @@ class Market:
 
 class EventManager:
     def __init__(self, config, sim_log):
-        self.config = config
+        self.config = compile_config(config)
         self.log = sim_log
 
     def handle_morning_events(self, world):
-        if random.random() < self.config["STORM_PROBABILITY"]:
+        cfg = self.config
+        if random.random() < cfg.STORM_PROBABILITY:
             self.trigger_storm(world)
-        if random.random() < self.config["DISEASE_PROBABILITY"]:
+        if random.random() < cfg.DISEASE_PROBABILITY:
             self.trigger_disease(world)
-        if random.random() < self.config["MONSTER_SPAWN_PROB"]:
+        if random.random() < cfg.MONSTER_SPAWN_PROB:
             self.trigger_monster_attack(world)
 
     def trigger_storm(self, world):
-        reduction = self.config["STORM_RESOURCE_REDUCTION"]
-        num_tiles = (world.width * world.height) // self.config["STORM_AFFECTED_TILE_DIVISOR"]
-        for _ in range(num_tiles):
-            rx = random.randint(0, world.width - 1)
-            ry = random.randint(0, world.height - 1)
-            tile = world.grid[ry][rx]
-            tile.resource_level = max(0, tile.resource_level - reduction)
-        self.log.log_action(world.day_count, "Morning", 0, "EVENT",
+        reduction = self.config.STORM_RESOURCE_REDUCTION
+        if world.terrain:
+            # Only land that has been generated is tracked, so the storm hits
+            # the same share of the resident chunks.
+            tiles = list(world.terrain.resident_tiles())
+            num_tiles = len(tiles) // self.config.STORM_AFFECTED_TILE_DIVISOR
+            for _ in range(num_tiles):
+                tile = random.choice(tiles)
+                tile.resource_level = max(0, tile.resource_level - reduction)
+        else:
+            num_tiles = (world.width * world.height) // self.config.STORM_AFFECTED_TILE_DIVISOR
+            for _ in range(num_tiles):
+                rx = random.randint(0, world.width - 1)
+                ry = random.randint(0, world.height - 1)
+                tile = world.grid[ry][rx]
+                tile.resource_level = max(0, tile.resource_level - reduction)
+                world.touch_tile(tile)
+        self.log.log_action(world.day_count, PartOfDay.Morning, 0, "EVENT",
                            f"Storm reduced resources in ~{num_tiles} tiles.")
 
     def trigger_disease(self, world):
         if not world.villagers:
             return
         victim = random.choice(world.villagers)
+        if world.contagion:
+            if victim.status.health > 0 and world.contagion.infect(victim):
+                self.log.log_action(world.day_count, PartOfDay.Morning, victim.id, "EVENT",
+                                    f"Disease struck villager {victim.id} => infected.")
+            return
         if victim.status.health > 0:
-            dmg = self.config["DISEASE_HEALTH_LOSS"]
+            dmg = self.config.DISEASE_HEALTH_LOSS
             victim.status.health = max(0, victim.status.health - dmg)
-            self.log.log_action(world.day_count, "Morning", victim.id, "EVENT",
+            self.log.log_action(world.day_count, PartOfDay.Morning, victim.id, "EVENT",
                                  f"Disease struck villager {victim.id} => health -{dmg}.")
 
     def trigger_monster_attack(self, world):
         if not world.villagers:
             return
-        monster_name = random.choice(world.config["MONSTER_TYPES"])
-        health = random.randint(*world.config["MONSTER_HEALTH_RANGE"])
-        damage = random.randint(*world.config["MONSTER_DAMAGE_RANGE"])
+        cfg = self.config
+        if cfg.MONSTER_AGENTS:
+            self.spawn_monster_agent(world)
+            return
+        monster_name = random.choice(cfg.MONSTER_TYPES)
+        health = random.randint(*cfg.MONSTER_HEALTH_RANGE)
+        damage = random.randint(*cfg.MONSTER_DAMAGE_RANGE)
         monster = Monster(monster_name, health, damage)
         world.monsters.append(monster)
         victim = random.choice(world.villagers)
-        self.log.log_action(world.day_count, "Morning", 0, "EVENT",
+        self.log.log_action(world.day_count, PartOfDay.Morning, 0, "EVENT",
                              f"A {monster_name} spawned and attacks villager {victim.id}!")
         monster.attack_villager(victim)
         if monster.is_dead():
             world.monsters.remove(monster)
 
+    def spawn_monster_agent(self, world):
+        # Agents enter from a random point on the map edge and stay until killed.
+        cfg = self.config
+        monster_name = random.choice(cfg.MONSTER_TYPES)
+        health = random.randint(*cfg.MONSTER_HEALTH_RANGE)
+        damage = random.randint(*cfg.MONSTER_DAMAGE_RANGE)
+        edge = random.randrange(2 * (world.width + world.height))
+        if edge < world.width:
+            x, y = edge, 0
+        elif edge < 2 * world.width:
+            x, y = edge - world.width, world.height - 1
+        elif edge < 2 * world.width + world.height:
+            x, y = 0, edge - 2 * world.width
+        else:
+            x, y = world.width - 1, edge - 2 * world.width - world.height
+        world.monsters.append(Monster(monster_name, health, damage, x, y))
+        self.log.log_action(world.day_count, PartOfDay.Morning, 0, "EVENT",
+                             f"A {monster_name} appeared at ({x}, {y}).")
+
+    def advance_monsters(self, world):
+        if not world.monsters:
+            return
+        cfg = self.config
+        targets = SpatialHash(cfg.SPATIAL_HASH_CELL_SIZE)
+        for v in world.villagers:
+            if v.status.health > 0:
+                targets.insert(v, v.x, v.y)
+        engagements = []
+        for monster in world.monsters:
+            target, _ = targets.nearest(monster.x, monster.y, key=lambda v: v.id)
+            if target is None:
+                break
+            monster.step_towards(target.x, target.y, cfg.MONSTER_SPEED)
+            if max(abs(target.x - monster.x), abs(target.y - monster.y)) <= cfg.MONSTER_ATTACK_RANGE:
+                engagements.append((monster, target))
+        Monster.resolve_combats(engagements, cfg.COMBAT_MAX_ROUNDS)
+        world.monsters = [m for m in world.monsters if m.alive]
+
+# -----------------------------------------------------------------------------
+# CHUNKED TERRAIN
+# -----------------------------------------------------------------------------
+
+class TerrainNoise:
+    """
+    Seeded multi-octave value noise, evaluated on whole coordinate arrays.
+    Lattice values come from an integer hash of (x, y, seed), so any tile
+    can be generated independently of the others and of the order chunks
+    are visited in.
+    """
+    def __init__(self, seed, scale, octaves):
+        self.seed = np.uint64(seed)
+        self.scale = scale
+        self.octaves = octaves
+
+    def _lattice(self, xi, yi, octave):
+        with np.errstate(over="ignore"):
+            h = (xi.astype(np.uint64) * np.uint64(0x9E3779B185EBCA87)
+                 ^ yi.astype(np.uint64) * np.uint64(0xC2B2AE3D27D4EB4F)
+                 ^ (self.seed + np.uint64(octave)) * np.uint64(0x165667B19E3779F9))
+            h ^= h >> np.uint64(29)
+            h *= np.uint64(0xBF58476D1CE4E5B9)
+            h ^= h >> np.uint64(32)
+        return (h >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+    def sample(self, xs, ys):
+        total = np.zeros(np.broadcast(xs, ys).shape)
+        amplitude, norm, scale = 1.0, 0.0, float(self.scale)
+        for octave in range(self.octaves):
+            fx, fy = xs / scale, ys / scale
+            x0, y0 = np.floor(fx), np.floor(fy)
+            tx, ty = fx - x0, fy - y0
+            tx, ty = tx * tx * (3 - 2 * tx), ty * ty * (3 - 2 * ty)
+            x0, y0 = x0.astype(np.int64), y0.astype(np.int64)
+            top = self._lattice(x0, y0, octave) * (1 - tx) + self._lattice(x0 + 1, y0, octave) * tx
+            bottom = self._lattice(x0, y0 + 1, octave) * (1 - tx) + self._lattice(x0 + 1, y0 + 1, octave) * tx
+            total = total + amplitude * (top * (1 - ty) + bottom * ty)
+            norm += amplitude
+            amplitude *= 0.5
+            scale = max(scale / 2, 1.0)
+        return total / norm
+
+class ChunkedTerrain:
+    """
+    World tiles split into square chunks that are generated from noise the
+    first time they are touched. Noise bands map to terrains in
+    TERRAIN_DISTRIBUTION order, with cut points taken from a sample of the
+    noise so each terrain keeps roughly its configured share.
+
+    Forest regrowth is applied lazily: the world only counts nights, and a
+    chunk catches up on the nights it missed when it is next accessed. When
+    more than max_resident chunks hold Tile objects, the least recently
+    used one is packed into a compressed byte string.
+    """
+    def __init__(self, config, seed):
+        self.width = config.GRID_WIDTH
+        self.height = config.GRID_HEIGHT
+        self.chunk_size = config.TERRAIN_CHUNK_SIZE
+        self.max_resident = config.TERRAIN_MAX_RESIDENT_CHUNKS
+        self.max_forest = config.MAX_FOREST_RESOURCE
+        self.noise = TerrainNoise(seed, config.TERRAIN_NOISE_SCALE, config.TERRAIN_NOISE_OCTAVES)
+        distribution = config.TERRAIN_DISTRIBUTION
+        self.terrains = tuple(Terrain[name] for name in distribution)
+        self.base_resource = tuple(distribution[name]["base_resource"] for name in distribution)
+        chances = np.array([distribution[name]["chance"] for name in distribution], dtype=float)
+        sample_axis = np.arange(128) * 97.0
+        sample = self.noise.sample(sample_axis[None, :], sample_axis[:, None] * 0.89).ravel()
+        self.cuts = np.quantile(sample, np.cumsum(chances / chances.sum())[:-1])
+        self.resident = OrderedDict()  # (cx, cy) -> [rows of Tiles, regrowth stamp]
+        self.packed = {}  # (cx, cy) -> (compressed bytes, regrowth stamp)
+        self.nights = 0
+        self.generated = 0
+
+    def _bounds(self, cx, cy):
+        x0, y0 = cx * self.chunk_size, cy * self.chunk_size
+        return x0, y0, min(x0 + self.chunk_size, self.width), min(y0 + self.chunk_size, self.height)
+
+    def _generate(self, cx, cy):
+        x0, y0, x1, y1 = self._bounds(cx, cy)
+        xs = np.arange(x0, x1, dtype=np.float64)[None, :]
+        ys = np.arange(y0, y1, dtype=np.float64)[:, None]
+        codes = np.searchsorted(self.cuts, self.noise.sample(xs, ys), side="right")
+        terrains, bases = self.terrains, self.base_resource
+        self.generated += 1
+        # A new chunk starts as if it had been regrowing since the first night.
+        return [[Tile(terrains[c], bases[c]) for c in row] for row in codes.tolist()], 0
+
+    def _pack(self, rows):
+        codes = array("b", (self.terrains.index(tile.terrain_type) for row in rows for tile in row))
+        levels = array("i", (tile.resource_level for row in rows for tile in row))
+        return zlib.compress(codes.tobytes() + levels.tobytes())
+
+    def _unpack(self, cx, cy, data):
+        x0, y0, x1, y1 = self._bounds(cx, cy)
+        width, count = x1 - x0, (x1 - x0) * (y1 - y0)
+        raw = zlib.decompress(data)
+        codes = array("b", raw[:count])
+        levels = array("i")
+        levels.frombytes(raw[count:])
+        terrains = self.terrains
+        tiles = [Tile(terrains[c], level) for c, level in zip(codes, levels)]
+        return [tiles[i:i + width] for i in range(0, count, width)]
+
+    def chunk(self, cx, cy):
+        key = (cx, cy)
+        entry = self.resident.get(key)
+        if entry is None:
+            if key in self.packed:
+                data, stamp = self.packed.pop(key)
+                entry = [self._unpack(cx, cy, data), stamp]
+            else:
+                entry = list(self._generate(cx, cy))
+            self.resident[key] = entry
+            while len(self.resident) > self.max_resident:
+                old_key, (old_rows, old_stamp) = self.resident.popitem(last=False)
+                self.packed[old_key] = (self._pack(old_rows), old_stamp)
+        else:
+            self.resident.move_to_end(key)
+        missed = self.nights - entry[1]
+        if missed:
+            max_forest = self.max_forest
+            for row in entry[0]:
+                for tile in row:
+                    if tile.terrain_type == Terrain.forest:
+                        tile.resource_level = min(tile.resource_level + missed, max_forest)
+            entry[1] = self.nights
+        return entry[0]
+
+    def tile_at(self, x, y):
+        size = self.chunk_size
+        return self.chunk(x // size, y // size)[y % size][x % size]
+
+    def regrow(self):
+        self.nights += 1
+
+    def resident_tiles(self):
+        for key in list(self.resident):
+            for row in self.chunk(*key):
+                yield from row
+
+    def find_nearest(self, terrain_type, x, y):
+        # Searches chunk rings outward from (x, y), row-major inside a chunk.
+        size = self.chunk_size
+        cx, cy = x // size, y // size
+        max_cx, max_cy = (self.width - 1) // size, (self.height - 1) // size
+        for radius in range(max(cx, cy, max_cx - cx, max_cy - cy) + 1):
+            for ry in range(cy - radius, cy + radius + 1):
+                for rx in range(cx - radius, cx + radius + 1):
+                    if max(abs(rx - cx), abs(ry - cy)) != radius or not (0 <= rx <= max_cx and 0 <= ry <= max_cy):
+                        continue
+                    for row in self.chunk(rx, ry):
+                        for tile in row:
+                            if tile.terrain_type == terrain_type and tile.resource_level > 0:
+                                return tile
+        return None
+
+# -----------------------------------------------------------------------------
+# CONTAGION
+# -----------------------------------------------------------------------------
+
+class Contagion:
+    """
+    SIR epidemic over the whole population. Contacts form a sparse weighted
+    adjacency matrix, kept as COO arrays: neighbouring homes and marriages
+    are fixed edges, while shared work tiles go through a villager-tile
+    incidence matrix rebuilt every part of the day, so a crowded tile costs
+    O(workers) instead of O(workers^2) edges. Each step is one sparse
+    matrix-vector product (np.bincount) giving every villager's infection
+    hazard.
+    """
+    SUSCEPTIBLE, INFECTED, RECOVERED = 0, 1, 2
+
+    def __init__(self, villagers, config, seed):
+        self.config = config
+        self.villagers = list(villagers)
+        self.index = {v.id: i for i, v in enumerate(self.villagers)}
+        n = len(self.villagers)
+        ids = np.fromiter((v.id for v in self.villagers), dtype=np.int64, count=n)
+        # Villager id -> index, -1 for ids outside the model.
+        self.index_of = np.full(int(ids.max()) + 1 if n else 0, -1, dtype=np.int64)
+        self.index_of[ids] = np.arange(n)
+        self.state = np.zeros(n, dtype=np.int8)
+        self.alive = np.ones(n, dtype=bool)
+        self.rng = np.random.default_rng(seed)
+        self._work_villagers = array("q")
+        self._work_tiles = array("q")
+        self._tile_ids = {}
+        rows, cols = self._household_edges()
+        self.rows = np.array(rows, dtype=np.int64)
+        self.cols = np.array(cols, dtype=np.int64)
+        self.weights = np.full(len(rows), config.CONTAGION_HOUSEHOLD_RATE)
+
+    def _household_edges(self):
+        homes = defaultdict(list)
+        for i, v in enumerate(self.villagers):
+            homes[(v.x, v.y)].append(i)
+        rows, cols = [], []
+        for (x, y), residents in homes.items():
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    for j in homes.get((x + dx, y + dy), ()):
+                        for i in residents:
+                            if i != j:
+                                rows.append(i)
+                                cols.append(j)
+        return rows, cols
+
+    def add_partnership(self, v1, v2):
+        i, j = self.index[v1.id], self.index[v2.id]
+        self.rows = np.append(self.rows, [i, j])
+        self.cols = np.append(self.cols, [j, i])
+        self.weights = np.append(self.weights, [self.config.CONTAGION_PARTNER_RATE] * 2)
+
+    def remove(self, villager_ids):
+        # Marks the dead, touching only their entries.
+        ids = np.asarray(villager_ids, dtype=np.int64)
+        indices = self.index_of[ids[ids < len(self.index_of)]]
+        self.alive[indices[indices >= 0]] = False
+
+    def note_work(self, villager, tile):
+        i = self.index.get(villager.id)
+        if i is not None:
+            self._work_villagers.append(i)
+            self._work_tiles.append(self._tile_ids.setdefault(id(tile), len(self._tile_ids)))
+
+    def infect(self, villager):
+        i = self.index[villager.id]
+        if self.state[i] != self.SUSCEPTIBLE:
+            return False
+        self.state[i] = self.INFECTED
+        return True
+
+    @property
+    def infected_count(self):
+        return int(np.count_nonzero((self.state == self.INFECTED) & self.alive))
+
+    def hazard(self, infected):
+        x = infected.astype(np.float64)
+        force = np.bincount(self.rows, weights=self.weights * x[self.cols], minlength=len(x))
+        if self._work_villagers:
+            members = np.frombuffer(self._work_villagers, dtype=np.int64)
+            tiles = np.frombuffer(self._work_tiles, dtype=np.int64)
+            load = np.bincount(tiles, weights=x[members])
+            force += self.config.CONTAGION_WORK_RATE * np.bincount(
+                members, weights=load[tiles] - x[members], minlength=len(x))
+        return force
+
+    def step(self, world):
+        # Advances infections by one part of the day; returns (new, recovered).
+        infected = (self.state == self.INFECTED) & self.alive
+        new = recovered = 0
+        if infected.any():
+            force = self.hazard(infected)
+            # Only exposed susceptibles and the infected need a random draw.
+            exposed = np.flatnonzero((force > 0) & (self.state == self.SUSCEPTIBLE) & self.alive)
+            newly = exposed[self.rng.random(len(exposed)) < -np.expm1(-force[exposed])]
+            sick = np.flatnonzero(infected)
+            heal = self.rng.random(len(sick)) < self.config.CONTAGION_RECOVERY_PROB
+            self.state[newly] = self.INFECTED
+            self.state[sick[heal]] = self.RECOVERED
+            new, recovered = len(newly), int(heal.sum())
+            if world.part == PartOfDay.Morning:
+                loss = self.config.CONTAGION_HEALTH_LOSS
+                for i in sick[~heal]:
+                    status = self.villagers[i].status
+                    status.health = max(0, status.health - loss)
+        self._work_villagers = array("q")
+        self._work_tiles = array("q")
+        self._tile_ids = {}
+        return new, recovered
+
+# -----------------------------------------------------------------------------
+# WORLD TEMPLATES
+# -----------------------------------------------------------------------------
+
+class WorldTemplateCache:
+    """
+    On-disk cache of freshly generated grids, keyed by the seed and a hash
+    of the config keys that shape the grid. A template holds a small JSON
+    header (including the random state right after generation, so the run
+    continues exactly as if it had generated the grid itself) followed by
+    the terrain codes as bytes and the resource levels as int32.
+    """
+    VERSION = 1
+    GRID_KEYS = ("GRID_WIDTH", "GRID_HEIGHT", "TERRAIN_DISTRIBUTION")
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, config, seed):
+        plain = config.to_dict()
+        relevant = {key: plain[key] for key in self.GRID_KEYS}
+        digest = hashlib.sha256(json.dumps([self.VERSION, relevant], sort_keys=True).encode()).hexdigest()
+        return os.path.join(self.directory, f"world_{seed}_{digest[:16]}.bin")
+
+    def load(self, config, seed):
+        # Returns the grid and restores the random state, or None on a miss.
+        try:
+            with open(self.path(config, seed), "rb") as f, \
+                    mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY) as data:
+                header_len = int.from_bytes(data[:4], "little")
+                header = json.loads(data[4:4 + header_len])
+                width, height = header["width"], header["height"]
+                start = 4 + header_len
+                codes = np.frombuffer(data, np.uint8, width * height, start).reshape(height, width).tolist()
+                levels = np.frombuffer(data, "<i4", width * height, start + width * height).reshape(height, width).tolist()
+        except (OSError, ValueError):
+            return None
+        terrains = [Terrain[name] for name in header["terrains"]]
+        state = header["random_state"]
+        random.setstate((state[0], tuple(state[1]), state[2]))
+        # Millions of fresh tiles would otherwise trigger repeated full GC passes.
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return [[Tile(terrains[c], level) for c, level in zip(code_row, level_row)]
+                    for code_row, level_row in zip(codes, levels)]
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+    def store(self, config, seed, grid):
+        terrains = list(Terrain)
+        header = json.dumps({
+            "width": len(grid[0]), "height": len(grid),
+            "terrains": [t.name for t in terrains],
+            "random_state": random.getstate(),
+        }).encode()
+        codes = bytes(int(tile.terrain_type) for row in grid for tile in row)
+        levels = np.array([[tile.resource_level for tile in row] for row in grid], dtype="<i4").tobytes()
+        path = self.path(config, seed)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(len(header).to_bytes(4, "little") + header + codes + levels)
+        os.replace(tmp, path)
+
 # -----------------------------------------------------------------------------
 # WORLD CLASS
 # -----------------------------------------------------------------------------
 
 class World:
-    def __init__(self, config, sim_log):
+    def __init__(self, config, sim_log, templates=None, seed=None):
+        config = compile_config(config)
         self.config = config
-        self.width = config["GRID_WIDTH"]
-        self.height = config["GRID_HEIGHT"]
+        self.width = config.GRID_WIDTH
+        self.height = config.GRID_HEIGHT
         self.log = sim_log
-        self.grid = self._generate_tiles()
-        self.market = Market(config, config["INITIAL_MARKET_STOCK"], sim_log)
+        self.terrain = None
+        if config.TERRAIN_MODE == "chunked":
+            seed = config.TERRAIN_SEED if config.TERRAIN_SEED is not None else random.getrandbits(32)
+            self.terrain = ChunkedTerrain(config, seed)
+            self.grid = None
+        else:
+            self.grid = templates.load(config, seed) if templates else None
+            if self.grid is None:
+                self.grid = self._generate_tiles()
+                if templates:
+                    templates.store(config, seed, self.grid)
+        self.market = Market(config, config.STARTING_STOCK, sim_log)
         self.event_manager = EventManager(config, sim_log)
-        self.day_count = 1
-        self.part_of_day_index = 0
+        self.tick = 0
+        self.day_count, self.part, self.season = config.calendar(0)
+        self.part_of_day_index = int(self.part)
+        self.market.day, self.market.part = self.day_count, self.part
         self.villagers = []
         self.monsters = []
+        self.center = (self.width // 2, self.height // 2)
+        self.distance_fields = None
+        self.contagion = None
+        self.roster_version = 0  # Bumped on deaths
+
+    def home_position(self, index, population):
+        # Homes fill a square block around the village center, in spawn order.
+        side = max(1, math.ceil(math.sqrt(population)))
+        x = self.center[0] - side // 2 + index % side
+        y = self.center[1] - side // 2 + index // side
+        return min(max(x, 0), self.width - 1), min(max(y, 0), self.height - 1)
     
     @property
     def current_tick(self):
-        # Compute the current tick as (day - 1) * (number of parts) + current part index.
-        return (self.day_count - 1) * len(self.config["PARTS_OF_DAY"]) + self.part_of_day_index
+        return self.tick
 
     def _generate_tiles(self):
-        dist = self.config["TERRAIN_DISTRIBUTION"]
-        weighted_list = [(t_type, info["base_resource"])
-                         for t_type, info in dist.items()
-                         for _ in range(int(info["chance"] * 100))]
+        weighted_list = self.config.TERRAIN_WEIGHTS
         return [
             [Tile(*random.choice(weighted_list)) for _ in range(self.width)]
             for _ in range(self.height)
         ]
 
+    def tile_at(self, x, y):
+        if self.terrain:
+            return self.terrain.tile_at(x, y)
+        return self.grid[y][x]
+
     def world_part_of_day(self):
-        return self.config["PARTS_OF_DAY"][self.part_of_day_index]
+        return self.part
 
     def get_current_season(self):
-        season_index = ((self.day_count - 1) // self.config["DAYS_PER_SEASON"]) % len(self.config["SEASONS"])
-        return self.config["SEASONS"][season_index]
+        return self.season
 
     def is_winter(self):
-        return self.get_current_season() == "Winter"
+        return self.season == Season.Winter
 
     def update_resources_and_events(self, part_of_day):
-        if part_of_day == "Morning":
+        if part_of_day == PartOfDay.Morning:
             self.event_manager.handle_morning_events(self)
-        if part_of_day == "Night":
+            if self.config.MONSTER_AGENTS:
+                self.event_manager.advance_monsters(self)
+        if part_of_day == PartOfDay.Night:
             self.regrow_resources()
+        self.spread_contagion()
+        self.remove_dead()
+
+    def spread_contagion(self):
+        if self.contagion:
+            new, recovered = self.contagion.step(self)
+            if new or recovered:
+                self.log.log_action(
+                    self.day_count, self.part, 0, "EVENT",
+                    f"Epidemic: {new} new infections, {recovered} recovered, "
+                    f"{self.contagion.infected_count} infected."
+                )
+
+    def remove_dead(self):
         for villager in self.villagers:
             if villager.status.health <= 0:
                 self.log.log_action(
-                    self.day_count, self.world_part_of_day(),
+                    self.day_count, self.part,
                     villager.id, villager.role, "Perished from poor health"
                 )
-        self.villagers = [v for v in self.villagers if v.status.health > 0]
+        survivors = [v for v in self.villagers if v.status.health > 0]
+        if len(survivors) != len(self.villagers):
+            self.roster_version += 1
+            if self.contagion:
+                self.contagion.remove([v.id for v in self.villagers if v.status.health <= 0])
+        self.villagers = survivors
 
     def regrow_resources(self):
+        if self.terrain:
+            self.terrain.regrow()
+            return
+        max_forest = self.config.MAX_FOREST_RESOURCE
+        fields = self.distance_fields
         for row in self.grid:
             for tile in row:
-                if tile.terrain_type == "forest":
-                    tile.resource_level = min(tile.resource_level + 1, self.config["MAX_FOREST_RESOURCE"])
+                if tile.terrain_type == Terrain.forest:
+                    regrown = tile.resource_level <= 0
+                    tile.resource_level = min(tile.resource_level + 1, max_forest)
+                    if fields and regrown:
+                        fields.update_tile(tile)
+
+    def build_distance_fields(self, homes):
+        self.distance_fields = DistanceFields(self, [self.center] + list(homes))
+
+    def touch_tile(self, tile):
+        # Keeps the productive-tile index current after a resource change.
+        if self.distance_fields:
+            self.distance_fields.update_tile(tile)
+
+    def travel_factor(self, distance):
+        cfg = self.config
+        return max(cfg.MIN_TRAVEL_YIELD_FACTOR, 1 - cfg.TRAVEL_COST_PER_TILE * distance)
 
     def advance_time(self):
-        self.part_of_day_index += 1
-        if self.part_of_day_index >= len(self.config["PARTS_OF_DAY"]):
-            self.part_of_day_index = 0
-            self.day_count += 1
+        self.market.ledger.close_tick(self.market)
+        self.tick += 1
+        self.day_count, self.part, self.season = self.config.calendar(self.tick)
+        self.part_of_day_index = int(self.part)
+        self.market.day, self.market.part = self.day_count, self.part
 
 # -----------------------------------------------------------------------------
 # VILLAGER NEEDS / STATUS
 # -----------------------------------------------------------------------------
 
 class VillagerStatus:
+    __slots__ = ("hunger", "rest", "health", "happiness")
+
     def __init__(self, hunger, rest, health, happiness):
         self.hunger = hunger
         self.rest = rest
@@ -954,33 +2773,37 @@ class VillagerStatus:
 # -----------------------------------------------------------------------------
 
 class Villager:
+    __slots__ = ("id", "role", "world", "status", "low_hunger_streak", "low_rest_streak", "coins",
+                 "skill_level", "relationship_status", "partner_id", "x", "y", "inventory", "max_skill")
+
     def __init__(self, vid, role, world):
         self.id = vid
         self.role = role
         self.world = world
         cfg = world.config
-        self.status = VillagerStatus(cfg["INITIAL_HUNGER"], cfg["INITIAL_REST"],
-                                     cfg["INITIAL_HEALTH"], cfg["INITIAL_HAPPINESS"])
+        self.status = VillagerStatus(cfg.INITIAL_HUNGER, cfg.INITIAL_REST,
+                                     cfg.INITIAL_HEALTH, cfg.INITIAL_HAPPINESS)
         self.low_hunger_streak = 0
         self.low_rest_streak = 0
-        self.coins = cfg["INITIAL_VILLAGER_COINS"]
+        self.coins = cfg.INITIAL_VILLAGER_COINS
         self.skill_level = 1.0
         self.relationship_status = "single"
         self.partner_id = None
+        self.x, self.y = world.center
         # Use separate buckets for resources and tools.
         self.inventory = {"resources": defaultdict(int), "tools": defaultdict(list)}
-        if cfg["INITIAL_VILLAGER_FOOD"] > 0:
-            self.add_item("food", cfg["INITIAL_VILLAGER_FOOD"])
-        if cfg["INITIAL_VILLAGER_WOOD"] > 0:
-            self.add_item("wood", cfg["INITIAL_VILLAGER_WOOD"])
+        if cfg.INITIAL_VILLAGER_FOOD > 0:
+            self.add_item(ItemId.food, cfg.INITIAL_VILLAGER_FOOD)
+        if cfg.INITIAL_VILLAGER_WOOD > 0:
+            self.add_item(ItemId.wood, cfg.INITIAL_VILLAGER_WOOD)
         self.max_skill = {
-            "Farmer": cfg["MAX_SKILL_MULTIPLIER"],
-            "Hunter": cfg["MAX_SKILL_MULTIPLIER"],
-            "Logger": cfg["MAX_SKILL_MULTIPLIER"]
+            Role.Farmer: cfg.MAX_SKILL_MULTIPLIER,
+            Role.Hunter: cfg.MAX_SKILL_MULTIPLIER,
+            Role.Logger: cfg.MAX_SKILL_MULTIPLIER
         }
 
     def adjust_health(self, delta):
-        max_health = self.world.config.get("MAX_HEALTH", 100)
+        max_health = self.world.config.MAX_HEALTH
         new_health = self.status.health + delta
         new_health = max(0, new_health)
         self.status.health = min(new_health, max_health)
@@ -988,21 +2811,20 @@ class Villager:
     def add_item(self, item_name, quantity=1):
         if quantity <= 0:
             return
-        item_def = self.world.config["ITEMS"].get(item_name, {})
-        durability = item_def.get("durability", 0)
-        if durability > 0:
+        cfg = self.world.config
+        if cfg.ITEM_IS_TOOL[item_name]:
+            durability = cfg.ITEM_DURABILITY[item_name]
+            spoilage = cfg.ITEM_SPOILAGE[item_name]
             for _ in range(quantity):
-                self.inventory["tools"][item_name].append(Item(item_name, 1, durability))
+                self.inventory["tools"][item_name].append(Item(item_name, 1, durability, spoilage))
         else:
             self.inventory["resources"][item_name] += quantity
 
     def remove_item(self, item_name, quantity=1):
         if quantity <= 0:
             return 0
-        item_def = self.world.config["ITEMS"].get(item_name, {})
-        durability = item_def.get("durability", 0)
         removed = 0
-        if durability > 0:
+        if self.world.config.ITEM_IS_TOOL[item_name]:
             tools_list = self.inventory["tools"].get(item_name, [])
             while tools_list and removed < quantity:
                 tools_list.pop(0)
@@ -1018,17 +2840,13 @@ class Villager:
         return removed
 
     def get_item_count(self, item_name):
-        item_def = self.world.config["ITEMS"].get(item_name, {})
-        durability = item_def.get("durability", 0)
-        if durability > 0:
+        if self.world.config.ITEM_IS_TOOL[item_name]:
             return len(self.inventory["tools"].get(item_name, []))
         else:
             return self.inventory["resources"].get(item_name, 0)
 
     def degrade_item(self, item_name):
-        item_def = self.world.config["ITEMS"].get(item_name, {})
-        durability = item_def.get("durability", 0)
-        if durability <= 0:
+        if not self.world.config.ITEM_IS_TOOL[item_name]:
             return
         tools_list = self.inventory["tools"].get(item_name, [])
         if tools_list:
@@ -1048,107 +2866,118 @@ class Villager:
         Every item with spoilage > 0 will be checked; if the current tick is a multiple 
         of its spoilage rate, those items are removed and logged.
         """
-        current_tick = self.world.current_tick  # Make sure that current_tick is updated appropriately in advance_time
+        world = self.world
+        current_tick = world.tick
+        spoilage = world.config.ITEM_SPOILAGE
         for item_name in list(self.inventory["resources"].keys()):
-            spoilage_rate = self.world.config["ITEMS"].get(item_name, {}).get("spoilage", 0)
+            spoilage_rate = spoilage[item_name]
             if spoilage_rate > 0 and (current_tick % spoilage_rate == 0):
                 quantity = self.inventory["resources"][item_name]
-                self.log.log_action(
-                    self.world.day_count, self.world.world_part_of_day(),
+                world.log.log_action(
+                    world.day_count, world.part,
                     self.id, self.role, f"{quantity} {item_name}(s) spoiled and were discarded."
                 )
                 # Remove all of the spoiled item
                 self.remove_item(item_name, quantity)
 
-    def handle_morning(self):
-        if self.status.health < self.world.config["EMERGENCY_HEALTH_THRESHOLD"]:
+    def handle_morning(self, action_fn=None):
+        cfg = self.world.config
+        if self.status.health < cfg.EMERGENCY_HEALTH_THRESHOLD:
             self.emergency_recover()
         self.eat_if_needed()
         self.sell_surplus()
         self.buy_essential_items()
         self.buy_primary_tool()
-        RoleManager.do_role_action(self)
+        RoleManager.do_role_action(self, action_fn)
         
         # Only cook if raw food exceeds the safety reserve
-        raw_food_count = self.get_item_count("food")
-        raw_food_safety = self.world.config.get("RAW_FOOD_SAFETY", 2)
-        if raw_food_count > raw_food_safety:
+        raw_food_count = self.get_item_count(ItemId.food)
+        if raw_food_count > cfg.RAW_FOOD_SAFETY:
             Action.cook_food(self)
         
-        if (self.status.health < self.world.config["USE_HERB_HEALTH_THRESHOLD"] and 
-            self.get_item_count("herb") > 0):
+        if (self.status.health < cfg.USE_HERB_HEALTH_THRESHOLD and 
+            self.get_item_count(ItemId.herb) > 0):
             self.use_herb()
 
-    def handle_afternoon(self):
-        RoleManager.do_role_action(self)
+    def handle_afternoon(self, action_fn=None):
+        RoleManager.do_role_action(self, action_fn)
         self.sell_surplus()
 
     def handle_night(self):
-        if self.world.world_part_of_day() != "Night":
+        world = self.world
+        if world.part != PartOfDay.Night:
             self.log("Attempted to sleep outside of night time. Action not permitted.")
             return
-        if self.world.is_winter():
+        if world.season == Season.Winter:
             self.consume_wood_at_night()
-        self.adjust_health(self.world.config["NIGHT_HEALTH_RECOVERY"])
-        self.log(f"Slept during the night => health +{self.world.config['NIGHT_HEALTH_RECOVERY']}")
+        recovery = world.config.NIGHT_HEALTH_RECOVERY
+        self.adjust_health(recovery)
+        self.log(f"Slept during the night => health +{recovery}")
         self.update_needs_and_penalties()
 
     def perform_part_of_day(self, part_of_day):
         if self.status.health <= 0:
-            if part_of_day == "Morning":
+            if part_of_day == PartOfDay.Morning:
                 self.log("Health is 0 => incapacitated, no actions.")
             return
-        actions = {
-            "Morning": self.handle_morning,
-            "Afternoon": self.handle_afternoon,
-            "Night": self.handle_night
-        }
-        action = actions.get(part_of_day, lambda: None)
-        action()
+        if part_of_day == PartOfDay.Morning:
+            self.handle_morning()
+        elif part_of_day == PartOfDay.Afternoon:
+            self.handle_afternoon()
+        elif part_of_day == PartOfDay.Night:
+            self.handle_night()
         self.update_spoilage()
 
     def eat_if_needed(self):
+        resources = self.inventory["resources"]
         while self.status.hunger < 7:
-            if self.get_item_count("cooked_food") > 0:
-                self.remove_item("cooked_food", 1)
+            if resources.get(ItemId.cooked_food, 0) > 0:
+                self.remove_item(ItemId.cooked_food, 1)
                 self.status.hunger += 3
                 self.adjust_health(2)
                 self.log("Ate 1 cooked_food => hunger +3, health +2")
-            elif self.get_item_count("food") > 0:
-                self.remove_item("food", 1)
+            elif resources.get(ItemId.food, 0) > 0:
+                self.remove_item(ItemId.food, 1)
                 self.status.hunger += 2
                 self.log("Ate 1 food => hunger +2")
             else:
                 break
 
     def buy_essential_items(self):
-        target_food = max(3, self.get_item_count("cooked_food"))
-        if self.get_item_count("cooked_food") < target_food:
-            self.buy_item("cooked_food", 1)
+        target_food = max(3, self.get_item_count(ItemId.cooked_food))
+        if self.get_item_count(ItemId.cooked_food) < target_food:
+            self.buy_item(ItemId.cooked_food, 1)
         
         # Wood purchase logic
-        required_wood = self.world.config["MIN_WOOD_RESERVE_WINTER"] if self.world.is_winter() else 3
-        current_wood = self.get_item_count("wood")
+        required_wood = self.world.config.MIN_WOOD_RESERVE_WINTER if self.world.is_winter() else 3
+        current_wood = self.get_item_count(ItemId.wood)
         
         if current_wood < required_wood:
             needed = required_wood - current_wood
             # Attempt to buy whatever is available if full amount isn't in market
-            success = self.buy_item("wood", needed)
+            success = self.buy_item(ItemId.wood, needed)
             if not success:
                 # Try buying whatever remaining stock exists
-                market_stock = self.world.market.get_stock("wood")
+                market_stock = self.world.market.get_stock(ItemId.wood)
                 if market_stock > 0:
-                    self.buy_item("wood", market_stock)
+                    self.buy_item(ItemId.wood, market_stock)
 
     def buy_primary_tool(self):
-        if self.world.get_current_season() == "Winter" and self.get_item_count("wood") < self.world.config["MIN_WOOD_RESERVE_WINTER"]:
+        cfg = self.world.config
+        if self.world.is_winter() and self.get_item_count(ItemId.wood) < cfg.MIN_WOOD_RESERVE_WINTER:
             return
-        for tool_name in self.world.config["ROLE_TOOLS"].get(self.role, []):
+        for tool_name in cfg.ROLE_TOOL_IDS[self.role]:
             if self.get_item_count(tool_name) < 1:
                 self.buy_item(tool_name, 1)
 
     def sell_item(self, item_name, qty=1):
         market = self.world.market
+        if market.batch_mode:
+            if qty <= 0 or self.get_item_count(item_name) < qty:
+                return False
+            self.remove_item(item_name, qty)
+            market.submit_sell(self, item_name, qty)
+            return True
         success, revenue, actual_qty = market.attempt_sell(item_name, qty)
         if not success or self.get_item_count(item_name) < qty:
             return False
@@ -1161,52 +2990,54 @@ class Villager:
     def sell_surplus(self):
         """
         Sells any items in the inventory that exceed the safety stock.
-        Uses config SAFETY_STOCK values (defaulting to a preset if not specified)
+        Uses config SAFETY_STOCK values (defaulting to 0 for unlisted items)
         so that the villager keeps enough for personal use.
         """
-        cfg = self.world.config
-        # Define a safety stock for each item if not already in the config.
-        safety_stock = cfg.get("SAFETY_STOCK", {"food": 3, "cooked_food": 3, "wood": 3})
+        safety_stock = self.world.config.ITEM_SAFETY_STOCK
         # Iterate over resources only (tools typically are not sold automatically)
         for item_name in list(self.inventory["resources"].keys()):
             current = self.get_item_count(item_name)
-            reserve = safety_stock.get(item_name, 0)
+            reserve = safety_stock[item_name]
             if current > reserve:
                 quantity_to_sell = current - reserve
                 self.sell_item(item_name, quantity_to_sell)
 
     def consume_wood_at_night(self):
-        needed = self.world.config["WINTER_WOOD_CONSUMPTION"]
-        if self.get_item_count("wood") >= needed:
-            self.remove_item("wood", needed)
+        cfg = self.world.config
+        needed = cfg.WINTER_WOOD_CONSUMPTION
+        if self.get_item_count(ItemId.wood) >= needed:
+            self.remove_item(ItemId.wood, needed)
             self.log(f"Burned {needed} wood on winter night.")
         else:
-            penalty = self.world.config.get("NO_WOOD_PENALTY", 1)
+            penalty = cfg.NO_WOOD_PENALTY
             self.status.health = max(0, self.status.health - penalty)
             self.status.happiness = max(0, self.status.happiness - penalty)
             self.log(f"No wood => suffered cold (health & happiness -{penalty}).")
 
     def update_needs_and_penalties(self):
         cfg = self.world.config
-        self.status.rest += cfg["REST_RECOVERY_PER_NIGHT"]
-        parts = len(cfg["PARTS_OF_DAY"])
-        self.status.hunger = max(0, self.status.hunger - (cfg["HUNGER_DECREMENT_PER_DAY"] / parts))
-        self.status.rest = max(0, self.status.rest - (cfg["REST_DECREMENT_PER_DAY"] / parts))
-        max_rest = cfg.get("MAX_REST", 100)
-        self.status.rest = min(self.status.rest, max_rest)
-        self.low_hunger_streak = self.low_hunger_streak + 1 if self.status.hunger < cfg["HUNGER_LOW_PENALTY_THRESHOLD"] else 0
-        self.low_rest_streak = self.low_rest_streak + 1 if self.status.rest < cfg["REST_LOW_PENALTY_THRESHOLD"] else 0
-        if self.low_hunger_streak > cfg["LOW_NEEDS_STREAK_THRESHOLD"]:
-            self.status.health = max(0, self.status.health - cfg["HEALTH_PENALTY_FOR_LOW_NEEDS"])
-            self.status.happiness = max(0, self.status.happiness - cfg["HAPPINESS_PENALTY_FOR_LOW_NEEDS"])
+        status = self.status
+        status.rest += cfg.REST_RECOVERY_PER_NIGHT
+        status.hunger = max(0, status.hunger - cfg.HUNGER_DECREMENT_PER_PART)
+        status.rest = max(0, status.rest - cfg.REST_DECREMENT_PER_PART)
+        status.rest = min(status.rest, cfg.MAX_REST)
+        self.low_hunger_streak = self.low_hunger_streak + 1 if status.hunger < cfg.HUNGER_LOW_PENALTY_THRESHOLD else 0
+        self.low_rest_streak = self.low_rest_streak + 1 if status.rest < cfg.REST_LOW_PENALTY_THRESHOLD else 0
+        if self.low_hunger_streak > cfg.LOW_NEEDS_STREAK_THRESHOLD:
+            status.health = max(0, status.health - cfg.HEALTH_PENALTY_FOR_LOW_NEEDS)
+            status.happiness = max(0, status.happiness - cfg.HAPPINESS_PENALTY_FOR_LOW_NEEDS)
             self.log("Suffering from prolonged hunger => health/happiness penalty.")
-        if self.low_rest_streak > cfg["LOW_NEEDS_STREAK_THRESHOLD"]:
-            self.status.health = max(0, self.status.health - cfg["HEALTH_PENALTY_FOR_LOW_NEEDS"])
-            self.status.happiness = max(0, self.status.happiness - cfg["HAPPINESS_PENALTY_FOR_LOW_NEEDS"])
+        if self.low_rest_streak > cfg.LOW_NEEDS_STREAK_THRESHOLD:
+            status.health = max(0, status.health - cfg.HEALTH_PENALTY_FOR_LOW_NEEDS)
+            status.happiness = max(0, status.happiness - cfg.HAPPINESS_PENALTY_FOR_LOW_NEEDS)
             self.log("Suffering from prolonged lack of rest => health/happiness penalty.")
 
     def buy_item(self, item_name, qty=1):
         market = self.world.market
+        if market.batch_mode:
+            # Orders are filled when the market clears at the end of the part of day.
+            market.submit_buy(self, item_name, qty)
+            return True
         # Unpack the result tuple: (success, cost, actual_qty)
         success, cost, actual_qty = market.attempt_buy(item_name, qty)
         if not success or cost > self.coins:
@@ -1214,17 +3045,29 @@ class Villager:
         self.coins -= cost
         market.finalize_buy(item_name, actual_qty)
         self.add_item(item_name, actual_qty)
-        market.log_purchase(self, item_name, actual_qty)
+        market.log_purchase(self, item_name, actual_qty, cost)
         return True
 
     def find_field_tile(self):
-        for row in self.world.grid:
-            for tile in row:
-                if tile.terrain_type == "field" and tile.resource_level > 0:
-                    return tile
-        return None
+        return self.find_tile_with_resources(Terrain.field)
+
+    def find_work_tile(self, terrain_type):
+        # Returns (tile, yield factor). With travel costs on, the nearest
+        # productive tile is used and its walk from the village cuts the yield.
+        world = self.world
+        fields = world.distance_fields
+        if fields is None:
+            tile, factor = self.find_tile_with_resources(terrain_type), 1.0
+        else:
+            tile, distance = fields.nearest_productive(terrain_type)
+            factor = world.travel_factor(distance) if tile is not None else 1.0
+        if tile is not None and world.contagion:
+            world.contagion.note_work(self, tile)
+        return tile, factor
 
     def find_tile_with_resources(self, terrain_type):
+        if self.world.terrain:
+            return self.world.terrain.find_nearest(terrain_type, *self.world.center)
         for row in self.world.grid:
             for tile in row:
                 if tile.terrain_type == terrain_type and tile.resource_level > 0:
@@ -1233,116 +3076,493 @@ class Villager:
 
     def gain_skill(self):
         max_skill = self.max_skill.get(self.role, 1.5)
-        self.skill_level = min(max_skill, self.skill_level + self.world.config["SKILL_GAIN_PER_ACTION"])
+        self.skill_level = min(max_skill, self.skill_level + self.world.config.SKILL_GAIN_PER_ACTION)
 
     def log(self, message):
-        self.world.log.log_action(
-            self.world.day_count,
-            self.world.world_part_of_day(),
-            self.id, self.role,
-            message
-        )
+        world = self.world
+        world.log.log_action(world.day_count, world.part, self.id, self.role, message)
 
     def log_daily_summary(self):
         summary = (
             f"End of day summary - Hunger: {self.status.hunger}, Rest: {self.status.rest}, "
             f"Health: {self.status.health}, Happiness: {self.status.happiness}, Coins: {self.coins}, "
-            f"Inventory: (food: {self.get_item_count('food')}, wood: {self.get_item_count('wood')}, "
-            f"cooked_food: {self.get_item_count('cooked_food')})"
+            f"Inventory: (food: {self.get_item_count(ItemId.food)}, wood: {self.get_item_count(ItemId.wood)}, "
+            f"cooked_food: {self.get_item_count(ItemId.cooked_food)})"
         )
         self.log(summary)
 
     def use_herb(self):
-        if self.get_item_count("herb") > 0:
-            self.remove_item("herb", 1)
-            self.adjust_health(self.world.config["HERB_HEALTH_BOOST"])
-            self.log(f"Used 1 herb => health +{self.world.config['HERB_HEALTH_BOOST']}")
+        if self.get_item_count(ItemId.herb) > 0:
+            self.remove_item(ItemId.herb, 1)
+            boost = self.world.config.HERB_HEALTH_BOOST
+            self.adjust_health(boost)
+            self.log(f"Used 1 herb => health +{boost}")
 
     def emergency_recover(self):
-        if self.status.health < self.world.config["EMERGENCY_HEALTH_THRESHOLD"]:
-            if self.get_item_count("food") >= self.world.config["COOKING_CONVERSION_RATE"]:
+        cfg = self.world.config
+        if self.status.health < cfg.EMERGENCY_HEALTH_THRESHOLD:
+            if self.get_item_count(ItemId.food) >= cfg.COOKING_CONVERSION_RATE:
                 self.log("Emergency: Health critically low - Attempting to cook food for recovery.")
                 Action.cook_food(self)
-                if self.get_item_count("cooked_food") > 0:
-                    self.remove_item("cooked_food", 1)
-                    self.status.hunger += self.world.config["EMERGENCY_COOKED_FOOD_HUNGER_BOOST"]
-                    self.adjust_health(self.world.config["EMERGENCY_COOKED_FOOD_HEALTH_BOOST"])
-                    self.log(f"Emergency: Ate 1 cooked_food => hunger +{self.world.config['EMERGENCY_COOKED_FOOD_HUNGER_BOOST']}, health +{self.world.config['EMERGENCY_COOKED_FOOD_HEALTH_BOOST']}")
+                if self.get_item_count(ItemId.cooked_food) > 0:
+                    self.remove_item(ItemId.cooked_food, 1)
+                    self.status.hunger += cfg.EMERGENCY_COOKED_FOOD_HUNGER_BOOST
+                    self.adjust_health(cfg.EMERGENCY_COOKED_FOOD_HEALTH_BOOST)
+                    self.log(f"Emergency: Ate 1 cooked_food => hunger +{cfg.EMERGENCY_COOKED_FOOD_HUNGER_BOOST}, health +{cfg.EMERGENCY_COOKED_FOOD_HEALTH_BOOST}")
             else:
                 self.log("Emergency: Health critically low and no food available for cooking - Attempting to buy herb.")
-                if self.buy_item("herb", 1):
+                if self.buy_item(ItemId.herb, 1):
                     self.use_herb()
                 else:
                     self.log("Emergency: Unable to buy herb for recovery.")
 
+# -----------------------------------------------------------------------------
+# MEMORY PROFILE
+# -----------------------------------------------------------------------------
+
+class MemoryProfiler:
+    """
+    Takes a tracemalloc snapshot at day boundaries and charges every live
+    allocation to the subsystem whose code made it, next to an entry count
+    read off the subsystem itself. Allocations are charged by site; the
+    arguments of every log call are sites of the log, so a message formatted
+    inside a villager action counts toward the log rather than villagers.
+    Objects shared across subsystems stay with the site that made them, e.g.
+    the status floats a stats row refers to count toward villagers.
+
+    A component is reported as growing when its second half of the run still
+    grows at least GROWTH_RATIO as fast as the first half, i.e. it has not
+    levelled off. Samples are written as CSV rows together with the wall
+    time spent since the previous sample.
+    """
+    GROWTH_RATIO = 0.5
+    MIN_GROWTH_BYTES = 64 * 1024  # less than this over the whole run counts as flat
+    MIN_GROWTH_COUNT = 10
+    FIELDS = ("day", "seconds", "component", "count", "bytes")
+
+    def __init__(self, sim, every_days, filename):
+        self.sim = sim
+        self.every_days = every_days
+        self.filename = filename
+        self.started_tracing = not tracemalloc.is_tracing()
+        if self.started_tracing:
+            tracemalloc.start()
+        self.regions = None
+        self.site_cache = {}
+        self.samples = []  # (day, seconds, {component: (count, bytes)})
+        self.last_sample = time.perf_counter()
+
+    COMPONENTS = (
+        ("log", ("SimulationLog", "Villager.log", "Villager.log_daily_summary")),
+        ("stats", ("StatsCollector", "RoleAggregate", "StatsStore")),
+        ("items", ("Item", "Villager.add_item")),
+        ("monsters", ("Monster", "EventManager.trigger_monster_attack", "EventManager.spawn_monster_agent")),
+        ("market", ("Market", "MarketLedger")),
+        ("world", ("World", "Tile", "ChunkedTerrain", "TerrainNoise", "DistanceFields", "WorldTemplateCache",
+                   "Contagion")),
+        ("villagers", ("Villager", "VillagerStatus", "Action", "RoleManager", "RoleGroup")),
+    )
+
+    def _build_regions(self):
+        # (first line, last line, component) of each listed class or method
+        # and of each log call, narrowest first.
+        self.engine_filename = SimulationLog.log_action.__code__.co_filename
+        tree = ast.parse(inspect.getsource(sys.modules[__name__]))
+        spans = {}
+        for node in tree.body:
+            if isinstance(node, ast.ClassDef):
+                spans[node.name] = (node.lineno, node.end_lineno)
+                for child in node.body:
+                    if isinstance(child, ast.FunctionDef):
+                        spans[f"{node.name}.{child.name}"] = (child.lineno, child.end_lineno)
+        regions = [spans[name] + (component,) for component, names in self.COMPONENTS for name in names]
+        for node in ast.walk(tree):
+            if (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+                    and node.func.attr in ("log", "log_action")):
+                regions.append((node.lineno, node.end_lineno, "log"))
+        # The profiler's own samples are left out.
+        regions.append(spans["MemoryProfiler"] + (None,))
+        regions.sort(key=lambda r: r[1] - r[0])
+        self.regions = regions
+
+    def _component(self, frame):
+        key = (frame.filename, frame.lineno)
+        if key in self.site_cache:
+            return self.site_cache[key]
+        component = "other"
+        if frame.filename == self.engine_filename:
+            component = "engine"
+            for first, last, name in self.regions:
+                if first <= frame.lineno <= last:
+                    component = name
+                    break
+        self.site_cache[key] = component
+        return component
+
+    def _counts(self):
+        sim = self.sim
+        world = sim.world
+        collector = sim.stats_collector
+        return {
+            "log": len(sim.sim_log.entries),
+            "stats": len(collector.timeseries) + len(collector.aggregates),
+            "items": sum(len(tools) for v in sim.villagers for tools in v.inventory["tools"].values()),
+            "monsters": len(world.monsters),
+            "market": len(world.market.ledger.ticks),
+            "villagers": len(sim.villagers),
+        }
+
+    def sample(self, day):
+        if self.regions is None:
+            self._build_regions()
+        now = time.perf_counter()
+        seconds, self.last_sample = now - self.last_sample, now
+        snapshot = tracemalloc.take_snapshot()
+        sizes = defaultdict(int)
+        for stat in snapshot.statistics("lineno"):
+            component = self._component(stat.traceback[0])
+            if component is not None:
+                sizes[component] += stat.size
+        counts = self._counts()
+        names = [name for name, _ in self.COMPONENTS] + ["engine", "other"]
+        components = {name: (counts.get(name), sizes.get(name, 0)) for name in names}
+        self.samples.append((day, seconds, components))
+        # The snapshot itself is traced; do not let it show up in the next one.
+        self.last_sample = time.perf_counter()
+
+    def maybe_sample(self, finished_day):
+        if finished_day % self.every_days == 0:
+            self.sample(finished_day)
+
+    def trend(self, component, index):
+        # "growing", "levelling off" or "flat" for the count (0) or bytes (1) series.
+        values = [sample[2][component][index] for sample in self.samples]
+        if len(values) < 4 or values[0] is None:
+            return "n/a"
+        floor = self.MIN_GROWTH_BYTES if index else self.MIN_GROWTH_COUNT
+        if values[-1] - values[0] <= max(floor, 0.01 * max(values)):
+            return "flat"
+        half = len(values) // 2
+        early = (values[half] - values[0]) / half
+        late = (values[-1] - values[half]) / (len(values) - 1 - half)
+        if late > 0 and late >= self.GROWTH_RATIO * early:
+            return "growing"
+        return "levelling off"
+
+    def growing_components(self):
+        return [name for name in self.samples[-1][2] if "growing" in (self.trend(name, 0), self.trend(name, 1))]
+
+    def report(self):
+        if not self.samples:
+            return "No memory samples taken."
+        first_day, _, first = self.samples[0]
+        last_day, _, last = self.samples[-1]
+        lines = [f"Memory by subsystem, day {first_day} to day {last_day} ({len(self.samples)} samples):",
+                 f"  {'component':<10}{'count':>10}{'KiB':>12}{'KiB/day':>10}  trend"]
+        span = max(1, last_day - first_day)
+        for name, (count, size) in last.items():
+            per_day = (size - first[name][1]) / span / 1024
+            trend = self.trend(name, 1)
+            if self.trend(name, 0) == "growing":
+                trend = "growing"
+            lines.append(f"  {name:<10}{'' if count is None else count:>10}{size / 1024:>12.1f}{per_day:>10.1f}  {trend}")
+        growing = self.growing_components()
+        if growing:
+            lines.append(f"Still growing: {', '.join(growing)}")
+        return "\n".join(lines)
+
+    def close(self):
+        with open(self.filename, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(self.FIELDS)
+            for day, seconds, components in self.samples:
+                for name, (count, size) in components.items():
+                    writer.writerow((day, f"{seconds:.4f}", name, "" if count is None else count, size))
+        if self.started_tracing:
+            tracemalloc.stop()
+        print(self.report())
+        print(f"Memory profile written to {self.filename}")
+
+# -----------------------------------------------------------------------------
+# RUN MONITOR
+# -----------------------------------------------------------------------------
+
+Alert = namedtuple("Alert", "code tick day message")
+
+class RunMonitor:
+    """
+    Checks the MONITOR_RULES against per-tick aggregates at the end of every
+    part of day. A rule raises an Alert when its condition starts to hold and
+    re-arms once it clears. Alerts are logged as events; the first one whose
+    code is in MONITOR_ABORT_ON becomes the run's abort reason.
+    """
+    RULES = ("population_collapse", "wood_stockout", "starvation")
+
+    def __init__(self, config, initial_population):
+        self.config = compile_config(config)
+        self.rules = dict(self.config.MONITOR_RULES)
+        self.abort_on = frozenset(self.config.MONITOR_ABORT_ON)
+        self.initial_population = initial_population
+        self.ticks_per_day = len(PartOfDay)
+        self.wood_stockout_ticks = 0
+        self.active = set()
+        self.alerts = []
+        self.abort_reason = None
+
+    def _population_collapse(self, world, threshold):
+        alive = len(world.villagers)
+        share = alive / self.initial_population if self.initial_population else 0.0
+        if share < threshold:
+            return f"{alive} of {self.initial_population} villagers alive ({share:.0%} < {threshold:.0%})"
+
+    def _wood_stockout(self, world, threshold):
+        days = self.wood_stockout_ticks / self.ticks_per_day
+        if self.wood_stockout_ticks and days >= threshold:
+            return f"market out of wood for {days:g} days"
+
+    def _starvation(self, world, threshold):
+        if not world.villagers:
+            return None
+        average = sum(v.status.hunger for v in world.villagers) / len(world.villagers)
+        if average < threshold:
+            return f"average hunger {average:.2f} < {threshold:g}"
+
+    def check(self, world, sim_log):
+        # Returns the alerts raised this tick.
+        if world.market.get_stock(ItemId.wood) <= 0:
+            self.wood_stockout_ticks += 1
+        else:
+            self.wood_stockout_ticks = 0
+        raised = []
+        for code, threshold in self.rules.items():
+            detail = getattr(self, "_" + code)(world, threshold)
+            if detail is None:
+                self.active.discard(code)
+                continue
+            if code in self.active:
+                continue
+            self.active.add(code)
+            alert = Alert(code, world.tick, world.day_count, detail)
+            raised.append(alert)
+            abort = code in self.abort_on and self.abort_reason is None
+            if abort:
+                self.abort_reason = code
+            sim_log.log_action(world.day_count, world.part, 0, "EVENT",
+                               f"Monitor: {code} - {detail}" + (", aborting run." if abort else "."))
+        self.alerts.extend(raised)
+        return raised
+
 # -----------------------------------------------------------------------------
 # SIMULATION
 # -----------------------------------------------------------------------------
 
+TickRecord = namedtuple("TickRecord", "tick day part season alive deaths stock events")
+
 class Simulation:
-    def __init__(self, config):
-        self.config = config
+    def __init__(self, config, seed=None):
+        self.config = compile_config(config)
+        if seed is not None:
+            random.seed(seed)
+        # Started first so the world and villagers are traced too.
+        self.memory_profiler = None
+        if self.config.MEMORY_PROFILE_ENABLED:
+            self.memory_profiler = MemoryProfiler(self, self.config.MEMORY_PROFILE_EVERY_DAYS,
+                                                  self.config.MEMORY_PROFILE_FILENAME)
         self.sim_log = SimulationLog()
-        self.stats_collector = StatsCollector()
-        self.world = World(config, self.sim_log)
+        self.stats_collector = StatsCollector(self.config.STATS_MODE, self.config.STATS_EVERY_N_TICKS,
+                                              self.config.STATS_SAMPLE_PER_ROLE, self.config.STATS_SAMPLE_SEED)
+        self.journal = None
+        if self.config.JOURNAL_ENABLED:
+            self.journal = StateJournal(self.config.JOURNAL_KEYFRAME_INTERVAL, self.config.JOURNAL_FILENAME)
+        self.stats_store = None
+        if self.config.STATS_STORE_ENABLED:
+            self.stats_store = StatsStore.create(self.config.STATS_STORE_DIR, self.config.STATS_STORE_CHUNK_ROWS,
+                                                 self.config.STATS_MODE, self.config)
+        self.exporter = None
+        if self.config.ASYNC_EXPORT:
+            self.exporter = AsyncExporter(self.config.LOG_FILENAME, self.config.EXPORT_QUEUE_DAYS,
+                                          self.config.EXPORT_BACKPRESSURE, self.stats_store)
+        templates = None
+        if self.config.WORLD_TEMPLATE_DIR and seed is not None:
+            templates = WorldTemplateCache(self.config.WORLD_TEMPLATE_DIR)
+        self.world = World(self.config, self.sim_log, templates, seed)
         self.villagers = self._spawn_villagers()
         self.world.villagers = self.villagers
+        if self.config.STATS_MODE == "sampled":
+            self.stats_collector.choose_sample(self.villagers)
+        self._role_groups = None
+        self._finished = False
+        self.monitor = None
+        if self.config.MONITOR_RULES:
+            self.monitor = RunMonitor(self.config, len(self.villagers))
+        if self.memory_profiler:
+            self.memory_profiler.sample(0)
 
     def _spawn_villagers(self):
         villagers = []
         vid = 1
-        for _ in range(self.config["NUM_FARMERS"]):
-            villagers.append(Villager(vid, "Farmer", self.world))
+        for _ in range(self.config.NUM_FARMERS):
+            villagers.append(Villager(vid, Role.Farmer, self.world))
             vid += 1
-        for _ in range(self.config["NUM_HUNTERS"]):
-            villagers.append(Villager(vid, "Hunter", self.world))
+        for _ in range(self.config.NUM_HUNTERS):
+            villagers.append(Villager(vid, Role.Hunter, self.world))
             vid += 1
-        for _ in range(self.config["NUM_LOGGERS"]):
-            villagers.append(Villager(vid, "Logger", self.world))
+        for _ in range(self.config.NUM_LOGGERS):
+            villagers.append(Villager(vid, Role.Logger, self.world))
             vid += 1
-        for _ in range(self.config["NUM_BLACKSMITHS"]):
-            villagers.append(Villager(vid, "Blacksmith", self.world))
+        for _ in range(self.config.NUM_BLACKSMITHS):
+            villagers.append(Villager(vid, Role.Blacksmith, self.world))
             vid += 1
+        for index, v in enumerate(villagers):
+            v.x, v.y = self.world.home_position(index, len(villagers))
+        if self.config.TRAVEL_COST_PER_TILE > 0:
+            self.world.build_distance_fields((v.x, v.y) for v in villagers)
+        if self.config.CONTAGION_ENABLED:
+            self.world.contagion = Contagion(villagers, self.config, random.getrandbits(32))
         return villagers
 
+    @property
+    def abort_reason(self):
+        # Reason code of the monitor rule that ended the run early, if any.
+        return self.monitor.abort_reason if self.monitor else None
+
+    @property
+    def done(self):
+        return self.world.day_count > self.config.TOTAL_DAYS_TO_RUN or self.abort_reason is not None
+
+    def step(self):
+        """
+        Simulates the current part of the day and returns its TickRecord,
+        or None once TOTAL_DAYS_TO_RUN days have been simulated.
+        """
+        if self.done:
+            return None
+        world = self.world
+        part = world.part
+        first_entry = len(self.sim_log.entries)
+        alive_before = len(world.villagers)
+        if part == PartOfDay.Morning:
+            self._check_for_marriages()
+        if self.config.DISPATCH_MODE == "role":
+            record = self.stats_collector.record_villager_stats
+            for group in self.role_groups():
+                group.perform(part, record)
+        else:
+            for v in self.villagers:
+                v.perform_part_of_day(part)
+                self.stats_collector.record_villager_stats(v)
+        if world.market.batch_mode:
+            world.market.clear_orders()
+        if part == PartOfDay.Night:
+            for v in self.villagers:
+                v.log_daily_summary()
+        world.update_resources_and_events(part)
+        return self._end_tick(part, first_entry, alive_before)
+
+    def _end_tick(self, part, first_entry, alive_before):
+        world = self.world
+        if self.monitor:
+            self.monitor.check(world, self.sim_log)
+        if self.journal:
+            self.journal.record(world)
+        tick_record = TickRecord(
+            world.tick, world.day_count, part, world.season, len(world.villagers),
+            alive_before - len(world.villagers),
+            tuple(world.market.get_stock(item) for item in ItemId),
+            tuple(e[4] for e in self.sim_log.entries[first_entry:] if e[3] == "EVENT")
+        )
+        world.advance_time()
+        if part == PartOfDay.Night and (self.exporter or self.stats_store):
+            self._export_finished(world.day_count - 1)
+        if self.memory_profiler and part == PartOfDay.Night:
+            self.memory_profiler.maybe_sample(world.day_count - 1)
+        if self.abort_reason:
+            print(f"Run aborted on day {tick_record.day} ({tick_record.part}): {self.abort_reason}")
+        return tick_record
+
+    def ticks(self):
+        # Yields a TickRecord per part of day; stopping early is fine, call finish() for the outputs.
+        while True:
+            tick_record = self.step()
+            if tick_record is None:
+                return
+            yield tick_record
+
+    def finish(self, charts=True):
+        # Writes the journal, log, stats store and charts for the ticks simulated so far.
+        if self._finished:
+            return
+        self._finished = True
+        if self.journal:
+            self.journal.close()
+        if self.exporter:
+            self._export_finished(None)
+            self.exporter.close()
+        else:
+            self.sim_log.export_log(self.config.LOG_FILENAME)
+        if self.stats_store:
+            if not self.exporter:
+                self._export_finished(None)
+            self.stats_store.write_aggregates(self.stats_collector.aggregate_rows())
+            self.stats_store.close()
+            print(f"Stats store written to {self.config.STATS_STORE_DIR}")
+        if self.memory_profiler:
+            self.memory_profiler.close()
+        if charts:
+            self.stats_collector.generate_charts(self.config.CHART_FILENAME, self.config)
+
     def run(self):
-        max_days = self.config["TOTAL_DAYS_TO_RUN"]
-        while self.world.day_count <= max_days:
-            for part in self.config["PARTS_OF_DAY"]:
-                if part == "Morning":
-                    self._check_for_marriages()
-                for v in self.villagers:
-                    v.perform_part_of_day(part)
-                    self.stats_collector.record_villager_stats(v)
-                if part == "Night":
-                    for v in self.villagers:
-                        v.log_daily_summary()
-                self.world.update_resources_and_events(part)
-                self.world.advance_time()
-        self.sim_log.export_log(self.world.config["LOG_FILENAME"])
-        self.stats_collector.generate_charts(self.world.config["CHART_FILENAME"])
-        webbrowser.open(self.world.config["CHART_FILENAME"])
+        # Returns the abort reason code, or None when every day was simulated.
+        for _ in self.ticks():
+            pass
+        # A run the monitor gave up on keeps its log and stats but skips the charts.
+        self.finish(charts=not self.abort_reason)
+        if not self.abort_reason:
+            webbrowser.open(self.config.CHART_FILENAME)
+        return self.abort_reason
+
+    def _export_finished(self, day):
+        # Hands the log entries and stats rows of every day up to day to the
+        # exporter, which also writes the rows when there is a stats store.
+        stats_rows = self.stats_collector.take_new_rows() if self.stats_store else ()
+        if self.exporter:
+            self.exporter.submit(self.sim_log.take_entries(day), stats_rows)
+        elif stats_rows:
+            self.stats_store.append(stats_rows)
+
+    def role_groups(self):
+        # Roles are fixed for a run, so the groups are built once. The dead
+        # stay in their group, as in per-villager dispatch, so their rows are kept.
+        if self._role_groups is None:
+            self._role_groups = RoleManager.build_groups(self.villagers, self.config)
+        return self._role_groups
 
     def _check_for_marriages(self):
-        if random.random() < self.config["MARRIAGE_PROBABILITY"]:
-            singles = [
-                v for v in self.villagers
-                if v.relationship_status == "single"
-                and v.status.health > self.config["MARRIAGE_HEALTH_THRESHOLD"]
-                and v.status.hunger > self.config["MARRIAGE_HUNGER_THRESHOLD"]
-                and v.get_item_count("food") > self.config["MARRIAGE_FOOD_THRESHOLD"]
-                and v.get_item_count("wood") > self.config["MARRIAGE_WOOD_THRESHOLD"]
-            ]
-            if len(singles) >= 2:
-                v1, v2 = random.sample(singles, 2)
-                v1.relationship_status = v2.relationship_status = "married"
-                v1.partner_id, v2.partner_id = v2.id, v1.id
-                self.sim_log.log_action(
-                    self.world.day_count, "Morning", 0, "EVENT",
-                    f"Villager {v1.id} and Villager {v2.id} got married!"
-                )
+        if random.random() < self.config.MARRIAGE_PROBABILITY:
+            self._arrange_marriage()
+
+    def _arrange_marriage(self):
+        cfg = self.config
+        singles = [
+            v for v in self.villagers
+            if v.relationship_status == "single"
+            and v.status.health > cfg.MARRIAGE_HEALTH_THRESHOLD
+            and v.status.hunger > cfg.MARRIAGE_HUNGER_THRESHOLD
+            and v.get_item_count(ItemId.food) > cfg.MARRIAGE_FOOD_THRESHOLD
+            and v.get_item_count(ItemId.wood) > cfg.MARRIAGE_WOOD_THRESHOLD
+        ]
+        if len(singles) >= 2:
+            v1, v2 = random.sample(singles, 2)
+            v1.relationship_status = v2.relationship_status = "married"
+            v1.partner_id, v2.partner_id = v2.id, v1.id
+            if self.world.contagion:
+                self.world.contagion.add_partnership(v1, v2)
+            self.sim_log.log_action(
+                self.world.day_count, PartOfDay.Morning, 0, "EVENT",
+                f"Villager {v1.id} and Villager {v2.id} got married!"
+            )
 
 if __name__ == "__main__":
     sim = Simulation(CONFIG)
-    sim.run()
-    sys.exit()
+    reason = sim.run()
+    sys.exit(1 if reason else 0)